@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Actualiza la cotización de una moneda y recalcula precio_usd del catálogo.
+
+Uso:
+    python actualizar_cotizacion.py ARS 1250     # 1 USD = 1250 ARS
+    python actualizar_cotizacion.py --listar
+"""
+import sqlite3
+import argparse
+
+from logic.database import DB_PATH, actualizar_cotizacion, asegurar_cotizaciones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Actualiza la tabla local de cotizaciones")
+    parser.add_argument("moneda", nargs="?", help="Código de moneda (ej: ARS)")
+    parser.add_argument("por_usd", nargs="?", type=float, help="Unidades de la moneda por 1 USD")
+    parser.add_argument("--listar", action="store_true", help="Mostrar las cotizaciones actuales")
+    args = parser.parse_args()
+
+    if args.moneda and args.por_usd:
+        actualizadas = actualizar_cotizacion(args.moneda, args.por_usd)
+        print(f"{args.moneda.upper()} = {args.por_usd} por USD ({actualizadas} propiedades recalculadas)")
+    elif not args.listar:
+        parser.error("indicá moneda y cotización, o --listar")
+
+    with sqlite3.connect(DB_PATH) as conn:
+        for moneda, por_usd in sorted(asegurar_cotizaciones(conn.cursor()).items()):
+            print(f"{moneda}: {por_usd}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+Replay offline de mensajes reales por el pipeline de /chat, sin llamar a Gemini.
+
+Cada mensaje pasa por las mismas etapas que procesar_consulta en main.py:
+
+    detect_filters       filtros del texto (+ los de la barra lateral si el corpus los trae)
+    canonicalize         forma canónica con la que se consulta la BD
+    query_properties     búsqueda de ids en la BD + registros del catálogo en memoria (sin cache)
+    intent_template      classify_intent + render_template (fast path)
+    build_prompt         armar_prompt de main, sin historial
+    llm                  stub o respuestas grabadas (ver --llm)
+    postproceso          parse_structured_answer / limpiar_respuesta_con_resultados
+
+y se informa: throughput, tiempos por etapa (media, p50, p95), distribución de
+cantidad de resultados y de intenciones, diferencias de extracción de filtros
+contra un set etiquetado y, con --compare, diferencias de filtros, ids de
+resultados, intención y prompt contra un snapshot de una corrida anterior.
+Sirve para comprobar que un motor de filtros o un índice nuevo devuelve lo
+mismo que el código actual a escala real.
+
+Corpus (--corpus):
+    logs       la tabla `logs` de LOG_PATH (default), más los NDJSON archivados con --include-archive
+    loadtest   las consultas de loadtest/corpus.py combinadas con los filtros de la barra lateral
+    <archivo>  .txt (un mensaje por línea) o .jsonl ({"message", "channel"?, "filters"?})
+
+LLM (--llm):
+    stub       respuesta fija por perfil, costo cero (default)
+    cache      respuestas grabadas en --llm-cache-file por clave de prompt; los faltantes usan
+               el stub, o se piden a Gemini y se graban con --record
+
+Uso:
+    python -m bench.replay
+    python -m bench.replay --corpus loadtest --synthetic 100000 --repeat 20
+    python -m bench.replay --labels bench/filtros_etiquetados.jsonl
+    python -m bench.replay --save-snapshot /tmp/antes.json
+    python -m bench.replay --compare /tmp/antes.json        # sale con 1 si hay diferencias
+"""
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+import logic.database as database
+from logic.filters import detect_filters, canonicalize_filters
+from logic.intents import classify_intent
+from logic.templates import render_template
+from logic.generation import parse_structured_answer
+from logic.gemini_client import llm_cache_key, call_gemini_with_rotation
+from logic.log_retention import LOG_ARCHIVE_DIR
+
+ETAPAS = ["detect_filters", "canonicalize", "query_properties", "intent_template",
+          "build_prompt", "llm", "postproceso"]
+
+# Tramos de la distribución de cantidad de resultados
+TRAMOS = [(0, 0), (1, 1), (2, 5), (6, 10), (11, 20), (21, 50), (51, None)]
+
+RESPUESTAS_STUB = {
+    True: "¡Perfecto! Encontré propiedades que coinciden con tu búsqueda. Te las muestro abajo 👇",
+    False: "No encontré propiedades con esos filtros. ¿Querés probar con otro barrio o precio?",
+    None: "¡Hola! Contame qué tipo de propiedad buscás y en qué barrio, así te ayudo.",
+}
+
+
+# ✅ CORPUS
+def cargar_logs(limit: int, include_archive: bool) -> List[Dict[str, Any]]:
+    mensajes: List[Dict[str, Any]] = []
+    if include_archive:
+        for archivo in sorted(glob.glob(os.path.join(LOG_ARCHIVE_DIR, "logs-*.ndjson.gz"))):
+            with gzip.open(archivo, "rt", encoding="utf-8") as f:
+                for linea in f:
+                    fila = json.loads(linea)
+                    mensajes.append({"message": fila["user_message"], "channel": fila["channel"],
+                                     "logged_results": fila.get("results_count")})
+    if os.path.exists(database.LOG_PATH):
+        with sqlite3.connect(database.LOG_PATH) as conn:
+            try:
+                filas = conn.execute(
+                    "SELECT user_message, channel, results_count FROM logs ORDER BY id DESC LIMIT ?", (limit,)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                filas = []
+        mensajes.extend({"message": m, "channel": c, "logged_results": r} for m, c, r in reversed(filas))
+    return mensajes[-limit:]
+
+
+def cargar_loadtest() -> List[Dict[str, Any]]:
+    from loadtest.corpus import CONSULTAS, FILTROS_SIDEBAR
+    return [{"message": consulta, "channel": "web", "filters": sidebar}
+            for sidebar in FILTROS_SIDEBAR for consulta in CONSULTAS]
+
+
+def cargar_archivo(path: str) -> List[Dict[str, Any]]:
+    mensajes = []
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            if path.endswith(".jsonl"):
+                item = json.loads(linea)
+                mensajes.append({"message": item["message"], "channel": item.get("channel", "web"),
+                                 "filters": item.get("filters") or {}})
+            else:
+                mensajes.append({"message": linea, "channel": "web"})
+    return mensajes
+
+
+def cargar_corpus(fuente: str, limit: int, include_archive: bool) -> List[Dict[str, Any]]:
+    if fuente == "logs":
+        return cargar_logs(limit, include_archive)
+    if fuente == "loadtest":
+        return cargar_loadtest()
+    return cargar_archivo(fuente)[:limit]
+
+
+# ✅ LLM
+class LLMOffline:
+    """Stub o respuestas grabadas; con `record` los faltantes se piden a Gemini y se guardan."""
+
+    def __init__(self, modo: str, cache_file: Optional[str], record: bool):
+        self.modo = modo
+        self.cache_file = cache_file
+        self.record = record
+        self.respuestas: Dict[str, str] = {}
+        self.contadores: Counter = Counter()
+        if modo == "cache" and cache_file and os.path.exists(cache_file):
+            with open(cache_file, encoding="utf-8") as f:
+                self.respuestas = json.load(f)
+
+    def __call__(self, prompt: str, generation: Dict[str, Any], results: Optional[List[Dict]]) -> str:
+        if self.modo == "cache":
+            key = llm_cache_key(prompt, generation)
+            if key in self.respuestas:
+                self.contadores["cache_hit"] += 1
+                return self.respuestas[key]
+            if self.record:
+                self.contadores["recorded"] += 1
+                self.respuestas[key] = call_gemini_with_rotation(prompt, generation)
+                return self.respuestas[key]
+            self.contadores["cache_miss"] += 1
+        else:
+            self.contadores["stub"] += 1
+        answer = RESPUESTAS_STUB[bool(results) if results is not None else None]
+        if "response_mime_type" in generation:
+            answer = json.dumps({"mensaje": answer}, ensure_ascii=False)
+        return answer
+
+    def guardar(self):
+        if self.modo == "cache" and self.record and self.cache_file:
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump(self.respuestas, f, ensure_ascii=False, indent=0)
+
+
+# ✅ REPLAY
+def percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def replay(corpus: List[Dict[str, Any]], llm: LLMOffline) -> Dict[str, Any]:
+    from main import armar_prompt, limpiar_respuesta_con_resultados
+    from logic.catalog import property_catalog
+
+    tiempos: Dict[str, List[float]] = defaultdict(list)
+    items = []
+    reloj = time.perf_counter
+
+    inicio = reloj()
+    for entrada in corpus:
+        user_text = entrada["message"].strip()
+        channel = entrada.get("channel") or "web"
+        text_lower = user_text.lower()
+
+        t = reloj()
+        filters = dict(entrada.get("filters") or {})
+        filters.update(detect_filters(text_lower))
+        tiempos["detect_filters"].append(reloj() - t)
+
+        t = reloj()
+        canonicos = canonicalize_filters(filters)
+        tiempos["canonicalize"].append(reloj() - t)
+
+        results = None
+        if filters:
+            t = reloj()
+            results = property_catalog.resolver(database.buscar_ids(canonicos))
+            tiempos["query_properties"].append(reloj() - t)
+
+        t = reloj()
+        intent = classify_intent(text_lower, filters, results)
+        answer = render_template(intent, channel, results, filters)
+        tiempos["intent_template"].append(reloj() - t)
+
+        prompt_hash = None
+        if answer is None:
+            t = reloj()
+            prompt, generation = armar_prompt(user_text, results, filters, channel, [])
+            tiempos["build_prompt"].append(reloj() - t)
+            prompt_hash = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+            t = reloj()
+            answer = llm(prompt, generation, results)
+            tiempos["llm"].append(reloj() - t)
+
+            t = reloj()
+            mensaje = parse_structured_answer(answer) if "response_mime_type" in generation else None
+            if mensaje is None and results:
+                limpiar_respuesta_con_resultados(answer, len(results))
+            tiempos["postproceso"].append(reloj() - t)
+
+        items.append({
+            "message": user_text,
+            "filters": canonicos,
+            "ids": [r.get("id_temporal") for r in results] if results is not None else None,
+            "intent": intent,
+            "prompt_hash": prompt_hash,
+            "logged_results": entrada.get("logged_results"),
+        })
+    total = reloj() - inicio
+
+    return {"items": items, "tiempos": tiempos, "total_s": total}
+
+
+# ✅ REPORTES
+def reporte_etapas(tiempos: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        etapa: {
+            "calls": len(tiempos[etapa]),
+            "total_ms": round(sum(tiempos[etapa]) * 1000, 2),
+            "mean_us": round(sum(tiempos[etapa]) / len(tiempos[etapa]) * 1e6, 1),
+            "p50_us": round(percentil(tiempos[etapa], 0.5) * 1e6, 1),
+            "p95_us": round(percentil(tiempos[etapa], 0.95) * 1e6, 1),
+        }
+        for etapa in ETAPAS if tiempos.get(etapa)
+    }
+
+
+def distribucion_resultados(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    tramos: Dict[str, int] = {}
+    for minimo, maximo in TRAMOS:
+        nombre = str(minimo) if minimo == maximo else (f"{minimo}+" if maximo is None else f"{minimo}-{maximo}")
+        tramos[nombre] = sum(
+            1 for i in items if i["ids"] is not None
+            and len(i["ids"]) >= minimo and (maximo is None or len(i["ids"]) <= maximo)
+        )
+    con_log = [i for i in items if i["ids"] is not None and i["logged_results"] is not None]
+    return {
+        "searches": sum(1 for i in items if i["ids"] is not None),
+        "no_search": sum(1 for i in items if i["ids"] is None),
+        "buckets": tramos,
+        # Contra lo registrado en su momento (el catálogo pudo haber cambiado desde entonces)
+        "differs_from_logged": sum(1 for i in con_log if len(i["ids"]) != i["logged_results"]),
+    }
+
+
+def comparar_etiquetas(path: str) -> Dict[str, Any]:
+    """Compara detect_filters (canónico) contra el set etiquetado {"message", "filters"}."""
+    total = 0
+    exactos = 0
+    por_clave: Dict[str, Counter] = defaultdict(Counter)
+    ejemplos = []
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            if not linea.strip():
+                continue
+            item = json.loads(linea)
+            total += 1
+            esperado = canonicalize_filters(item.get("filters") or {})
+            obtenido = canonicalize_filters(detect_filters(item["message"].lower()))
+            if esperado == obtenido:
+                exactos += 1
+                continue
+            for clave in set(esperado) | set(obtenido):
+                if clave not in obtenido:
+                    por_clave[clave]["missing"] += 1
+                elif clave not in esperado:
+                    por_clave[clave]["extra"] += 1
+                elif esperado[clave] != obtenido[clave]:
+                    por_clave[clave]["wrong"] += 1
+            ejemplos.append({"message": item["message"], "expected": esperado, "got": obtenido})
+    return {
+        "labeled": total,
+        "exact_match": exactos,
+        "exact_match_rate": round(exactos / total, 3) if total else None,
+        "by_key": {k: dict(v) for k, v in sorted(por_clave.items())},
+        "diffs": ejemplos,
+    }
+
+
+def comparar_snapshot(items: List[Dict[str, Any]], path: str) -> Dict[str, Any]:
+    """Diferencias por mensaje contra un snapshot guardado con --save-snapshot sobre el mismo corpus."""
+    with open(path, encoding="utf-8") as f:
+        anteriores = json.load(f)["items"]
+    if len(anteriores) != len(items):
+        return {"error": f"el snapshot tiene {len(anteriores)} mensajes y esta corrida {len(items)}"}
+
+    contadores: Counter = Counter()
+    ejemplos = []
+    for antes, ahora in zip(anteriores, items):
+        if antes["message"] != ahora["message"]:
+            return {"error": "el snapshot es de otro corpus (los mensajes no coinciden)"}
+        cambios = [campo for campo in ("filters", "ids", "intent", "prompt_hash") if antes[campo] != ahora[campo]]
+        if cambios and antes["ids"] is not None and ahora["ids"] is not None and "ids" in cambios \
+                and sorted(antes["ids"]) == sorted(ahora["ids"]):
+            # Mismos resultados en otro orden
+            cambios[cambios.index("ids")] = "order"
+        for campo in cambios:
+            contadores[campo] += 1
+        if cambios and len(ejemplos) < 20:
+            ejemplos.append({"message": ahora["message"], "changed": cambios,
+                             "before": {c: antes[c if c != "order" else "ids"] for c in cambios},
+                             "after": {c: ahora[c if c != "order" else "ids"] for c in cambios}})
+    return {
+        "compared": len(items),
+        "identical": len(items) - sum(1 for a, b in zip(anteriores, items)
+                                      if any(a[c] != b[c] for c in ("filters", "ids", "intent", "prompt_hash"))),
+        "changed": dict(contadores),
+        "examples": ejemplos,
+    }
+
+
+def imprimir(reporte: Dict[str, Any]):
+    print(f"Mensajes: {reporte['messages']}  |  {reporte['throughput_msgs_s']:.0f} msgs/s  |  "
+          f"total {reporte['total_ms']:.0f} ms  |  catálogo: {reporte['catalog']}")
+    print(f"\n{'etapa':<18} {'llamadas':>9} {'total ms':>10} {'media µs':>10} {'p50 µs':>10} {'p95 µs':>10}")
+    for etapa, e in reporte["stages"].items():
+        print(f"{etapa:<18} {e['calls']:>9} {e['total_ms']:>10.1f} {e['mean_us']:>10.1f} {e['p50_us']:>10.1f} {e['p95_us']:>10.1f}")
+
+    dist = reporte["results"]
+    print(f"\nBúsquedas: {dist['searches']}  sin búsqueda: {dist['no_search']}  "
+          f"distinto a lo registrado: {dist['differs_from_logged']}")
+    for tramo, n in dist["buckets"].items():
+        print(f"  {tramo:>6} resultados: {n}")
+    print("\nIntenciones: " + ", ".join(f"{k}={v}" for k, v in reporte["intents"].items()))
+    print("LLM: " + (", ".join(f"{k}={v}" for k, v in reporte["llm"].items()) or "sin llamadas"))
+
+    if "labels" in reporte:
+        lab = reporte["labels"]
+        print(f"\nEtiquetas: {lab['exact_match']}/{lab['labeled']} exactas ({lab['exact_match_rate']:.0%})")
+        for clave, c in lab["by_key"].items():
+            print(f"  {clave:<12} " + ", ".join(f"{k}={v}" for k, v in sorted(c.items())))
+        for d in lab["diffs"][:10]:
+            print(f"  - {d['message']!r}: esperado {d['expected']} / obtenido {d['got']}")
+
+    if "snapshot" in reporte:
+        snap = reporte["snapshot"]
+        if "error" in snap:
+            print(f"\nSnapshot: {snap['error']}")
+        else:
+            print(f"\nSnapshot: {snap['identical']}/{snap['compared']} idénticos  "
+                  + ", ".join(f"{k}={v}" for k, v in snap["changed"].items()))
+            for ej in snap["examples"][:10]:
+                print(f"  - {ej['message']!r}: {', '.join(ej['changed'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay offline de mensajes por el pipeline de /chat")
+    parser.add_argument("--corpus", default="logs", help="logs | loadtest | archivo .txt/.jsonl")
+    parser.add_argument("--limit", type=int, default=5000, help="Mensajes como máximo")
+    parser.add_argument("--include-archive", action="store_true", help="Sumar los logs archivados en LOG_ARCHIVE_DIR")
+    parser.add_argument("--repeat", type=int, default=1, help="Repetir el corpus N veces (para medir a escala)")
+    parser.add_argument("--db", help="Catálogo a usar en lugar de DB_PATH")
+    parser.add_argument("--synthetic", type=int, help="Usar un catálogo sintético de N propiedades")
+    parser.add_argument("--llm", choices=["stub", "cache"], default="stub")
+    parser.add_argument("--llm-cache-file", default=os.path.join("instance", "replay_llm.json"))
+    parser.add_argument("--record", action="store_true", help="Con --llm cache: pedir a Gemini los faltantes y grabarlos")
+    parser.add_argument("--labels", help="JSONL {message, filters} para medir la extracción de filtros")
+    parser.add_argument("--save-snapshot", help="Guardar filtros, ids, intención y prompt por mensaje")
+    parser.add_argument("--compare", help="Comparar contra un snapshot; sale con 1 si hay diferencias")
+    parser.add_argument("--json", help="Guardar el reporte completo en JSON")
+    args = parser.parse_args()
+
+    corpus = cargar_corpus(args.corpus, args.limit, args.include_archive) * max(1, args.repeat)
+    if not corpus:
+        print(f"El corpus '{args.corpus}' está vacío (probá --corpus loadtest)")
+        sys.exit(2)
+
+    llm = LLMOffline(args.llm, args.llm_cache_file, args.record)
+    db_original = database.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            if args.synthetic:
+                from bench.synthetic import crear_bd_sintetica
+                database.DB_PATH = os.path.join(tmp, f"catalogo_{args.synthetic}.db")
+                crear_bd_sintetica(database.DB_PATH, args.synthetic)
+            elif args.db:
+                database.DB_PATH = args.db
+            catalogo = database.DB_PATH
+            resultado = replay(corpus, llm)
+        finally:
+            database.DB_PATH = db_original
+    llm.guardar()
+
+    items = resultado["items"]
+    reporte: Dict[str, Any] = {
+        "messages": len(items),
+        "catalog": f"sintético {args.synthetic}" if args.synthetic else catalogo,
+        "total_ms": round(resultado["total_s"] * 1000, 1),
+        "throughput_msgs_s": len(items) / resultado["total_s"] if resultado["total_s"] else 0.0,
+        "stages": reporte_etapas(resultado["tiempos"]),
+        "results": distribucion_resultados(items),
+        "intents": dict(Counter(i["intent"] for i in items).most_common()),
+        "llm": dict(llm.contadores),
+    }
+    if args.labels:
+        reporte["labels"] = comparar_etiquetas(args.labels)
+    if args.compare:
+        reporte["snapshot"] = comparar_snapshot(items, args.compare)
+
+    imprimir(reporte)
+
+    if args.save_snapshot:
+        with open(args.save_snapshot, "w", encoding="utf-8") as f:
+            json.dump({"corpus": args.corpus, "catalog": reporte["catalog"], "items": items}, f, ensure_ascii=False)
+        print(f"\nSnapshot guardado en {args.save_snapshot}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+
+    snapshot = reporte.get("snapshot")
+    if snapshot and ("error" in snapshot or snapshot["changed"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
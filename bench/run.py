@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks del pipeline de /chat con umbrales de regresión.
+
+Etapas medidas:
+    detect_filters               sobre el corpus de mensajes de usuario
+    query_properties@N           sobre catálogos sintéticos de N propiedades
+    query_radio@N                "cerca de X" (radio de 1 km) sobre el índice de geohash
+    build_prompt@N               con los resultados de una búsqueda típica
+    limpiar_respuesta            el post-proceso de respuestas de Gemini de main.chat
+    chat_response_json@N         serialización de ChatResponse (pydantic) con esos resultados
+    buscar_resolver@N            camino de /chat: buscar_ids + resolver contra el catálogo en memoria
+    json_lista@N                 serialización de /chat con el JSON precalculado de cada registro
+
+Uso:
+    python -m bench.run                      # compara contra bench/baseline.json
+    python -m bench.run --save-baseline      # guarda los resultados como nuevo baseline
+    python -m bench.run --sizes 1000 10000 --tolerance 0.5
+
+Sale con código 1 si alguna etapa es más lenta que baseline * (1 + tolerancia).
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+from typing import Callable, Dict, List
+
+import logic.database as database
+from logic.catalog import CatalogStore
+from logic.filters import detect_filters, canonicalize_filters
+from logic.gemini_client import build_prompt
+from loadtest.corpus import CONSULTAS, FILTROS_SIDEBAR
+from bench.synthetic import crear_bd_sintetica
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+# Búsqueda representativa para medir prompt y serialización con resultados reales
+CONSULTA_TIPICA = "casa en venta en palermo"
+
+# Búsquedas por cercanía: deben resolverse por el índice, no recorriendo el catálogo
+FILTROS_RADIO = [
+    {"cerca_de": "plaza italia"},
+    {"cerca_de": "obelisco", "operacion": "alquiler"},
+    {"lat": -34.5617, "lon": -58.4504, "radio_km": 0.5},
+    {"max_dist_subte_km": 0.3, "tipo": "departamento"},
+]
+
+RESPUESTAS_GEMINI = [
+    "¡Perfecto! Encontré varias propiedades que coinciden con tu búsqueda. Te las muestro abajo 👇",
+    "Encontré estas opciones:\n\n1. 🏠 Casa en Palermo\n📍 Palermo\n💰 USD 250.000\n\n"
+    "2. 🏠 Casa en Belgrano\n📍 Belgrano\n💰 USD 310.000\n\n¿Querés que ajuste algún filtro?",
+    "Tengo opciones para vos.\n1) Departamento luminoso\n2) PH reciclado\n\nAvisame si querés más detalles.",
+    "Ok",
+]
+
+
+def medir(fn: Callable[[], object], repeats: int, min_time: float) -> float:
+    """Devuelve la mediana (en segundos) de una llamada a `fn` sobre `repeats` tandas."""
+    fn()  # calentamiento
+    tiempos = []
+    for _ in range(repeats):
+        loops = 0
+        inicio = time.perf_counter()
+        while True:
+            fn()
+            loops += 1
+            transcurrido = time.perf_counter() - inicio
+            if transcurrido >= min_time:
+                break
+        tiempos.append(transcurrido / loops)
+    return statistics.median(tiempos)
+
+
+def filtros_del_corpus() -> List[Dict]:
+    filtros = []
+    for consulta in CONSULTAS:
+        for sidebar in FILTROS_SIDEBAR:
+            combinados = dict(sidebar)
+            combinados.update(detect_filters(consulta.lower()))
+            if combinados:
+                filtros.append(combinados)
+    return filtros
+
+
+def ejecutar(sizes: List[int], repeats: int, min_time: float) -> Dict[str, float]:
+    """Corre todas las etapas y devuelve microsegundos por operación."""
+    from main import ChatResponse, limpiar_respuesta_con_resultados, chat_response_json
+
+    resultados: Dict[str, float] = {}
+
+    mensajes = [c.lower() for c in CONSULTAS]
+    t = medir(lambda: [detect_filters(m) for m in mensajes], repeats, min_time)
+    resultados["detect_filters"] = t / len(mensajes) * 1e6
+
+    t = medir(lambda: [limpiar_respuesta_con_resultados(r, 5) for r in RESPUESTAS_GEMINI], repeats, min_time)
+    resultados["limpiar_respuesta"] = t / len(RESPUESTAS_GEMINI) * 1e6
+
+    lista_filtros = filtros_del_corpus()
+    filtros_tipicos = detect_filters(CONSULTA_TIPICA)
+    db_original = database.DB_PATH
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for size in sizes:
+                database.DB_PATH = os.path.join(tmp, f"catalogo_{size}.db")
+                crear_bd_sintetica(database.DB_PATH, size)
+
+                # query_properties es caro en catálogos grandes: una muestra del corpus alcanza
+                muestra = lista_filtros[:: max(1, len(lista_filtros) // 20)]
+                t = medir(lambda: [database.query_properties(f) for f in muestra], repeats, min_time)
+                resultados[f"query_properties@{size}"] = t / len(muestra) * 1e6
+
+                t = medir(lambda: [database.query_properties(f) for f in FILTROS_RADIO], repeats, min_time)
+                resultados[f"query_radio@{size}"] = t / len(FILTROS_RADIO) * 1e6
+
+                results = database.query_properties(filtros_tipicos)
+                t = medir(lambda: build_prompt(CONSULTA_TIPICA, results, filtros_tipicos, "web", ""), repeats, min_time)
+                resultados[f"build_prompt@{size}"] = t * 1e6
+
+                def serializar():
+                    return ChatResponse(
+                        response=RESPUESTAS_GEMINI[0],
+                        results_count=len(results),
+                        search_performed=True,
+                        propiedades=results,
+                    ).json()
+                t = medir(serializar, repeats, min_time)
+                resultados[f"chat_response_json@{size}"] = t * 1e6
+
+                # Lo que hace query_properties_cached en un fallo de cache (catálogo ya cargado)
+                catalogo = CatalogStore()
+                catalogo.registros()
+                canonicos = [canonicalize_filters(f) for f in muestra]
+                t = medir(lambda: [catalogo.resolver(database.buscar_ids(f)) for f in canonicos], repeats, min_time)
+                resultados[f"buscar_resolver@{size}"] = t / len(canonicos) * 1e6
+
+                registros = catalogo.resolver(database.buscar_ids(canonicalize_filters(filtros_tipicos)))
+                resultado_chat = {"answer": RESPUESTAS_GEMINI[0], "results": registros,
+                                  "search_performed": True, "session_id": None}
+                t = medir(lambda: chat_response_json(resultado_chat), repeats, min_time)
+                resultados[f"json_lista@{size}"] = t * 1e6
+        finally:
+            database.DB_PATH = db_original
+
+    return resultados
+
+
+def comparar(actual: Dict[str, float], baseline: Dict[str, float], tolerancia: float) -> List[str]:
+    """Imprime la comparación y devuelve las etapas que regresionaron."""
+    regresiones = []
+    print(f"{'etapa':<28} {'actual µs':>12} {'baseline µs':>12} {'delta':>8}")
+    for etapa, valor in actual.items():
+        base = baseline.get(etapa)
+        if base is None:
+            print(f"{etapa:<28} {valor:>12.1f} {'-':>12} {'nuevo':>8}")
+            continue
+        delta = (valor - base) / base
+        marca = ""
+        if delta > tolerancia:
+            regresiones.append(etapa)
+            marca = "  ❌ REGRESIÓN"
+        print(f"{etapa:<28} {valor:>12.1f} {base:>12.1f} {delta:>+8.0%}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de Dante Propiedades")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Tamaños de catálogo")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Segundos mínimos por tanda")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Regresión tolerada (0.3 = +30%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    actual = ejecutar(args.sizes, args.repeats, args.min_time)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {"python": platform.python_version(), "platform": platform.platform()},
+                "stages": {k: round(v, 2) for k, v in actual.items()},
+            }, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Baseline guardado en {args.baseline}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("stages", {})
+
+    regresiones = comparar(actual, baseline, args.tolerance)
+    if regresiones:
+        print(f"\n{len(regresiones)} etapa(s) por encima de la tolerancia: {', '.join(regresiones)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Perfil de arranque en frío: cuánto tarda `import main` y cuánto tarda
+uvicorn en abrir el puerto y en quedar listo.
+
+Mide en procesos nuevos (sin caches de import calientes en memoria):
+    import_ms     `python -X importtime -c "import main"`, total del módulo main
+    top           los módulos con mayor tiempo acumulado de import
+    bind_ms       desde que arranca uvicorn hasta que /healthz responde
+    ready_ms      desde que arranca uvicorn hasta que /readyz responde 200
+
+Uso:
+    python -m bench.startup
+    python -m bench.startup --top 20 --max-bind-ms 1000
+
+Sale con código 1 si bind_ms supera --max-bind-ms.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import urllib.request
+import urllib.error
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def perfil_import(top: int) -> Tuple[float, List[Tuple[float, str]]]:
+    """Devuelve (ms totales de import de main, [(ms acumulados, módulo), ...])."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    modulos = []
+    total = 0.0
+    for linea in proc.stderr.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        partes = linea[len("import time:"):].split("|")
+        try:
+            acumulado = int(partes[1]) / 1000
+        except ValueError:
+            continue  # encabezado
+        nombre = partes[2].rstrip()
+        if nombre.strip() == "main":
+            total = acumulado
+        modulos.append((acumulado, nombre.strip()))
+    modulos.sort(reverse=True)
+    return total, modulos[:top]
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _esperar(url: str, limite: float, solo_200: bool) -> float:
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < limite:
+        try:
+            with urllib.request.urlopen(url, timeout=0.5) as resp:
+                if not solo_200 or resp.status == 200:
+                    return time.perf_counter()
+        except urllib.error.HTTPError:
+            if not solo_200:
+                return time.perf_counter()
+        except OSError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} no respondió en {limite}s")
+
+
+def perfil_arranque(limite: float) -> Dict[str, float]:
+    """Levanta uvicorn en un puerto libre y mide bind y readiness."""
+    port = _puerto_libre()
+    base = f"http://127.0.0.1:{port}"
+    inicio = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        bind = _esperar(f"{base}/healthz", limite, solo_200=False)
+        ready = _esperar(f"{base}/readyz", limite, solo_200=True)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return {"bind_ms": round((bind - inicio) * 1000, 1), "ready_ms": round((ready - inicio) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de arranque en frío de Dante Propiedades")
+    parser.add_argument("--top", type=int, default=15, help="Módulos a listar por tiempo de import")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Segundos máximos esperando al servidor")
+    parser.add_argument("--max-bind-ms", type=float, default=None, help="Falla si abrir el puerto tarda más")
+    args = parser.parse_args()
+
+    total, top = perfil_import(args.top)
+    print(f"import main: {total:.1f} ms")
+    for ms, nombre in top:
+        print(f"  {ms:9.1f} ms  {nombre}")
+
+    tiempos = perfil_arranque(args.timeout)
+    print(f"puerto abierto (/healthz): {tiempos['bind_ms']} ms")
+    print(f"listo (/readyz):           {tiempos['ready_ms']} ms")
+
+    if args.max_bind_ms is not None and tiempos["bind_ms"] > args.max_bind_ms:
+        print(f"REGRESIÓN: bind_ms {tiempos['bind_ms']} > {args.max_bind_ms}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
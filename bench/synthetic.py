@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Catálogos sintéticos de propiedades para los benchmarks.
+"""
+import json
+import random
+import sqlite3
+from typing import Dict, List
+
+from logic.database import (
+    PROPERTIES_TABLE_SQL, GEO_INDEXES_SQL, PRECIO_INDEX_SQL, COTIZACIONES_DEFAULT,
+    asegurar_cotizaciones, precio_en_usd,
+)
+from logic.filter_data import BARRIOS, OPERACIONES, TIPOS
+from logic.gazetteer import BARRIOS_COORDS, distancia_subte_km
+from logic.geo import geohash_encode
+
+COLUMNAS = [
+    "id_temporal", "titulo", "barrio", "precio", "ambientes", "metros_cuadrados",
+    "descripcion", "operacion", "tipo", "direccion", "antiguedad", "expensas",
+    "cochera", "balcon", "pileta", "acepta_mascotas", "aire_acondicionado",
+    "moneda_precio", "moneda_expensas", "fotos", "videos", "documentos",
+    "lat", "lon", "geo_precision", "geohash", "dist_subte_km", "precio_usd",
+]
+
+
+def generar_propiedad(i: int, rng: random.Random) -> Dict:
+    barrio = rng.choice(BARRIOS)
+    tipo = rng.choice(TIPOS)
+    operacion = rng.choice(OPERACIONES)
+    moneda = "USD" if operacion == "venta" or rng.random() < 0.3 else "ARS"
+    precio = rng.randint(50_000, 900_000) if moneda == "USD" else rng.randint(200_000, 2_000_000)
+    # Dispersas ~1.5 km alrededor del centro del barrio
+    lat = BARRIOS_COORDS[barrio][0] + rng.uniform(-0.015, 0.015)
+    lon = BARRIOS_COORDS[barrio][1] + rng.uniform(-0.015, 0.015)
+    return {
+        "id_temporal": f"SYN{i:06d}",
+        "titulo": f"{tipo.title()} en {barrio}",
+        "barrio": barrio,
+        "precio": float(precio),
+        "ambientes": rng.randint(1, 6),
+        "metros_cuadrados": float(rng.randint(25, 400)),
+        "descripcion": "Propiedad sintética para benchmarks, luminosa y bien ubicada.",
+        "operacion": operacion,
+        "tipo": tipo,
+        "direccion": f"Calle {rng.randint(1, 300)} al {rng.randint(100, 9000)}",
+        "antiguedad": rng.randint(0, 80),
+        "expensas": float(rng.randint(0, 150_000)),
+        "cochera": rng.choice(["Si", "No"]),
+        "balcon": rng.choice(["Si", "No"]),
+        "pileta": rng.choice(["Si", "No"]),
+        "acepta_mascotas": rng.choice(["Si", "No"]),
+        "aire_acondicionado": rng.choice(["Si", "No"]),
+        "moneda_precio": moneda,
+        "moneda_expensas": "ARS",
+        "fotos": [f"imgs/SYN{i:06d}-{n}.jpg" for n in range(1, rng.randint(2, 10))],
+        "videos": [],
+        "documentos": [],
+        "lat": lat,
+        "lon": lon,
+        "geo_precision": "direccion",
+        "geohash": geohash_encode(lat, lon),
+        "dist_subte_km": round(distancia_subte_km(lat, lon), 3),
+        "precio_usd": precio_en_usd(precio, moneda, COTIZACIONES_DEFAULT),
+    }
+
+
+def generar_catalogo(size: int, seed: int = 42) -> List[Dict]:
+    rng = random.Random(seed)
+    return [generar_propiedad(i, rng) for i in range(size)]
+
+
+def crear_bd_sintetica(path: str, size: int, seed: int = 42):
+    """Crea (o reemplaza) una BD SQLite en `path` con `size` propiedades sintéticas."""
+    with sqlite3.connect(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DROP TABLE IF EXISTS properties")
+        cursor.execute(PROPERTIES_TABLE_SQL)
+        for sql in GEO_INDEXES_SQL + [PRECIO_INDEX_SQL]:
+            cursor.execute(sql)
+        asegurar_cotizaciones(cursor)
+        placeholders = ", ".join("?" for _ in COLUMNAS)
+        filas = []
+        for prop in generar_catalogo(size, seed):
+            for key in ("fotos", "videos", "documentos"):
+                prop[key] = json.dumps(prop[key])
+            filas.append(tuple(prop[c] for c in COLUMNAS))
+        cursor.executemany(
+            f"INSERT INTO properties ({', '.join(COLUMNAS)}) VALUES ({placeholders})", filas
+        )
+        conn.commit()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Consultas de usuario realistas para las pruebas de carga.
+"""
+
+CONSULTAS = [
+    "hola",
+    "buenas, quiero alquilar",
+    "busco departamento en palermo",
+    "casa en venta en parque avellaneda",
+    "departamento 2 ambientes en belgrano hasta 150000 usd",
+    "alquiler de oficina en microcentro",
+    "tenés algo en villa crespo?",
+    "ph en almagro desde 80000",
+    "casa con pileta en pilar",
+    "terreno en venta en pilar",
+    "busco 3 ambientes en recoleta",
+    "oficina en alquiler hasta 700000 pesos",
+    "departamento de 50 m2 en colegiales",
+    "monoambiente en alquiler",
+    "casaquinta en san isidro",
+    "qué barrios tienen disponibles?",
+    "aceptan mascotas?",
+    "cuánto son las expensas del departamento de boedo?",
+    "quiero comprar una casa en vicente lopez",
+    "precio máximo 200000 dólares, 4 amb",
+    "y con cochera?",
+    "gracias!",
+]
+
+# Filtros típicos que manda la barra lateral del frontend (js/filtros.js)
+FILTROS_SIDEBAR = [
+    {},
+    {"operacion": "venta"},
+    {"operacion": "alquiler"},
+    {"neighborhood": "Palermo"},
+    {"tipo": "casa", "operacion": "venta"},
+    {"min_rooms": 2, "max_price": 200000},
+    {"neighborhood": "Microcentro", "tipo": "oficina"},
+]
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor Gemini falso para pruebas de carga sin gastar quota.
+
+Implementa la forma de la API REST v1beta que usa el backend:
+    POST /v1beta/models/{modelo}:generateContent
+    POST /v1beta/models/{modelo}:streamGenerateContent   (?alt=sse para SSE)
+
+La latencia, las tasas de error 429/500 y las claves "agotadas" son
+configurables para probar la rotación de claves bajo tormentas de 429.
+Respeta maxOutputTokens (aprox. por palabras) y responseMimeType JSON.
+
+Uso:
+    python -m loadtest.fake_gemini --port 8081 --latency-ms 800 --rate-429 0.2
+
+y luego levantar el backend apuntando a él:
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8081 GEMINI_API_KEY_1=fake-1 uvicorn main:app
+"""
+import json
+import random
+import asyncio
+import argparse
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Set, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+RESPUESTAS = [
+    "¡Perfecto! Encontré varias propiedades que coinciden con tu búsqueda. Te las muestro abajo 👇",
+    "Excelente, tengo algunas opciones que podrían interesarte. ¿Querés que ajuste algún filtro?",
+    "No encontré propiedades con esos filtros. ¿Querés probar con otros barrios o precios?",
+    "¡Hola! Contame qué tipo de propiedad estás buscando y en qué zona.",
+]
+
+
+@dataclass
+class FakeGeminiConfig:
+    latency_ms: float = 500.0
+    jitter_ms: float = 200.0
+    rate_429: float = 0.0
+    rate_500: float = 0.0
+    token_delay_ms: float = 30.0
+    exhausted_keys: Set[str] = field(default_factory=set)
+
+
+def _error(code: int, status: str, message: str) -> JSONResponse:
+    return JSONResponse(status_code=code, content={"error": {"code": code, "message": message, "status": status}})
+
+
+def _candidate(text: str, finish: Optional[str] = "STOP") -> dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finish:
+        candidate["finishReason"] = finish
+    return {"candidates": [candidate]}
+
+
+def create_app(config: FakeGeminiConfig) -> FastAPI:
+    """Crea la app del Gemini falso con la configuración dada."""
+    app = FastAPI(title="Fake Gemini")
+    stats = Counter()
+
+    async def simular(request: Request) -> Optional[JSONResponse]:
+        key = request.query_params.get("key") or request.headers.get("x-goog-api-key", "")
+        stats["requests"] += 1
+        stats[f"key:{key[:12]}"] += 1
+
+        delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        if key in config.exhausted_keys or random.random() < config.rate_429:
+            stats["429"] += 1
+            return _error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).")
+        if random.random() < config.rate_500:
+            stats["500"] += 1
+            return _error(500, "INTERNAL", "An internal error has occurred.")
+        stats["200"] += 1
+        return None
+
+    @app.post("/v1beta/models/{model_action}")
+    async def generate(model_action: str, request: Request):
+        _, _, action = model_action.partition(":")
+        error = await simular(request)
+        if error is not None:
+            return error
+
+        try:
+            body = await request.json()
+        except ValueError:
+            body = {}
+        generation = body.get("generationConfig") or {}
+        texto = random.choice(RESPUESTAS)
+        max_tokens = generation.get("maxOutputTokens")
+        if max_tokens:
+            texto = " ".join(texto.split(" ")[: int(max_tokens)])
+        if generation.get("responseMimeType") == "application/json":
+            texto = json.dumps({"mensaje": texto}, ensure_ascii=False)
+
+        if action == "generateContent":
+            return _candidate(texto)
+        if action != "streamGenerateContent":
+            return _error(404, "NOT_FOUND", f"Acción no soportada: {action}")
+
+        sse = request.query_params.get("alt") == "sse"
+        tokens = texto.split(" ")
+
+        async def stream():
+            if not sse:
+                yield "["
+            for i, token in enumerate(tokens):
+                await asyncio.sleep(config.token_delay_ms / 1000)
+                ultimo = i == len(tokens) - 1
+                chunk = json.dumps(_candidate(token + ("" if ultimo else " "), "STOP" if ultimo else None), ensure_ascii=False)
+                if sse:
+                    yield f"data: {chunk}\r\n\r\n"
+                else:
+                    yield chunk + ("]" if ultimo else ",\r\n")
+
+        return StreamingResponse(stream(), media_type="text/event-stream" if sse else "application/json")
+
+    @app.get("/stats")
+    def get_stats():
+        return dict(stats)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Gemini falso para pruebas de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="Latencia media por llamada")
+    parser.add_argument("--jitter-ms", type=float, default=200.0, help="Desvío estándar de la latencia")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fracción de llamadas que devuelven 429")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Fracción de llamadas que devuelven 500")
+    parser.add_argument("--token-delay-ms", type=float, default=30.0, help="Pausa entre tokens en streaming")
+    parser.add_argument("--exhausted-keys", default="", help="Claves que siempre devuelven 429 (separadas por coma)")
+    args = parser.parse_args()
+
+    config = FakeGeminiConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        rate_500=args.rate_500,
+        token_delay_ms=args.token_delay_ms,
+        exhausted_keys={k.strip() for k in args.exhausted_keys.split(",") if k.strip()},
+    )
+
+    import uvicorn
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
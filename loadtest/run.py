@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Generador de tráfico asyncio contra /chat, /properties e /imgs.
+
+Reporta latencia p50/p95/p99 y throughput por endpoint.
+
+Uso:
+    python -m loadtest.run --base-url http://127.0.0.1:8000 --concurrency 50 --duration 60
+"""
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict, Counter
+from typing import Dict, List
+
+import httpx
+
+from loadtest.corpus import CONSULTAS, FILTROS_SIDEBAR
+
+CANALES = ["web", "web", "web", "whatsapp"]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class Resultados:
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.status: Dict[str, Counter] = defaultdict(Counter)
+        self.inicio = time.perf_counter()
+        self.fin = self.inicio
+
+    def registrar(self, endpoint: str, latencia: float, status: str):
+        self.latencias[endpoint].append(latencia)
+        self.status[endpoint][status] += 1
+
+    def resumen(self) -> Dict[str, dict]:
+        duracion = max(self.fin - self.inicio, 1e-9)
+        resumen = {}
+        for endpoint, valores in sorted(self.latencias.items()):
+            ordenados = sorted(valores)
+            resumen[endpoint] = {
+                "requests": len(valores),
+                "throughput_rps": round(len(valores) / duracion, 2),
+                "p50_ms": round(percentile(ordenados, 50) * 1000, 1),
+                "p95_ms": round(percentile(ordenados, 95) * 1000, 1),
+                "p99_ms": round(percentile(ordenados, 99) * 1000, 1),
+                "max_ms": round(ordenados[-1] * 1000, 1),
+                "status": dict(self.status[endpoint]),
+            }
+        return resumen
+
+
+def listar_imagenes(directorio: str = "imgs") -> List[str]:
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(os.listdir(directorio))
+
+
+async def request_chat(client: httpx.AsyncClient) -> httpx.Response:
+    payload = {
+        "message": random.choice(CONSULTAS),
+        "channel": random.choice(CANALES),
+        "filters": random.choice(FILTROS_SIDEBAR),
+    }
+    return await client.post("/chat", json=payload)
+
+
+async def request_properties(client: httpx.AsyncClient) -> httpx.Response:
+    return await client.get("/properties", params=random.choice(FILTROS_SIDEBAR))
+
+
+def crear_request_imgs(imagenes: List[str]):
+    async def request_imgs(client: httpx.AsyncClient) -> httpx.Response:
+        nombre = random.choice(imagenes) if imagenes else "UF000-1.jpeg"
+        return await client.get(f"/imgs/{nombre}")
+    return request_imgs
+
+
+async def worker(client: httpx.AsyncClient, escenarios, pesos, resultados: Resultados, deadline: float, restantes: List[int]):
+    while time.perf_counter() < deadline:
+        if restantes[0] == 0:
+            return
+        if restantes[0] > 0:
+            restantes[0] -= 1
+
+        endpoint, fn = random.choices(escenarios, weights=pesos)[0]
+        inicio = time.perf_counter()
+        try:
+            response = await fn(client)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        resultados.registrar(endpoint, time.perf_counter() - inicio, status)
+
+
+async def ejecutar(args) -> Resultados:
+    escenarios = [
+        ("/chat", request_chat),
+        ("/properties", request_properties),
+        ("/imgs", crear_request_imgs(listar_imagenes(args.imgs_dir))),
+    ]
+    pesos = [args.weight_chat, args.weight_properties, args.weight_imgs]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    resultados = Resultados()
+    deadline = time.perf_counter() + args.duration
+    restantes = [args.requests if args.requests else -1]
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        resultados.inicio = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, escenarios, pesos, resultados, deadline, restantes)
+            for _ in range(args.concurrency)
+        ))
+        resultados.fin = time.perf_counter()
+    return resultados
+
+
+def imprimir_resumen(resumen: Dict[str, dict]):
+    print(f"{'endpoint':<12} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  status")
+    for endpoint, r in resumen.items():
+        print(
+            f"{endpoint:<12} {r['requests']:>7} {r['throughput_rps']:>8} {r['p50_ms']:>9} "
+            f"{r['p95_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9}  {r['status']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de Dante Propiedades")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=20, help="Usuarios concurrentes")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duración máxima en segundos")
+    parser.add_argument("--requests", type=int, default=0, help="Cantidad total de requests (0 = sin límite)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--weight-chat", type=float, default=6)
+    parser.add_argument("--weight-properties", type=float, default=3)
+    parser.add_argument("--weight-imgs", type=float, default=1)
+    parser.add_argument("--imgs-dir", default="imgs")
+    parser.add_argument("--json", dest="json_out", help="Guardar el resumen en este archivo JSON")
+    args = parser.parse_args()
+
+    resultados = asyncio.run(ejecutar(args))
+    resumen = resultados.resumen()
+    imprimir_resumen(resumen)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Control de admisión para las llamadas a Gemini.
+
+Limita cuántas llamadas corren a la vez y encola el resto en colas por canal
+que se atienden en round-robin, para que un pico de tráfico web no deje sin
+turno a WhatsApp. Si la cola está llena o un pedido espera más que su
+deadline se lanza LLMSaturated con un Retry-After estimado.
+
+Variables de entorno:
+    GEMINI_MAX_CONCURRENCY   Llamadas simultáneas a Gemini (default 4).
+    GEMINI_MAX_QUEUE         Pedidos en espera como máximo (default 32).
+    GEMINI_QUEUE_TIMEOUT     Segundos máximos de espera en cola (default 5).
+"""
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict
+
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_MAX_QUEUE = int(os.environ.get("GEMINI_MAX_QUEUE", "32"))
+GEMINI_QUEUE_TIMEOUT = float(os.environ.get("GEMINI_QUEUE_TIMEOUT", "5"))
+
+
+class LLMSaturated(Exception):
+    """No hay capacidad para atender la llamada; reintentar después de `retry_after` segundos."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Gemini saturado ({reason}), reintentar en {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = GEMINI_MAX_CONCURRENCY, max_queue: int = GEMINI_MAX_QUEUE,
+                 queue_timeout: float = GEMINI_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+        self._avg_service_time = 1.0  # media móvil exponencial, en segundos
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def retry_after(self) -> int:
+        """Estimación de cuándo habrá lugar: cola actual / capacidad * tiempo de servicio."""
+        espera = (self._queued + 1) / max(1, self.max_concurrency) * self._avg_service_time
+        return max(1, math.ceil(espera))
+
+    def _grant_next(self):
+        """Entrega el slot liberado al siguiente canal con pedidos en espera (round-robin)."""
+        while self._queues and self.running < self.max_concurrency:
+            channel, waiters = next(iter(self._queues.items()))
+            self._queues.move_to_end(channel)
+            future = waiters.popleft()
+            self._queued -= 1
+            if not waiters:
+                del self._queues[channel]
+            if future.done():
+                continue
+            self.running += 1
+            future.set_result(True)
+
+    def _release(self, service_time: float):
+        self.running -= 1
+        self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * service_time
+        self._grant_next()
+
+    async def _acquire(self, channel: str, timeout: float):
+        if self.running < self.max_concurrency and not self._queued:
+            self.running += 1
+            return
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise LLMSaturated("queue_full", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(channel, deque()).append(future)
+        self._queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # El slot llegó justo al vencer el deadline: devolverlo
+                self._release(self._avg_service_time)
+            else:
+                future.cancel()
+                self._forget(channel, future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.timed_out += 1
+            raise LLMSaturated("queue_timeout", self.retry_after())
+
+    def _forget(self, channel: str, future: asyncio.Future):
+        waiters = self._queues.get(channel)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+            self._queued -= 1
+        except ValueError:
+            return
+        if not waiters:
+            del self._queues[channel]
+
+    @asynccontextmanager
+    async def slot(self, channel: str, timeout: float = None):
+        """Reserva un lugar para una llamada a Gemini del `channel` dado."""
+        await self._acquire(channel, self.queue_timeout if timeout is None else timeout)
+        self.admitted += 1
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - inicio)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "running": self.running,
+            "queued": self._queued,
+            "queued_by_channel": {c: len(w) for c, w in self._queues.items()},
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_service_time": round(self._avg_service_time, 3),
+        }
+
+
+gemini_admission = AdmissionController()
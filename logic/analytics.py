@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Analítica de conversaciones mantenida de forma incremental.
+
+log_conversation actualiza en memoria, por cada mensaje, contadores por canal,
+un sketch de cuantiles de latencia (histograma logarítmico tipo DDSketch, con
+error relativo acotado) y los top-k de barrios pedidos y de consultas sin
+resultados. /analytics sólo lee esos agregados: no hay SQL sobre `logs`.
+
+Cada worker vuelca su estado cada ANALYTICS_FLUSH_INTERVAL segundos en un
+archivo SQLite propio (ANALYTICS_PATH), separado de LOG_PATH, así leer la
+analítica nunca compite por el lock de la BD de logs. Los sketches se pueden
+mezclar, y /analytics combina los estados de todos los workers.
+
+Variables de entorno:
+    ANALYTICS_PATH             Archivo SQLite de snapshots (default instance/analytics.db).
+    ANALYTICS_FLUSH_INTERVAL   Segundos entre volcados (default 30).
+    ANALYTICS_TOP_K            Elementos por ranking (default 20).
+"""
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+ANALYTICS_PATH = os.environ.get("ANALYTICS_PATH", os.path.join(os.getcwd(), "instance", "analytics.db"))
+ANALYTICS_FLUSH_INTERVAL = float(os.environ.get("ANALYTICS_FLUSH_INTERVAL", "30"))
+ANALYTICS_TOP_K = int(os.environ.get("ANALYTICS_TOP_K", "20"))
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class QuantileSketch:
+    """Histograma con buckets logarítmicos: cuantiles con error relativo <= `alpha`, mezclable."""
+
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.max = max(self.max, value)
+        if value <= 1e-9:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: "QuantileSketch"):
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        acumulado = self.zeros
+        if rank < acumulado:
+            return 0.0
+        for index in sorted(self.buckets):
+            acumulado += self.buckets[index]
+            if acumulado > rank:
+                # Punto medio del bucket (gamma^(i-1), gamma^i]
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"alpha": self.alpha, "buckets": self.buckets, "zeros": self.zeros, "count": self.count, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data.get("alpha", 0.01))
+        sketch.buckets = {int(k): v for k, v in data.get("buckets", {}).items()}
+        sketch.zeros = data.get("zeros", 0)
+        sketch.count = data.get("count", 0)
+        sketch.max = data.get("max", 0.0)
+        return sketch
+
+
+class TopK:
+    """Ranking aproximado de frecuencias (space-saving) con memoria acotada."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+
+    def add(self, key: str, n: int = 1):
+        if key in self.counts or len(self.counts) < self.capacity:
+            self.counts[key] = self.counts.get(key, 0) + n
+            return
+        # Reemplaza al menos frecuente heredando su cuenta (cota superior del error)
+        minimo = min(self.counts, key=self.counts.get)
+        self.counts[key] = self.counts.pop(minimo) + n
+
+    def merge(self, other: "TopK"):
+        for key, n in other.counts.items():
+            self.add(key, n)
+
+    def top(self, n: int) -> List[tuple]:
+        return sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+
+class ChannelStats:
+    __slots__ = ("messages", "searches", "zero_results", "results_total", "latency")
+
+    def __init__(self):
+        self.messages = 0
+        self.searches = 0
+        self.zero_results = 0
+        self.results_total = 0
+        self.latency = QuantileSketch()
+
+    def merge(self, other: "ChannelStats"):
+        self.messages += other.messages
+        self.searches += other.searches
+        self.zero_results += other.zero_results
+        self.results_total += other.results_total
+        self.latency.merge(other.latency)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"messages": self.messages, "searches": self.searches, "zero_results": self.zero_results,
+                "results_total": self.results_total, "latency": self.latency.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ChannelStats":
+        stats = cls()
+        stats.messages = data.get("messages", 0)
+        stats.searches = data.get("searches", 0)
+        stats.zero_results = data.get("zero_results", 0)
+        stats.results_total = data.get("results_total", 0)
+        stats.latency = QuantileSketch.from_dict(data.get("latency", {}))
+        return stats
+
+    def report(self) -> Dict[str, Any]:
+        latencias = {f"p{int(q * 100)}": _ms(self.latency.quantile(q)) for q in PERCENTILES}
+        latencias["max"] = _ms(self.latency.max if self.latency.count else None)
+        return {
+            "messages": self.messages,
+            "searches": self.searches,
+            "search_hit_rate": round((self.searches - self.zero_results) / self.searches, 3) if self.searches else None,
+            "zero_result_searches": self.zero_results,
+            "avg_results": round(self.results_total / self.searches, 2) if self.searches else None,
+            "latency_ms": latencias,
+        }
+
+
+def _ms(segundos: Optional[float]) -> Optional[float]:
+    return round(segundos * 1000, 1) if segundos is not None else None
+
+
+def _normalizar_consulta(texto: str) -> str:
+    return " ".join(texto.lower().split())[:100]
+
+
+class ConversationAnalytics:
+    def __init__(self, top_k: int = ANALYTICS_TOP_K):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self.since = datetime.now(timezone.utc).isoformat()
+        self.channels: Dict[str, ChannelStats] = {}
+        # Más capacidad que lo que se muestra: mejora la precisión del ranking
+        self.barrios = TopK(top_k * 4)
+        self.zero_result_queries = TopK(top_k * 4)
+
+    def record(self, channel: str, response_time: float, search_performed: bool, results_count: int,
+               user_message: str = "", filters: Optional[Dict[str, Any]] = None):
+        """O(1) por mensaje: se llama desde log_conversation."""
+        with self._lock:
+            stats = self.channels.get(channel)
+            if stats is None:
+                stats = self.channels[channel] = ChannelStats()
+            stats.messages += 1
+            stats.latency.add(max(0.0, response_time or 0.0))
+            if search_performed:
+                stats.searches += 1
+                stats.results_total += results_count or 0
+                if not results_count:
+                    stats.zero_results += 1
+                    if user_message:
+                        self.zero_result_queries.add(_normalizar_consulta(user_message))
+            barrio = (filters or {}).get("neighborhood") or (filters or {}).get("barrio")
+            if barrio:
+                self.barrios.add(str(barrio).strip().title())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "since": self.since,
+                "channels": {c: s.to_dict() for c, s in self.channels.items()},
+                "barrios": dict(self.barrios.counts),
+                "zero_result_queries": dict(self.zero_result_queries.counts),
+            }
+
+
+def report(snapshots: Iterable[Dict[str, Any]], top_k: int = ANALYTICS_TOP_K) -> Dict[str, Any]:
+    """Combina snapshots (de uno o varios workers) en el reporte de /analytics."""
+    total = ChannelStats()
+    channels: Dict[str, ChannelStats] = {}
+    barrios = TopK(top_k * 4)
+    zero = TopK(top_k * 4)
+    since = None
+    workers = 0
+    for snap in snapshots:
+        workers += 1
+        since = min(since, snap["since"]) if since else snap["since"]
+        for channel, data in snap.get("channels", {}).items():
+            stats = ChannelStats.from_dict(data)
+            channels.setdefault(channel, ChannelStats()).merge(stats)
+            total.merge(stats)
+        for key, n in snap.get("barrios", {}).items():
+            barrios.add(key, n)
+        for key, n in snap.get("zero_result_queries", {}).items():
+            zero.add(key, n)
+    return {
+        "since": since,
+        "workers": workers,
+        "total": total.report(),
+        "by_channel": {c: s.report() for c, s in sorted(channels.items())},
+        "top_barrios": [{"barrio": k, "count": n} for k, n in barrios.top(top_k)],
+        "top_zero_result_queries": [{"query": k, "count": n} for k, n in zero.top(top_k)],
+    }
+
+
+class SnapshotStore:
+    """Snapshots por worker en un SQLite aparte de LOG_PATH."""
+
+    def __init__(self, path: str = ANALYTICS_PATH):
+        self.path = path
+        self.worker = f"{os.getpid()}-{int(time.time())}"
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=2.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS snapshots (
+                worker TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated REAL NOT NULL
+            )
+        ''')
+        return conn
+
+    def save(self, snapshot: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (worker, data, updated) VALUES (?, ?, ?)",
+                (self.worker, json.dumps(snapshot, ensure_ascii=False), time.time()),
+            )
+
+    def load_others(self) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT data FROM snapshots WHERE worker != ?", (self.worker,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def compact(self, stale_after: float):
+        """Une en un solo registro histórico los snapshots de workers que ya no existen."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT worker, data FROM snapshots WHERE worker != 'historico' AND updated < ?",
+                (time.time() - stale_after,),
+            ).fetchall()
+            if not rows:
+                return
+            previo = conn.execute("SELECT data FROM snapshots WHERE worker = 'historico'").fetchone()
+            snaps = [json.loads(r[1]) for r in rows] + ([json.loads(previo[0])] if previo else [])
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (worker, data, updated) VALUES ('historico', ?, ?)",
+                (json.dumps(merge_snapshots(snaps), ensure_ascii=False), time.time()),
+            )
+            conn.executemany("DELETE FROM snapshots WHERE worker = ?", [(r[0],) for r in rows])
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Mezcla snapshots en uno solo, con el mismo formato."""
+    channels: Dict[str, ChannelStats] = {}
+    barrios: Dict[str, int] = {}
+    zero: Dict[str, int] = {}
+    for snap in snapshots:
+        for channel, data in snap.get("channels", {}).items():
+            channels.setdefault(channel, ChannelStats()).merge(ChannelStats.from_dict(data))
+        for key, n in snap.get("barrios", {}).items():
+            barrios[key] = barrios.get(key, 0) + n
+        for key, n in snap.get("zero_result_queries", {}).items():
+            zero[key] = zero.get(key, 0) + n
+    limite = ANALYTICS_TOP_K * 4
+    return {
+        "since": min(s["since"] for s in snapshots),
+        "channels": {c: s.to_dict() for c, s in channels.items()},
+        "barrios": dict(sorted(barrios.items(), key=lambda kv: kv[1], reverse=True)[:limite]),
+        "zero_result_queries": dict(sorted(zero.items(), key=lambda kv: kv[1], reverse=True)[:limite]),
+    }
+
+
+conversation_analytics = ConversationAnalytics()
+snapshot_store = SnapshotStore()
+
+
+def flush_analytics():
+    """Vuelca el estado de este worker y compacta los de workers muertos."""
+    try:
+        snapshot_store.save(conversation_analytics.snapshot())
+        snapshot_store.compact(stale_after=ANALYTICS_FLUSH_INTERVAL * 4)
+    except sqlite3.Error as e:
+        logger.warning("No se pudo volcar la analítica", extra={"error": str(e)})
+
+
+def analytics_report(scope: str = "all") -> Dict[str, Any]:
+    """Reporte de este worker (`scope="worker"`) o de todos los workers (default)."""
+    snapshots = [conversation_analytics.snapshot()]
+    if scope != "worker":
+        try:
+            snapshots += snapshot_store.load_others()
+        except sqlite3.Error as e:
+            logger.warning("No se pudieron leer snapshots de otros workers", extra={"error": str(e)})
+    return report(snapshots)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Utilidades para procesar lotes de consultas (POST /chat/batch).
+
+    - `run_bounded` corre una corrutina por ítem con un tope de concurrencia y
+      entrega los resultados a medida que terminan, con su índice original.
+    - `BatchSearch` deduplica las búsquedas dentro de un lote: consultas con los
+      mismos filtros canónicos se resuelven una sola vez, aunque lleguen a la vez.
+
+Variables de entorno:
+    CHAT_BATCH_CONCURRENCY   Consultas simultáneas por lote (default 8, también es el máximo pedible).
+    CHAT_BATCH_MAX_ITEMS     Consultas por lote como máximo (default 500).
+"""
+import os
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+from logic.cache import make_key
+from logic.filters import canonicalize_filters
+
+CHAT_BATCH_CONCURRENCY = int(os.environ.get("CHAT_BATCH_CONCURRENCY", "8"))
+CHAT_BATCH_MAX_ITEMS = int(os.environ.get("CHAT_BATCH_MAX_ITEMS", "500"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def run_bounded(items: Sequence[T], fn: Callable[[int, T], Awaitable[R]],
+                      concurrency: int) -> AsyncIterator[Tuple[int, R]]:
+    """Ejecuta `fn(indice, item)` con a lo sumo `concurrency` en curso; emite (indice, resultado) al terminar."""
+    semaforo = asyncio.Semaphore(max(1, concurrency))
+
+    async def uno(indice: int, item: T) -> Tuple[int, R]:
+        async with semaforo:
+            return indice, await fn(indice, item)
+
+    tareas = [asyncio.create_task(uno(i, item)) for i, item in enumerate(items)]
+    try:
+        for siguiente in asyncio.as_completed(tareas):
+            yield await siguiente
+    finally:
+        # Si el cliente corta el stream, no seguir procesando el resto del lote
+        for tarea in tareas:
+            tarea.cancel()
+
+
+class BatchSearch:
+    """Memo de búsquedas por filtros canónicos, válido durante un lote."""
+
+    def __init__(self, buscar: Callable[[Dict[str, Any]], Awaitable[List[Dict]]]):
+        self._buscar = buscar
+        self._en_curso: Dict[str, asyncio.Future] = {}
+        self.lookups = 0
+        self.executed = 0
+
+    async def __call__(self, filters: Dict[str, Any]) -> List[Dict]:
+        self.lookups += 1
+        key = make_key(canonicalize_filters(filters))
+        futuro = self._en_curso.get(key)
+        if futuro is None:
+            self.executed += 1
+            futuro = asyncio.ensure_future(self._buscar(filters))
+            self._en_curso[key] = futuro
+        # shield: si se cancela un ítem, la búsqueda compartida sigue para los demás
+        return await asyncio.shield(futuro)
+
+    def stats(self) -> Dict[str, int]:
+        return {"lookups": self.lookups, "executed": self.executed, "deduplicated": self.lookups - self.executed}
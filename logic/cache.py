@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Cache en dos niveles compartido entre workers.
+
+Nivel 1: LRU en memoria del proceso (rápido, por worker).
+Nivel 2: backend compartido en disco (SQLite en modo WAL), así N workers de
+uvicorn comparten lo que calienta cualquiera de ellos. El backend es
+enchufable: cualquier objeto con get/set/clear sirve.
+
+Las claves se prefijan con la versión del catálogo (ver
+logic.database.catalog_version): cuando el catálogo cambia, las entradas
+viejas dejan de encontrarse y expiran solas.
+
+Variables de entorno:
+    CACHE_BACKEND   "sqlite" (default) o "memory" para desactivar el nivel compartido.
+    CACHE_PATH      Archivo SQLite del nivel compartido (default instance/cache.db).
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite").lower()
+CACHE_PATH = os.environ.get("CACHE_PATH", os.path.join(os.getcwd(), "instance", "cache.db"))
+
+_MISSING = object()
+
+
+def make_key(value: Any) -> str:
+    """Clave estable entre procesos para cualquier valor serializable a JSON."""
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class SQLiteBackend:
+    """Nivel compartido: tabla clave/valor con expiración en un archivo SQLite local."""
+
+    PURGE_EVERY = 200  # cada cuántos set se borran las entradas vencidas
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._sets = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires REAL NOT NULL
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Any:
+        row = self._connect().execute(
+            "SELECT value, expires FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return _MISSING
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False, default=str), time.time() + ttl),
+        )
+        self._sets += 1
+        if self._sets % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+
+    def clear(self, prefix: str = ""):
+        self._connect().execute("DELETE FROM cache WHERE key LIKE ?", (prefix + "%",))
+
+
+class TieredCache:
+    """LRU en memoria con TTL delante de un backend compartido opcional."""
+
+    def __init__(self, namespace: str, max_entries: int = 256, ttl: float = 300,
+                 backend: Optional[Any] = None, version_fn: Optional[Callable[[], str]] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.version_fn = version_fn
+        self._lru: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.front_hits = 0
+        self.back_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _full_key(self, key: str) -> str:
+        version = self.version_fn() if self.version_fn else ""
+        if version != self._version:
+            # Cambió el catálogo: lo que hay en memoria quedó viejo
+            with self._lock:
+                self._lru.clear()
+                self._version = version
+        return f"{self.namespace}:{version}:{key}"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        full_key = self._full_key(key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lru.get(full_key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._lru.move_to_end(full_key)
+                    self.front_hits += 1
+                    return entry[1]
+                del self._lru[full_key]
+
+        if self.backend is not None:
+            try:
+                value = self.backend.get(full_key)
+            except (sqlite3.Error, OSError) as e:
+                self.errors += 1
+                logger.warning("Error leyendo cache compartido", extra={"namespace": self.namespace, "error": str(e)})
+                value = _MISSING
+            if value is not _MISSING:
+                self.back_hits += 1
+                self._store_front(full_key, value, self.ttl)
+                return value
+
+        self.misses += 1
+        return default
+
+    def _store_front(self, full_key: str, value: Any, ttl: float):
+        with self._lock:
+            self._lru[full_key] = (time.monotonic() + ttl, value)
+            self._lru.move_to_end(full_key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+                self.evictions += 1
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        full_key = self._full_key(key)
+        self._store_front(full_key, value, ttl)
+        if self.backend is not None:
+            try:
+                self.backend.set(full_key, value, ttl)
+            except (sqlite3.Error, OSError) as e:
+                self.errors += 1
+                logger.warning("Error escribiendo cache compartido", extra={"namespace": self.namespace, "error": str(e)})
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self):
+        """Vacía el nivel en memoria y las entradas de este namespace en el compartido."""
+        with self._lock:
+            self._lru.clear()
+        if self.backend is not None:
+            try:
+                self.backend.clear(f"{self.namespace}:")
+            except (sqlite3.Error, OSError) as e:
+                self.errors += 1
+                logger.warning("Error invalidando cache compartido", extra={"namespace": self.namespace, "error": str(e)})
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.front_hits + self.back_hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "front_hits": self.front_hits,
+            "back_hits": self.back_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "hit_rate": round((self.front_hits + self.back_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+class LazySQLiteBackend:
+    """Abre el SQLiteBackend en el primer uso: importar el módulo no toca el disco."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._backend: Optional[SQLiteBackend] = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> SQLiteBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = SQLiteBackend(self.path)
+        return self._backend
+
+    def get(self, key: str) -> Any:
+        return self._get().get(key)
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._get().set(key, value, ttl)
+
+    def clear(self, prefix: str = ""):
+        self._get().clear(prefix)
+
+
+def create_backend():
+    """Backend compartido según CACHE_BACKEND (None = sólo memoria del proceso)."""
+    if CACHE_BACKEND == "memory":
+        return None
+    return LazySQLiteBackend(CACHE_PATH)
+
+
+shared_backend = create_backend()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Catálogo en memoria: registros compactos e inmutables con el JSON ya serializado.
+
+query_properties arma un dict por fila y decodifica fotos/videos/documentos en
+cada consulta, y después pydantic vuelve a envolver todo en PropertyResponse.
+Como el catálogo cambia pocas veces por día, acá se carga una sola vez por
+versión (ver logic.database.catalog_version):
+
+    - `PropertyRecord` usa __slots__ y guarda las columnas chicas (números,
+      barrio, tipo...) en una tupla; los nombres de campo son compartidos por
+      todos los registros. Se lee como un dict de sólo lectura, así templates,
+      prompts y sesiones no cambian.
+    - Los textos largos y las listas se guardan dentro del JSON ya codificado;
+      la primera vez que alguien lee uno se decodifican todos juntos y quedan
+      cacheados en el registro (compartidos con sus copias con distancia). El
+      JSON se arma en dos variantes: `json_full` (todos los campos de
+      PropertyResponse) y `json_card` (lo que muestra la tarjeta del frontend).
+      Las respuestas se arman concatenando esos bytes.
+
+Las búsquedas se siguen resolviendo en SQLite con sus índices, pero sólo traen
+[id_temporal, distancia_km]; eso es lo que guarda el cache de búsquedas.
+"""
+import sys
+import json
+import time
+import threading
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from logic.database import get_all_properties, catalog_version, invalidate_catalog_version
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Lo que usa la tarjeta del frontend (mostrarPropiedadesEnInterfaz y el contexto de la conversación)
+CAMPOS_TARJETA = (
+    "id_temporal", "titulo", "barrio", "precio", "moneda_precio", "ambientes", "metros_cuadrados",
+    "operacion", "tipo", "descripcion", "fotos",
+)
+# El resto de PropertyResponse; distancia_km va aparte porque depende de cada búsqueda geo
+CAMPOS_RESTO = (
+    "direccion", "antiguedad", "estado", "orientacion", "expensas", "amenities", "cochera", "balcon", "pileta",
+    "acepta_mascotas", "aire_acondicionado", "info_multimedia", "documentos", "videos", "precio_usd",
+    "moneda_expensas", "fecha_procesamiento", "lat", "lon", "geo_precision", "dist_subte_km",
+)
+CAMPOS = CAMPOS_TARJETA + CAMPOS_RESTO + ("distancia_km",)
+# Textos largos y listas: viven dentro del JSON y se decodifican (una vez) si alguien los pide
+CAMPOS_TEXTO = frozenset((
+    "titulo", "descripcion", "direccion", "amenities", "info_multimedia", "documentos", "videos", "fotos",
+    "fecha_procesamiento",
+))
+# Valores que se repiten en todo el catálogo: una sola copia de cada string
+CAMPOS_CATEGORICOS = frozenset((
+    "barrio", "operacion", "tipo", "estado", "orientacion", "cochera", "balcon", "pileta", "acepta_mascotas",
+    "aire_acondicionado", "moneda_precio", "moneda_expensas", "geo_precision",
+))
+
+CAMPOS_COLUMNA = tuple(campo for campo in CAMPOS[:-1] if campo not in CAMPOS_TEXTO)
+_INDICE = {campo: i for i, campo in enumerate(CAMPOS_COLUMNA)}
+_SIN_DISTANCIA = b',"distancia_km":null}'
+
+
+def _json(valor: Any) -> bytes:
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _miembros(prop: Dict[str, Any], campos: Sequence[str]) -> bytes:
+    """Pares "campo":valor separados por coma, sin las llaves del objeto."""
+    return _json({campo: prop.get(campo) for campo in campos})[1:-1]
+
+
+class PropertyRecord(Mapping):
+    """
+    Propiedad inmutable: se lee como un dict (r["precio"], r.get("fotos")) sin serlo.
+
+    El JSON completo es {tarjeta,resto,distancia}: la variante tarjeta es un prefijo del
+    completo, así los textos se guardan una sola vez.
+    """
+
+    __slots__ = ("_valores", "_tarjeta", "_resto", "_textos", "distancia_km")
+
+    def __init__(self, valores: tuple, tarjeta: bytes, resto: bytes, distancia_km: Optional[float] = None,
+                 textos: Optional[List[Optional[Dict[str, Any]]]] = None):
+        self._valores = valores
+        self._tarjeta = tarjeta
+        self._resto = resto
+        # [dict de CAMPOS_TEXTO] o [None] si todavía no se decodificó; la lista se comparte con las copias
+        self._textos = textos if textos is not None else [None]
+        self.distancia_km = distancia_km
+
+    @classmethod
+    def desde_propiedad(cls, prop: Dict[str, Any]) -> "PropertyRecord":
+        valores = tuple(
+            sys.intern(prop[campo]) if campo in CAMPOS_CATEGORICOS and isinstance(prop.get(campo), str)
+            else prop.get(campo)
+            for campo in CAMPOS_COLUMNA
+        )
+        return cls(valores, b"{" + _miembros(prop, CAMPOS_TARJETA), b"," + _miembros(prop, CAMPOS_RESTO))
+
+    def con_distancia(self, distancia_km: float) -> "PropertyRecord":
+        """Copia con la distancia al centro de una búsqueda geo (comparte los bytes del original)."""
+        return PropertyRecord(self._valores, self._tarjeta, self._resto, distancia_km, self._textos)
+
+    def _final(self) -> bytes:
+        if self.distancia_km is None:
+            return _SIN_DISTANCIA
+        return b',"distancia_km":' + _json(self.distancia_km) + b"}"
+
+    @property
+    def json_full(self) -> bytes:
+        return self._tarjeta + self._resto + self._final()
+
+    @property
+    def json_card(self) -> bytes:
+        return self._tarjeta + self._final()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Copia mutable con todos los campos (decodifica el JSON una sola vez)."""
+        return json.loads(self.json_full)
+
+    def __getitem__(self, campo: str) -> Any:
+        indice = _INDICE.get(campo)
+        if indice is not None:
+            return self._valores[indice]
+        if campo == "distancia_km":
+            return self.distancia_km
+        if campo in CAMPOS_TEXTO:
+            textos = self._textos[0]
+            if textos is None:
+                completo = self.to_dict()
+                textos = self._textos[0] = {c: completo.get(c) for c in CAMPOS_TEXTO}
+            return textos[campo]
+        raise KeyError(campo)
+
+    def __iter__(self):
+        return iter(CAMPOS)
+
+    def __len__(self) -> int:
+        return len(CAMPOS)
+
+    def __repr__(self) -> str:
+        return f"PropertyRecord({self._valores[0]!r})"
+
+
+def json_lista(registros: Iterable[PropertyRecord], tarjeta: bool = False) -> bytes:
+    """Array JSON de propiedades armado con los bytes precalculados de cada registro."""
+    if tarjeta:
+        return b"[" + b",".join(r.json_card for r in registros) + b"]"
+    return b"[" + b",".join(r.json_full for r in registros) + b"]"
+
+
+class CatalogStore:
+    """Registros del catálogo por id_temporal, recargados sólo cuando cambia la versión."""
+
+    def __init__(self, cargar: Callable[[], List[Dict[str, Any]]] = get_all_properties,
+                 version_fn: Callable[[], str] = catalog_version):
+        self._cargar = cargar
+        self._version_fn = version_fn
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._registros: Dict[str, PropertyRecord] = {}
+        self.loads = 0
+        self.last_load_ms: Optional[float] = None
+        self.json_bytes = 0
+
+    def registros(self) -> Dict[str, PropertyRecord]:
+        version = self._version_fn()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._recargar(version)
+        return self._registros
+
+    def _recargar(self, version: str):
+        inicio = time.perf_counter()
+        registros = {}
+        for prop in self._cargar():
+            registro = PropertyRecord.desde_propiedad(prop)
+            registros[registro["id_temporal"]] = registro
+        # Se reemplaza el dict entero: quien tenga el anterior sigue viendo un catálogo consistente
+        self._registros = registros
+        self._version = version
+        self.loads += 1
+        self.json_bytes = sum(len(r._tarjeta) + len(r._resto) for r in registros.values())
+        self.last_load_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        logger.info("Catálogo cargado en memoria", extra={
+            "version": version, "records": len(registros), "json_bytes": self.json_bytes,
+            "duration_ms": self.last_load_ms,
+        })
+
+    def get(self, id_temporal: str) -> Optional[PropertyRecord]:
+        return self.registros().get(id_temporal)
+
+    def resolver(self, coincidencias: Sequence[Sequence[Any]]) -> List[PropertyRecord]:
+        """[id_temporal, distancia_km] de una búsqueda -> registros, en el mismo orden."""
+        registros = self.registros()
+        if any(c[0] not in registros for c in coincidencias):
+            # Otro worker escribió la BD y la versión todavía no se volvió a leer
+            invalidate_catalog_version()
+            registros = self.registros()
+        resultado = []
+        for id_temporal, distancia_km in coincidencias:
+            registro = registros.get(id_temporal)
+            if registro is not None:
+                resultado.append(registro if distancia_km is None else registro.con_distancia(distancia_km))
+        return resultado
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self._version,
+            "records": len(self._registros),
+            "loads": self.loads,
+            "last_load_ms": self.last_load_ms,
+            "json_bytes": self.json_bytes,
+        }
+
+
+property_catalog = CatalogStore()
@@ -10,19 +10,177 @@ LOG_PATH = "conversation_logs.db"
 import sqlite3
 import os
 import json
+import time
 from typing import List, Dict, Any, Optional
 
+from logic.logger import get_logger
+from logic.analytics import conversation_analytics
+from logic.geo import geohash_encode, caja_para_radio, celdas_para_caja, haversine_km
+from logic.gazetteer import ubicar_propiedad, buscar_referencia, distancia_subte_km, PRECISION_BARRIO
+from logic.filters import FiltroInvalido
+
+logger = get_logger(__name__)
+
 # ✅ USAR RUTA PERSISTENTE EN RENDER
 DB_PATH = os.path.join(os.getcwd(), "instance", "dante_properties.db")
 LOG_PATH = os.path.join(os.getcwd(), "instance", "conversation_logs.db")
 
-# Crear directorio instance si no existe
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+PROPERTIES_TABLE_SQL = '''
+    CREATE TABLE properties (
+        id_temporal TEXT PRIMARY KEY,
+        titulo TEXT NOT NULL,
+        barrio TEXT NOT NULL,
+        precio REAL NOT NULL,
+        ambientes INTEGER NOT NULL,
+        metros_cuadrados REAL NOT NULL,
+        descripcion TEXT,
+        operacion TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        direccion TEXT,
+        antiguedad INTEGER,
+        estado TEXT,
+        orientacion TEXT,
+        expensas REAL,
+        amenities TEXT,
+        cochera TEXT,
+        balcon TEXT,
+        pileta TEXT,
+        acepta_mascotas TEXT,
+        aire_acondicionado TEXT,
+        info_multimedia TEXT,
+        documentos TEXT,
+        videos TEXT,
+        fotos TEXT,
+        moneda_precio TEXT DEFAULT 'USD',
+        moneda_expensas TEXT DEFAULT 'ARS',
+        fecha_procesamiento TEXT,
+        lat REAL,
+        lon REAL,
+        geo_precision TEXT,
+        geohash TEXT,
+        dist_subte_km REAL,
+        precio_usd REAL
+    )
+'''
+
+# ✅ PRECIO NORMALIZADO: precio_usd = precio / (unidades de la moneda por USD), indexado
+COTIZACIONES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS cotizaciones (
+        moneda TEXT PRIMARY KEY,
+        por_usd REAL NOT NULL,
+        actualizado TEXT
+    )
+'''
+PRECIO_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_properties_precio_usd ON properties(precio_usd)"
+# Cotizaciones iniciales si la tabla está vacía; se actualizan con actualizar_cotizacion.py
+COTIZACIONES_PATH = "cotizaciones.json"
+COTIZACIONES_DEFAULT = {"USD": 1.0, "ARS": 1000.0}
+
+# ✅ ÍNDICES GEOESPACIALES: radio/caja por prefijos de geohash, "cerca del subte" por distancia precalculada
+GEO_COLUMNS = {"lat": "REAL", "lon": "REAL", "geo_precision": "TEXT", "geohash": "TEXT", "dist_subte_km": "REAL"}
+GEO_INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_properties_geohash ON properties(geohash)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_dist_subte ON properties(dist_subte_km)",
+]
+
+# Radio por defecto para "cerca de X" sin distancia explícita
+RADIO_CERCA_KM = 1.0
+
+def datos_geo(prop: Dict[str, Any]) -> tuple:
+    """(lat, lon, geo_precision, geohash, dist_subte_km) de una propiedad según el nomenclátor local"""
+    lat, lon, precision = ubicar_propiedad(prop)
+    if lat is None:
+        return None, None, None, None, None
+    return lat, lon, precision, geohash_encode(lat, lon), round(distancia_subte_km(lat, lon), 3)
+
+def asegurar_cotizaciones(cursor: sqlite3.Cursor) -> Dict[str, float]:
+    """Crea la tabla de cotizaciones si falta, la siembra desde COTIZACIONES_PATH y devuelve moneda -> por_usd"""
+    cursor.execute(COTIZACIONES_TABLE_SQL)
+    semilla = dict(COTIZACIONES_DEFAULT)
+    if os.path.exists(COTIZACIONES_PATH):
+        try:
+            with open(COTIZACIONES_PATH, 'r', encoding='utf-8') as f:
+                semilla.update({k.upper(): float(v) for k, v in json.load(f).items()})
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning("Cotizaciones locales inválidas, se usan las default", extra={"path": COTIZACIONES_PATH, "error": str(e)})
+    cursor.executemany(
+        "INSERT OR IGNORE INTO cotizaciones (moneda, por_usd, actualizado) VALUES (?, ?, datetime('now'))",
+        list(semilla.items()),
+    )
+    return dict(cursor.execute("SELECT moneda, por_usd FROM cotizaciones").fetchall())
+
+def precio_en_usd(precio: Optional[float], moneda: Optional[str], cotizaciones: Dict[str, float]) -> Optional[float]:
+    """Precio convertido a USD; None si la moneda no tiene cotización"""
+    por_usd = cotizaciones.get((moneda or 'USD').upper())
+    if precio is None or not por_usd:
+        return None
+    return round(float(precio) / por_usd, 2)
+
+def migrar_precio_usd(conn: sqlite3.Connection, columnas: List[str]):
+    """Agrega y completa precio_usd en una BD vieja"""
+    cursor = conn.cursor()
+    asegurar_cotizaciones(cursor)
+    if 'precio_usd' not in columnas:
+        cursor.execute("ALTER TABLE properties ADD COLUMN precio_usd REAL")
+    recalcular_precio_usd(cursor)
+    cursor.execute(PRECIO_INDEX_SQL)
+    conn.commit()
+    logger.info("Columna precio_usd migrada")
+
+def recalcular_precio_usd(cursor: sqlite3.Cursor, moneda: Optional[str] = None):
+    """Recalcula precio_usd desde la tabla de cotizaciones (todas las monedas o sólo una)"""
+    query = '''
+        UPDATE properties SET precio_usd = ROUND(precio / (
+            SELECT por_usd FROM cotizaciones WHERE moneda = UPPER(COALESCE(properties.moneda_precio, 'USD'))
+        ), 2)
+    '''
+    params = []
+    if moneda:
+        query += " WHERE UPPER(COALESCE(moneda_precio, 'USD')) = ?"
+        params.append(moneda.upper())
+    cursor.execute(query, params)
+
+def actualizar_cotizacion(moneda: str, por_usd: float) -> int:
+    """Actualiza la cotización de `moneda` y recalcula los precios normalizados. Devuelve filas actualizadas."""
+    if por_usd <= 0:
+        raise ValueError("La cotización debe ser positiva")
+    moneda = moneda.upper()
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        asegurar_cotizaciones(cursor)
+        cursor.execute(
+            "INSERT OR REPLACE INTO cotizaciones (moneda, por_usd, actualizado) VALUES (?, ?, datetime('now'))",
+            (moneda, por_usd),
+        )
+        recalcular_precio_usd(cursor, moneda)
+        actualizadas = cursor.rowcount
+        conn.commit()
+    invalidate_catalog_version()
+    logger.info("Cotización actualizada", extra={"moneda": moneda, "por_usd": por_usd, "propiedades": actualizadas})
+    return actualizadas
+
+def migrar_columnas_geo(conn: sqlite3.Connection, columnas: List[str]):
+    """Agrega las columnas geo a una BD vieja y las completa desde barrio/dirección"""
+    cursor = conn.cursor()
+    for columna, tipo in GEO_COLUMNS.items():
+        if columna not in columnas:
+            cursor.execute(f"ALTER TABLE properties ADD COLUMN {columna} {tipo}")
+    filas = cursor.execute("SELECT id_temporal, barrio, direccion FROM properties WHERE geohash IS NULL").fetchall()
+    cursor.executemany(
+        "UPDATE properties SET lat = ?, lon = ?, geo_precision = ?, geohash = ?, dist_subte_km = ? WHERE id_temporal = ?",
+        [datos_geo({"barrio": barrio, "direccion": direccion}) + (id_temporal,) for id_temporal, barrio, direccion in filas],
+    )
+    for sql in GEO_INDEXES_SQL:
+        cursor.execute(sql)
+    conn.commit()
+    logger.info("Columnas geo migradas", extra={"count": len(filas)})
 
 def initialize_databases():
     """Inicializa las bases de datos solo si no existen"""
     try:
-        print(f"🔄 INICIALIZANDO BD EN: {DB_PATH}")
+        logger.info("Inicializando BD", extra={"db_path": DB_PATH})
+        # Crear directorio instance si no existe
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
         
         with sqlite3.connect(DB_PATH) as conn:
             cursor = conn.cursor()
@@ -32,65 +190,38 @@ def initialize_databases():
             tabla_existe = cursor.fetchone()
             
             if tabla_existe:
-                print("✅ Tabla 'properties' ya existe, verificando datos...")
+                logger.info("Tabla properties ya existe, verificando datos")
                 cursor.execute("SELECT COUNT(*) FROM properties")
                 count = cursor.fetchone()[0]
-                print(f"   📊 Propiedades en BD: {count}")
+                logger.info("Propiedades en BD", extra={"count": count})
                 
                 # Verificar si hay propiedades de alquiler
                 cursor.execute("SELECT COUNT(*) FROM properties WHERE operacion = 'alquiler'")
                 count_alquiler = cursor.fetchone()[0]
-                print(f"   🏠 Propiedades de alquiler: {count_alquiler}")
+                logger.info("Propiedades de alquiler", extra={"count": count_alquiler})
                 
                 if count_alquiler > 0:
-                    print("✅ BD ya tiene propiedades de alquiler, no es necesario recrear")
+                    logger.info("BD ya tiene propiedades de alquiler, no es necesario recrear")
                     return
                 else:
-                    print("⚠️ BD no tiene propiedades de alquiler, recargando datos...")
+                    logger.warning("BD sin propiedades de alquiler, recargando datos")
             else:
-                print("🚨 Tabla 'properties' no existe, creando...")
+                logger.warning("Tabla properties no existe, creando")
             
             # Solo recrear si es necesario
             cursor.execute("DROP TABLE IF EXISTS properties")
             
             # CREAR tabla (código existente)
-            cursor.execute('''
-                CREATE TABLE properties (
-                    id_temporal TEXT PRIMARY KEY,
-                    titulo TEXT NOT NULL,
-                    barrio TEXT NOT NULL,
-                    precio REAL NOT NULL,
-                    ambientes INTEGER NOT NULL,
-                    metros_cuadrados REAL NOT NULL,
-                    descripcion TEXT,
-                    operacion TEXT NOT NULL,
-                    tipo TEXT NOT NULL,
-                    direccion TEXT,
-                    antiguedad INTEGER,
-                    estado TEXT,
-                    orientacion TEXT,
-                    expensas REAL,
-                    amenities TEXT,
-                    cochera TEXT,
-                    balcon TEXT,
-                    pileta TEXT,
-                    acepta_mascotas TEXT,
-                    aire_acondicionado TEXT,
-                    info_multimedia TEXT,
-                    documentos TEXT,
-                    videos TEXT,
-                    fotos TEXT,
-                    moneda_precio TEXT DEFAULT 'USD',
-                    moneda_expensas TEXT DEFAULT 'ARS',
-                    fecha_procesamiento TEXT
-                )
-            ''')
+            cursor.execute(PROPERTIES_TABLE_SQL)
+            for sql in GEO_INDEXES_SQL + [PRECIO_INDEX_SQL]:
+                cursor.execute(sql)
+            cotizaciones = asegurar_cotizaciones(cursor)
             
             # Cargar propiedades desde JSON
             propiedades = cargar_propiedades_desde_json()
             
             if not propiedades:
-                print("❌ No se pudieron cargar propiedades desde JSON")
+                logger.error("No se pudieron cargar propiedades desde JSON")
                 return
             
             # Insertar propiedades
@@ -106,8 +237,9 @@ def initialize_databases():
                             id_temporal, titulo, barrio, precio, ambientes, metros_cuadrados,
                             descripcion, operacion, tipo, direccion, antiguedad, expensas,
                             cochera, balcon, pileta, acepta_mascotas, aire_acondicionado,
-                            moneda_precio, moneda_expensas, fotos, videos, documentos
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            moneda_precio, moneda_expensas, fotos, videos, documentos,
+                            lat, lon, geo_precision, geohash, dist_subte_km, precio_usd
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     ''', (
                         prop.get('id_temporal', f"prop_{hash(prop.get('titulo', ''))}"),
                         prop['titulo'], prop['barrio'], prop['precio'],
@@ -118,15 +250,19 @@ def initialize_databases():
                         prop.get('aire_acondicionado'), prop.get('moneda_precio', 'USD'),
                         prop.get('moneda_expensas', 'ARS'),
                         fotos_json, videos_json, documentos_json
+                    ) + datos_geo(prop) + (
+                        precio_en_usd(prop['precio'], prop.get('moneda_precio', 'USD'), cotizaciones),
                     ))
                 except Exception as e:
-                    print(f"⚠️ Error cargando propiedad {prop.get('titulo', 'N/A')}: {e}")
+                    logger.warning("Error cargando propiedad", extra={"titulo": prop.get('titulo', 'N/A'), "error": str(e)})
             
             conn.commit()
-            print(f"✅ Base de datos inicializada con {len(propiedades)} propiedades")
+            logger.info("Base de datos inicializada", extra={"count": len(propiedades)})
+            # El catálogo cambió: que los caches lo vean sin esperar al próximo os.stat
+            invalidate_catalog_version()
             
     except Exception as e:
-        print(f"❌ Error crítico inicializando base de datos: {e}")
+        logger.exception("Error crítico inicializando base de datos")
 
 
 def cargar_propiedades_desde_json():
@@ -135,44 +271,44 @@ def cargar_propiedades_desde_json():
         json_path = "propiedades.json"  # ✅ 
         
         if not os.path.exists(json_path):
-            print(f"❌ Archivo {json_path} no encontrado")
+            logger.error("Archivo JSON no encontrado", extra={"path": json_path})
             return None
         
         with open(json_path, 'r', encoding='utf-8') as f:
             contenido = f.read().strip()
             
         if not contenido:
-            print(f"❌ Archivo {json_path} está vacío")
+            logger.error("Archivo JSON vacío", extra={"path": json_path})
             return None
         
         # Intentar parsear como array
         try:
             propiedades_data = json.loads(contenido)
         except json.JSONDecodeError as e:
-            print(f"❌ Error parseando JSON: {e}")
+            logger.error("Error parseando JSON", extra={"path": json_path, "error": str(e)})
             return None
         
-        print(f"📁 Archivo {json_path} cargado, analizando estructura...")
+        logger.debug("Archivo JSON cargado, analizando estructura", extra={"path": json_path})
         
         # Manejar diferentes estructuras
         propiedades = []
         
         if isinstance(propiedades_data, list):
             propiedades = propiedades_data
-            print(f"   ✅ Estructura: Array con {len(propiedades)} propiedades")
+            logger.debug("Estructura: array", extra={"count": len(propiedades)})
         elif isinstance(propiedades_data, dict):
             # Si es un solo objeto, convertirlo a array
             if any(key in propiedades_data for key in ['id_temporal', 'titulo', 'precio']):
                 propiedades = [propiedades_data]
-                print(f"   ⚠️  Estructura: Objeto individual convertido a array")
+                logger.warning("Estructura: objeto individual convertido a array")
             elif 'propiedades' in propiedades_data:
                 propiedades = propiedades_data['propiedades']
-                print(f"   ✅ Estructura: Objeto con clave 'propiedades' ({len(propiedades)} propiedades)")
+                logger.debug("Estructura: objeto con clave propiedades", extra={"count": len(propiedades)})
             else:
-                print(f"❌ Estructura de objeto no reconocida")
+                logger.error("Estructura de objeto no reconocida")
                 return None
         else:
-            print(f"❌ Tipo de JSON no soportado: {type(propiedades_data)}")
+            logger.error("Tipo de JSON no soportado", extra={"json_type": type(propiedades_data).__name__})
             return None
         
         # Validar y contar por operación
@@ -186,15 +322,18 @@ def cargar_propiedades_desde_json():
                 if operacion in contador_operaciones:
                     contador_operaciones[operacion] += 1
             else:
-                print(f"⚠️ Propiedad incompleta omitida: {prop.get('titulo', 'Sin título')}")
+                logger.warning("Propiedad incompleta omitida", extra={"titulo": prop.get('titulo', 'Sin título')})
         
-        print(f"✅ {len(propiedades_validas)} propiedades válidas cargadas")
-        print(f"   📊 Venta: {contador_operaciones['venta']}, Alquiler: {contador_operaciones['alquiler']}")
+        logger.info("Propiedades válidas cargadas", extra={
+            "count": len(propiedades_validas),
+            "venta": contador_operaciones['venta'],
+            "alquiler": contador_operaciones['alquiler'],
+        })
         
         return propiedades_validas
         
     except Exception as e:
-        print(f"❌ Error cargando propiedades desde JSON: {e}")
+        logger.exception("Error cargando propiedades desde JSON")
         return None
 
 def obtener_propiedades_ejemplo():
@@ -223,7 +362,7 @@ def verificar_y_reparar_bd():
             # Verificar si la tabla existe
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='properties'")
             if not cursor.fetchone():
-                print("🚨 Tabla 'properties' no existe - recreando BD...")
+                logger.warning("Tabla properties no existe - recreando BD")
                 initialize_databases()
                 return
             
@@ -235,15 +374,172 @@ def verificar_y_reparar_bd():
             faltantes = [col for col in columnas_esenciales if col not in columnas]
             
             if faltantes:
-                print(f"🚨 Columnas faltantes: {faltantes} - recreando BD...")
+                logger.warning("Columnas faltantes - recreando BD", extra={"faltantes": faltantes})
                 initialize_databases()
+                return
+
+            migrada = False
+            if any(col not in columnas for col in GEO_COLUMNS):
+                logger.warning("BD sin columnas geo - migrando")
+                migrar_columnas_geo(conn, columnas)
+                migrada = True
+            if 'precio_usd' not in columnas:
+                logger.warning("BD sin precio_usd - migrando")
+                migrar_precio_usd(conn, columnas)
+                migrada = True
+
+            if migrada:
+                invalidate_catalog_version()
             else:
-                print("✅ Base de datos verificada correctamente")
+                logger.debug("Base de datos verificada correctamente")
                 
     except Exception as e:
-        print(f"🚨 Error verificando BD: {e} - recreando...")
+        logger.warning("Error verificando BD - recreando", extra={"error": str(e)})
         initialize_databases()
 
+# ✅ VERSIÓN DEL CATÁLOGO: cambia cada vez que se escribe la BD de propiedades
+CATALOG_VERSION_TTL = 2.0  # segundos entre os.stat
+_catalog_version = {"value": "", "checked": 0.0}
+
+def catalog_version() -> str:
+    """Versión del catálogo derivada de mtime/tamaño del archivo: igual en todos los workers"""
+    now = time.monotonic()
+    if now - _catalog_version["checked"] >= CATALOG_VERSION_TTL:
+        try:
+            st = os.stat(DB_PATH)
+            _catalog_version["value"] = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        except OSError:
+            _catalog_version["value"] = "0"
+        _catalog_version["checked"] = now
+    return _catalog_version["value"]
+
+def invalidate_catalog_version():
+    """Fuerza a recalcular la versión en la próxima consulta (tras recargar el catálogo)"""
+    _catalog_version["checked"] = float("-inf")
+
+def _fila_a_propiedad(row: sqlite3.Row) -> Dict[str, Any]:
+    prop = dict(row)
+    # Parsear campos JSON
+    for key in ['fotos', 'videos', 'documentos']:
+        if key in prop and isinstance(prop[key], str):
+            try:
+                prop[key] = json.loads(prop[key])
+            except json.JSONDecodeError:
+                prop[key] = [] # Dejar como lista vacía si el parseo falla
+    return prop
+
+def get_property(id_temporal: str) -> Optional[Dict[str, Any]]:
+    """Una propiedad por id_temporal (clave primaria), o None si no existe"""
+    try:
+        with sqlite3.connect(DB_PATH) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM properties WHERE id_temporal = ?", (id_temporal,)).fetchone()
+            return _fila_a_propiedad(row) if row else None
+    except sqlite3.Error:
+        logger.exception("Error en get_property")
+        return None
+
+def get_all_properties() -> List[Dict[str, Any]]:
+    """Todo el catálogo ordenado por id (para jobs por propiedad)"""
+    try:
+        with sqlite3.connect(DB_PATH) as conn:
+            conn.row_factory = sqlite3.Row
+            return [_fila_a_propiedad(row) for row in conn.execute("SELECT * FROM properties ORDER BY id_temporal")]
+    except sqlite3.Error:
+        logger.exception("Error en get_all_properties")
+        return []
+
+def _filas_filtradas(cursor: sqlite3.Cursor, filters: Dict[str, Any], columnas: str) -> List[tuple]:
+    """(fila, distancia_km) de las propiedades que cumplen los filtros, ordenadas por precio en USD"""
+    query = f"SELECT {columnas} FROM properties WHERE 1=1"
+    params = []
+
+    # Aplicar filtros
+    if 'neighborhood' in filters and filters['neighborhood']:
+        query += " AND barrio LIKE ?"
+        params.append(f"%{filters['neighborhood']}%")
+    if 'barrio' in filters and filters['barrio']:
+        query += " AND barrio LIKE ?" 
+        params.append(f"%{filters['barrio']}%")
+    # Precios en la moneda del filtro (USD por defecto), comparados contra precio_usd indexado
+    if filters.get('min_price') or filters.get('max_price'):
+        moneda = str(filters.get('moneda') or 'USD').upper()
+        cursor.execute("SELECT por_usd FROM cotizaciones WHERE moneda = ?", (moneda,))
+        fila = cursor.fetchone()
+        if not fila or not fila[0]:
+            # Igual que precio_en_usd: sin cotización no hay conversión posible (no asumir USD)
+            raise FiltroInvalido("moneda", moneda, "no tiene cotización")
+        por_usd = fila[0]
+        if 'min_price' in filters and filters['min_price']:
+            query += " AND precio_usd >= ?"
+            params.append(float(filters['min_price']) / por_usd)
+        if 'max_price' in filters and filters['max_price']:
+            query += " AND precio_usd <= ?"
+            params.append(float(filters['max_price']) / por_usd)
+    if 'min_rooms' in filters and filters['min_rooms']:
+        query += " AND ambientes >= ?"
+        params.append(filters['min_rooms'])
+    if 'operacion' in filters and filters['operacion']:
+        query += " AND operacion = ?"
+        params.append(filters['operacion'])
+    if 'tipo' in filters and filters['tipo']:
+        query += " AND tipo = ?"
+        params.append(filters['tipo'])
+    if 'min_sqm' in filters and filters['min_sqm']:
+        query += " AND metros_cuadrados >= ?"
+        params.append(filters['min_sqm'])
+    if 'max_sqm' in filters and filters['max_sqm']:
+        query += " AND metros_cuadrados <= ?"
+        params.append(filters['max_sqm'])
+
+    # ✅ FILTROS GEO: la caja se resuelve con rangos de geohash sobre el índice
+    centro = None
+    caja = None
+    if filters.get('cerca_de'):
+        centro = buscar_referencia(filters['cerca_de'])
+        if centro is None:
+            logger.info("Referencia geográfica desconocida", extra={"cerca_de": filters['cerca_de']})
+            return []
+    elif filters.get('lat') and filters.get('lon'):
+        centro = (float(filters['lat']), float(filters['lon']))
+    radio_km = float(filters.get('radio_km') or RADIO_CERCA_KM)
+    if centro:
+        caja = caja_para_radio(centro[0], centro[1], radio_km)
+    elif all(filters.get(k) for k in ('min_lat', 'max_lat', 'min_lon', 'max_lon')):
+        caja = (float(filters['min_lat']), float(filters['max_lat']),
+                float(filters['min_lon']), float(filters['max_lon']))
+    if caja:
+        celdas = celdas_para_caja(*caja)
+        query += " AND (" + " OR ".join("(geohash >= ? AND geohash < ?)" for _ in celdas) + ")"
+        for celda in celdas:
+            params.extend([celda, celda + "~"])
+        query += " AND lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?"
+        params.extend(caja)
+    if 'max_dist_subte_km' in filters and filters['max_dist_subte_km']:
+        query += " AND dist_subte_km <= ?"
+        params.append(filters['max_dist_subte_km'])
+    if caja or filters.get('max_dist_subte_km'):
+        # Con el centro del barrio como coordenada, radio, caja y subte darían falsos positivos
+        query += " AND geo_precision != ?"
+        params.append(PRECISION_BARRIO)
+
+    # "+" evita que SQLite recorra idx_properties_precio_usd sólo para ordenar:
+    # el índice queda para los filtros de rango, ordenar el resultado es más barato
+    query += " ORDER BY +precio_usd ASC"
+
+    cursor.execute(query, params)
+    filas = []
+    for row in cursor.fetchall():
+        distancia = None
+        if centro:
+            # Sólo los candidatos de la caja pasan por la distancia exacta
+            distancia = haversine_km(centro[0], centro[1], row['lat'], row['lon'])
+            if distancia > radio_km:
+                continue
+            distancia = round(distancia, 2)
+        filas.append((row, distancia))
+    return filas
+
 def query_properties(filters: Dict[str, Any]) -> List[Dict]:
     """Consulta propiedades con filtros"""
     try:
@@ -252,64 +548,63 @@ def query_properties(filters: Dict[str, Any]) -> List[Dict]:
         
         with sqlite3.connect(DB_PATH) as conn:
             conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            query = "SELECT * FROM properties WHERE 1=1"
-            params = []
-            
-            # Aplicar filtros
-            if 'neighborhood' in filters and filters['neighborhood']:
-                query += " AND barrio LIKE ?"
-                params.append(f"%{filters['neighborhood']}%")
-            if 'barrio' in filters and filters['barrio']:
-                query += " AND barrio LIKE ?" 
-                params.append(f"%{filters['barrio']}%")
-            if 'min_price' in filters and filters['min_price']:
-                query += " AND precio >= ?"
-                params.append(filters['min_price'])
-            if 'max_price' in filters and filters['max_price']:
-                query += " AND precio <= ?"
-                params.append(filters['max_price'])
-            if 'min_rooms' in filters and filters['min_rooms']:
-                query += " AND ambientes >= ?"
-                params.append(filters['min_rooms'])
-            if 'operacion' in filters and filters['operacion']:
-                query += " AND operacion = ?"
-                params.append(filters['operacion'])
-            if 'tipo' in filters and filters['tipo']:
-                query += " AND tipo = ?"
-                params.append(filters['tipo'])
-            if 'min_sqm' in filters and filters['min_sqm']:
-                query += " AND metros_cuadrados >= ?"
-                params.append(filters['min_sqm'])
-            if 'max_sqm' in filters and filters['max_sqm']:
-                query += " AND metros_cuadrados <= ?"
-                params.append(filters['max_sqm'])
-                
-            query += " ORDER BY precio ASC"
-                
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
             results = []
-            for row in rows:
-                prop = dict(row)
-                # Parsear campos JSON
-                for key in ['fotos', 'videos', 'documentos']:
-                    if key in prop and isinstance(prop[key], str):
-                        try:
-                            prop[key] = json.loads(prop[key])
-                        except json.JSONDecodeError:
-                            prop[key] = [] # Dejar como lista vacía si el parseo falla
+            for row, distancia in _filas_filtradas(conn.cursor(), filters, "*"):
+                prop = _fila_a_propiedad(row)
+                if distancia is not None:
+                    prop['distancia_km'] = distancia
                 results.append(prop)
 
-            print(f"🔍 Búsqueda encontrada: {len(results)} propiedades")
+            logger.debug("Búsqueda de propiedades", extra={"filters": filters, "results_count": len(results)})
             return results
             
     except Exception as e:
-        print(f"❌ Error en query_properties: {e}")
+        logger.exception("Error en query_properties")
         return []
 
+def buscar_ids(filters: Dict[str, Any]) -> List[List[Any]]:
+    """
+    Como query_properties pero sólo [id_temporal, distancia_km]: las propiedades salen de logic.catalog.
+    Los errores se propagan: una lista vacía terminaría en el cache como "sin resultados".
+    """
+    try:
+        verificar_y_reparar_bd()
+        with sqlite3.connect(DB_PATH) as conn:
+            conn.row_factory = sqlite3.Row
+            coincidencias = [[row['id_temporal'], distancia]
+                             for row, distancia in _filas_filtradas(conn.cursor(), filters, "id_temporal, lat, lon")]
+            logger.debug("Búsqueda de propiedades", extra={"filters": filters, "results_count": len(coincidencias)})
+            return coincidencias
+    except FiltroInvalido:
+        raise
+    except Exception:
+        logger.exception("Error en buscar_ids")
+        raise
+
+LOGS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        user_message TEXT NOT NULL,
+        bot_response TEXT NOT NULL,
+        response_time REAL,
+        search_performed INTEGER DEFAULT 0,
+        results_count INTEGER DEFAULT 0
+    )
+'''
+# Historial por canal y compactación por día (ver logic/log_retention.py) sin recorrer la tabla
+LOGS_INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_logs_channel_id ON logs(channel, id)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)",
+]
+
+def asegurar_tabla_logs(cursor: sqlite3.Cursor):
+    """Crea la tabla de logs y sus índices si no existen"""
+    cursor.execute(LOGS_TABLE_SQL)
+    for sql in LOGS_INDEXES_SQL:
+        cursor.execute(sql)
+
 def get_historial_canal(canal: str, limit: int = 5) -> List[str]:
     """Obtiene historial de conversación por canal"""
     try:
@@ -317,18 +612,7 @@ def get_historial_canal(canal: str, limit: int = 5) -> List[str]:
             cursor = conn.cursor()
             
             # Crear tabla de logs si no existe
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    channel TEXT NOT NULL,
-                    user_message TEXT NOT NULL,
-                    bot_response TEXT NOT NULL,
-                    response_time REAL,
-                    search_performed INTEGER DEFAULT 0,
-                    results_count INTEGER DEFAULT 0
-                )
-            ''')
+            asegurar_tabla_logs(cursor)
             
             cursor.execute('''
                 SELECT user_message, bot_response FROM logs 
@@ -343,7 +627,23 @@ def get_historial_canal(canal: str, limit: int = 5) -> List[str]:
             return historial
             
     except Exception as e:
-        print(f"❌ Error obteniendo historial: {e}")
+        logger.exception("Error obteniendo historial")
+        return []
+
+def get_mensajes_populares(limit: int = 5000) -> List[tuple]:
+    """(mensaje, veces) de las búsquedas con resultados más repetidas en los logs"""
+    try:
+        with sqlite3.connect(LOG_PATH) as conn:
+            cursor = conn.cursor()
+            asegurar_tabla_logs(cursor)
+            cursor.execute('''
+                SELECT user_message, COUNT(*) AS veces FROM logs
+                WHERE search_performed = 1 AND results_count > 0
+                GROUP BY user_message ORDER BY veces DESC LIMIT ?
+            ''', (limit,))
+            return cursor.fetchall()
+    except Exception as e:
+        logger.exception("Error obteniendo mensajes populares")
         return []
 
 def get_last_bot_response(canal: str) -> Optional[str]:
@@ -352,18 +652,7 @@ def get_last_bot_response(canal: str) -> Optional[str]:
         with sqlite3.connect(LOG_PATH) as conn:
             cursor = conn.cursor()
             
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    channel TEXT NOT NULL,
-                    user_message TEXT NOT NULL,
-                    bot_response TEXT NOT NULL,
-                    response_time REAL,
-                    search_performed INTEGER DEFAULT 0,
-                    results_count INTEGER DEFAULT 0
-                )
-            ''')
+            asegurar_tabla_logs(cursor)
             
             cursor.execute('''
                 SELECT bot_response FROM logs 
@@ -374,29 +663,21 @@ def get_last_bot_response(canal: str) -> Optional[str]:
             return result[0] if result else None
             
     except Exception as e:
-        print(f"❌ Error obteniendo última respuesta: {e}")
+        logger.exception("Error obteniendo última respuesta")
         return None
 
 def log_conversation(user_message: str, bot_response: str, channel: str, 
-                    response_time: float, search_performed: bool, results_count: int):
+                    response_time: float, search_performed: bool, results_count: int,
+                    filters: Optional[Dict[str, Any]] = None):
     """Registra conversación en logs"""
+    # Agregados en memoria para /analytics: no dependen de que la escritura en SQLite salga bien
+    conversation_analytics.record(channel, response_time, search_performed, results_count, user_message, filters)
     try:
         with sqlite3.connect(LOG_PATH) as conn:
             cursor = conn.cursor()
             
             # Crear tabla si no existe
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    channel TEXT NOT NULL,
-                    user_message TEXT NOT NULL,
-                    bot_response TEXT NOT NULL,
-                    response_time REAL,
-                    search_performed INTEGER DEFAULT 0,
-                    results_count INTEGER DEFAULT 0
-                )
-            ''')
+            asegurar_tabla_logs(cursor)
             
             cursor.execute('''
                 INSERT INTO logs (timestamp, channel, user_message, bot_response, 
@@ -406,10 +687,7 @@ def log_conversation(user_message: str, bot_response: str, channel: str,
                   search_performed, results_count))
             
             conn.commit()
-            print(f"📝 Log registrado - Canal: {channel}, Tiempo: {response_time:.2f}s")
+            logger.debug("Log registrado", extra={"channel": channel, "response_time": round(response_time, 3)})
             
     except Exception as e:
-        print(f"❌ Error registrando log: {e}")
-
-# Inicializar bases de datos al importar el módulo
-verificar_y_reparar_bd()
\ No newline at end of file
+        logger.exception("Error registrando log")
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Deadlines de punta a punta para una consulta.
+
+procesar_consulta arma un Deadline con CHAT_DEADLINE segundos y lo pasa a cada
+etapa que puede quedarse esperando: la búsqueda, la cola de admisión, el
+single-flight, los reintentos, cada llamada HTTP al LLM y el registro en los
+logs recortan su espera a lo que queda del presupuesto en vez de sumar sus
+propios timeouts fijos.
+
+Variables de entorno:
+    CHAT_DEADLINE   Segundos de presupuesto por consulta (web, WebSocket, WhatsApp y lotes; default 20).
+"""
+import os
+import math
+import time
+import asyncio
+from typing import Awaitable, Optional, TypeVar
+
+CHAT_DEADLINE = float(os.environ.get("CHAT_DEADLINE", "20"))
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el presupuesto de la consulta en la etapa `stage`. Se maneja igual que LLMSaturated."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline vencido en {stage}")
+        self.stage = stage
+        self.reason = f"deadline_{stage}"
+        self.retry_after = 1
+
+
+class Deadline:
+    """Instante límite (time.monotonic) de una consulta; sin segundos no vence nunca."""
+
+    def __init__(self, segundos: Optional[float] = None):
+        self.expira = math.inf if segundos is None else time.monotonic() + segundos
+
+    def restante(self) -> float:
+        return max(0.0, self.expira - time.monotonic())
+
+    def vencido(self) -> bool:
+        return time.monotonic() >= self.expira
+
+    def acotar(self, segundos: float) -> float:
+        """`segundos` recortado a lo que queda del presupuesto."""
+        return min(segundos, self.restante())
+
+    def timeout(self) -> Optional[float]:
+        """Lo que queda, en el formato de los `timeout=` de la stdlib (None = esperar sin límite)."""
+        return None if self.expira == math.inf else self.restante()
+
+
+SIN_DEADLINE = Deadline()
+
+
+async def esperar(aw: Awaitable[T], deadline: Deadline, stage: str) -> T:
+    """Espera `aw` a lo sumo lo que queda de `deadline`; si vence, DeadlineExceeded(stage).
+
+    Lo que corre en un hilo (run_in_threadpool) no se puede cortar: sigue hasta terminar y su
+    resultado se descarta.
+    """
+    try:
+        return await asyncio.wait_for(aw, deadline.timeout())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(stage) from None
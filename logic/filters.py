@@ -1,7 +1,33 @@
 
 import re
-from typing import Dict, Any
+import math
+from typing import Any, Dict, List, Mapping
 from logic.filter_data import BARRIOS, OPERACIONES, TIPOS
+from logic.gazetteer import normalizar_texto, buscar_referencia, nombres_referencias, PRECISION_BARRIO
+from logic.geo import KM_POR_CUADRA
+
+# Filtros que entiende query_properties; el resto no cambia los resultados
+FILTROS_TEXTO = ("barrio", "operacion", "tipo")
+FILTROS_NUMERICOS = ("min_price", "max_price", "min_rooms", "min_sqm", "max_sqm")
+FILTROS_GEO = ("lat", "lon", "radio_km", "min_lat", "max_lat", "min_lon", "max_lon", "max_dist_subte_km")
+
+
+class FiltroInvalido(ValueError):
+    """Un filtro con un valor que no se puede aplicar: número ilegible o moneda sin cotización (el endpoint responde 422)."""
+
+    def __init__(self, campo: str, valor: Any, motivo: str = "no es un número"):
+        super().__init__(f"Filtro inválido: {campo}={valor!r} {motivo}")
+        self.campo = campo
+
+
+_MONEDA_ARS_RE = re.compile(r"\b(pesos|ars)\b")
+# Alias de moneda -> código de la tabla cotizaciones (las únicas monedas que aceptan los filtros de precio)
+MONEDAS = {"usd": "USD", "u$s": "USD", "dolares": "USD", "ars": "ARS", "pesos": "ARS", "$": "ARS"}
+
+# "cerca de X", "a 10 cuadras de X", "a 5 cuadras del subte"
+_CERCANIA_RE = re.compile(r"(?:cerca|a\s+(\d+)\s+cuadras?)\s+(?:de\s+la|del|de)\s+(.+)")
+# Radio de "cerca del subte" sin cuadras explícitas
+CUADRAS_CERCA_SUBTE = 5
 
 def detect_filters(text_lower: str) -> Dict[str, Any]:
     """Detecta y extrae filtros del texto del usuario usando listas estáticas."""
@@ -76,6 +102,10 @@ def detect_filters(text_lower: str) -> Dict[str, Any]:
             filters["min_price"] = min_price
         except ValueError:
             pass
+
+    # Moneda de los precios (USD si no se aclara)
+    if ("max_price" in filters or "min_price" in filters) and _MONEDA_ARS_RE.search(text_lower):
+        filters["moneda"] = "ARS"
     
     # Ambientes
     rooms_match = re.search(r"(\d+)\s*amb", text_lower) or re.search(r"(\d+)\s*ambiente", text_lower)
@@ -87,4 +117,173 @@ def detect_filters(text_lower: str) -> Dict[str, Any]:
     if sqm_match:
         filters["min_sqm"] = int(sqm_match.group(1))
 
+    # Cercanía a un punto de referencia o al subte
+    filters.update(detect_cercania(text_lower))
+
     return filters
+
+
+def detect_cercania(text_lower: str) -> Dict[str, Any]:
+    """Filtros geo a partir de "cerca de Plaza Italia" o "a 10 cuadras del subte"."""
+    match = _CERCANIA_RE.search(normalizar_texto(text_lower))
+    if not match:
+        return {}
+    cuadras = int(match.group(1)) if match.group(1) else None
+    resto = match.group(2)
+
+    if resto.startswith("subte"):
+        return {"max_dist_subte_km": (cuadras or CUADRAS_CERCA_SUBTE) * KM_POR_CUADRA}
+
+    # El nombre más largo primero: "parque avellaneda" antes que "avellaneda"
+    for nombre in sorted(nombres_referencias(), key=len, reverse=True):
+        if resto.startswith(nombre) and buscar_referencia(nombre):
+            filtros = {"cerca_de": nombre}
+            if cuadras:
+                filtros["radio_km"] = cuadras * KM_POR_CUADRA
+            return filtros
+    return {}
+
+
+# Barrio normalizado -> como está escrito en BARRIOS (y en la BD): LIKE no ignora acentos
+_BARRIOS_CANONICOS = {normalizar_texto(b): b for b in BARRIOS}
+
+
+def canonicalize_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Forma canónica de un dict de filtros: dos dicts con la misma forma canónica
+    devuelven los mismos resultados, así que sirve como clave de cache.
+
+    - `neighborhood` y `barrio` se unifican en `barrio` (gana `neighborhood`, que viene del texto)
+    - `moneda` como código (ARS/USD), omitida si es USD o no hay filtro de precio
+    - textos en minúsculas y sin acentos ("Vicente López" == "vicente lopez"), salvo el barrio
+      conocido, que queda como está escrito en BARRIOS ("VICENTE lopez" -> "Vicente Lopez")
+    - números como int cuando son enteros (100000.0 == 100000)
+    - se descartan valores vacíos y claves que no filtran
+    - un filtro numérico o geo que no es un número, o una moneda desconocida con filtro de precio,
+      levanta FiltroInvalido (no se ignora en silencio)
+    """
+    canonico: Dict[str, Any] = {}
+
+    barrio = filters.get("neighborhood") or filters.get("barrio")
+    for campo, valor in (("barrio", barrio), ("operacion", filters.get("operacion")), ("tipo", filters.get("tipo"))):
+        if isinstance(valor, str) and valor.strip():
+            normalizado = normalizar_texto(valor)
+            if campo == "barrio":
+                # Un barrio desconocido queda tal cual: LIKE no ignora acentos ni mayúsculas fuera de ASCII
+                normalizado = _BARRIOS_CANONICOS.get(normalizado, " ".join(valor.split()))
+            canonico[campo] = normalizado
+
+    # La moneda sólo importa si hay precio, y USD es el default; una desconocida no se toma por USD
+    if filters.get("moneda") and (filters.get("min_price") or filters.get("max_price")):
+        moneda = MONEDAS.get(normalizar_texto(str(filters["moneda"])))
+        if moneda is None:
+            raise FiltroInvalido("moneda", filters["moneda"], "no es una moneda con cotización")
+        if moneda != "USD":
+            canonico["moneda"] = moneda
+
+    if isinstance(filters.get("cerca_de"), str) and filters["cerca_de"].strip():
+        canonico["cerca_de"] = normalizar_texto(filters["cerca_de"])
+
+    for campo in FILTROS_NUMERICOS + FILTROS_GEO:
+        valor = filters.get(campo)
+        if valor is None or valor == "":
+            continue
+        if isinstance(valor, str):
+            try:
+                valor = float(valor.replace(",", "."))
+            except ValueError:
+                raise FiltroInvalido(campo, filters[campo]) from None
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+            raise FiltroInvalido(campo, filters[campo])
+        if valor:
+            # Coordenadas a 5 decimales (~1 m): más precisión no cambia los resultados
+            canonico[campo] = int(valor) if float(valor).is_integer() else round(float(valor), 5)
+
+    return canonico
+
+
+# ✅ SEGUIMIENTO: "y con 3 ambientes?" ajusta la búsqueda anterior en vez de empezar de cero
+_SEGUIMIENTO_RE = re.compile(
+    r"^\s*(?:y|pero|con|sin|solo|sólo|que|ahora|mejor|más|mas|menos|hasta|desde|de esos|de esas|entre esos|entre esas)\b"
+)
+# Filtros que se pueden aplicar sobre resultados ya traídos (columna del registro, comparación)
+FILTROS_EN_MEMORIA = {
+    "barrio": ("barrio", "like"),
+    "operacion": ("operacion", "igual"),
+    "tipo": ("tipo", "igual"),
+    "min_rooms": ("ambientes", "min"),
+    "min_sqm": ("metros_cuadrados", "min"),
+    "max_sqm": ("metros_cuadrados", "max"),
+    "min_price": ("precio_usd", "min"),
+    "max_price": ("precio_usd", "max"),
+    "max_dist_subte_km": ("dist_subte_km", "max"),
+}
+_FILTROS_PRECIO = ("min_price", "max_price")
+# LIKE de SQLite sólo ignora mayúsculas en ASCII
+_MINUSCULAS_ASCII = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def es_seguimiento(text_lower: str) -> bool:
+    """Mensajes que continúan la búsqueda anterior: "y en Belgrano?", "con cochera", "más baratas"."""
+    return bool(_SEGUIMIENTO_RE.match(text_lower))
+
+
+def combinar_filtros(anteriores: Dict[str, Any], nuevos: Dict[str, Any]) -> Dict[str, Any]:
+    """Filtros canónicos de la búsqueda anterior con los del mensaje nuevo encima."""
+    return canonicalize_filters({**anteriores, **canonicalize_filters(nuevos)})
+
+
+def es_refinamiento(anteriores: Dict[str, Any], nuevos: Dict[str, Any]) -> bool:
+    """
+    True si `nuevos` (canónicos) sólo agrega o ajusta filtros de `anteriores` de forma que
+    los resultados son un subconjunto de los anteriores y se pueden filtrar en memoria.
+    Quitar un filtro, aflojarlo o cambiar barrio/zona/moneda es una relajación: va a la BD.
+    """
+    if anteriores.get("moneda") != nuevos.get("moneda"):
+        return False
+    for campo, valor in anteriores.items():
+        if campo not in nuevos:
+            return False
+        nuevo = nuevos[campo]
+        if nuevo == valor:
+            continue
+        comparacion = FILTROS_EN_MEMORIA.get(campo, (None, None))[1]
+        if comparacion == "min" and nuevo > valor or comparacion == "max" and nuevo < valor:
+            continue
+        return False
+    agregados = [campo for campo in nuevos if campo not in anteriores]
+    if any(campo not in FILTROS_EN_MEMORIA for campo in agregados):
+        return False
+    # Los precios en otra moneda necesitan la cotización: sólo se refinan en USD
+    cambia_precio = any(nuevos.get(c) != anteriores.get(c) for c in _FILTROS_PRECIO)
+    return not (nuevos.get("moneda") and cambia_precio)
+
+
+def _cumple(prop: Mapping, filtros: Dict[str, Any]) -> bool:
+    for campo, valor in filtros.items():
+        columna, comparacion = FILTROS_EN_MEMORIA.get(campo, (None, None))
+        if columna is None or campo in _FILTROS_PRECIO and filtros.get("moneda"):
+            continue
+        actual = prop.get(columna)
+        # Igual que en SQL: una columna NULL no cumple ninguna condición
+        if actual is None:
+            return False
+        if campo in FILTROS_GEO and prop.get("geo_precision") == PRECISION_BARRIO:
+            return False
+        if comparacion == "like":
+            if str(valor).translate(_MINUSCULAS_ASCII) not in actual.translate(_MINUSCULAS_ASCII):
+                return False
+        elif comparacion == "igual":
+            if actual != valor:
+                return False
+        elif comparacion == "min":
+            if actual < valor:
+                return False
+        elif actual > valor:
+            return False
+    return True
+
+
+def filtrar_en_memoria(resultados: List[Mapping], filtros: Dict[str, Any]) -> List[Mapping]:
+    """Aplica `filtros` canónicos a resultados anteriores (ver es_refinamiento); conserva el orden."""
+    return [prop for prop in resultados if _cumple(prop, filtros)]
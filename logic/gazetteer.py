@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Nomenclátor local para ubicar propiedades sin geocodificación por red.
+
+Se resuelve en este orden:
+    1. lat/lon que ya traiga la propiedad en propiedades.json
+    2. la dirección exacta en el archivo GAZETTEER_PATH, si existe
+       ({"direcciones": {"Avda. La Plata 1300": [-34.62, -58.42]}})
+    3. un punto de referencia (plaza, parque...) mencionado en la dirección
+    4. el centro del barrio
+
+La precisión obtenida se guarda junto a las coordenadas ("propiedad",
+"direccion", "referencia" o "barrio"). Una propiedad ubicada sólo por su
+barrio no entra en los filtros geo precisos (radio, caja, distancia al subte):
+el centro del barrio puede estar a más de un kilómetro de la propiedad.
+
+Variables de entorno:
+    GAZETTEER_PATH   JSON con coordenadas por dirección (default instance/gazetteer.json).
+"""
+import os
+import json
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+from logic.geo import haversine_km
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+GAZETTEER_PATH = os.environ.get("GAZETTEER_PATH", os.path.join(os.getcwd(), "instance", "gazetteer.json"))
+# Precisión de las coordenadas tomadas del centro del barrio
+PRECISION_BARRIO = "barrio"
+
+# Centro aproximado de cada barrio de filter_data.BARRIOS
+BARRIOS_COORDS = {
+    "Parque Avellaneda": (-34.6440, -58.4770),
+    "Boedo": (-34.6300, -58.4190),
+    "Microcentro": (-34.6037, -58.3780),
+    "Pilar": (-34.4587, -58.9140),
+    "Colegiales": (-34.5740, -58.4500),
+    "Palermo": (-34.5780, -58.4260),
+    "Belgrano": (-34.5620, -58.4560),
+    "Recoleta": (-34.5875, -58.3970),
+    "Almagro": (-34.6090, -58.4210),
+    "Villa Crespo": (-34.5990, -58.4400),
+    "San Isidro": (-34.4710, -58.5280),
+    "Vicente Lopez": (-34.5260, -58.4790),
+}
+
+# Puntos de referencia que la gente usa en "cerca de ..."
+REFERENCIAS = {
+    "Plaza Italia": (-34.5811, -58.4210),
+    "Obelisco": (-34.6037, -58.3816),
+    "Plaza de Mayo": (-34.6083, -58.3712),
+    "Plaza Serrano": (-34.5885, -58.4305),
+    "Barrancas de Belgrano": (-34.5617, -58.4504),
+    "Cementerio de la Recoleta": (-34.5875, -58.3934),
+    "Parque Centenario": (-34.6065, -58.4357),
+    "Abasto": (-34.6036, -58.4108),
+    "Parque Avellaneda": (-34.6475, -58.4790),
+    "Catedral de San Isidro": (-34.4714, -58.5067),
+}
+
+# Estaciones de subte (para "cerca del subte" y la distancia precalculada)
+ESTACIONES_SUBTE = {
+    "Plaza Italia": (-34.5811, -58.4210),
+    "Scalabrini Ortiz": (-34.5852, -58.4160),
+    "Bulnes": (-34.5881, -58.4114),
+    "Agüero": (-34.5916, -58.4071),
+    "Pueyrredón (D)": (-34.5942, -58.4019),
+    "Facultad de Medicina": (-34.5995, -58.3976),
+    "Callao (D)": (-34.5996, -58.3923),
+    "Tribunales": (-34.6018, -58.3847),
+    "9 de Julio": (-34.6045, -58.3805),
+    "Catedral": (-34.6075, -58.3738),
+    "Palermo": (-34.5784, -58.4256),
+    "Ministro Carranza": (-34.5752, -58.4350),
+    "Olleros": (-34.5705, -58.4440),
+    "José Hernández": (-34.5663, -58.4523),
+    "Juramento": (-34.5620, -58.4561),
+    "Congreso de Tucumán": (-34.5554, -58.4623),
+    "Malabia": (-34.5990, -58.4394),
+    "Ángel Gallardo": (-34.6020, -58.4313),
+    "Medrano": (-34.6033, -58.4210),
+    "Carlos Gardel": (-34.6040, -58.4116),
+    "Pueyrredón (B)": (-34.6045, -58.4053),
+    "Callao (B)": (-34.6044, -58.3925),
+    "Uruguay": (-34.6041, -58.3872),
+    "Florida": (-34.6031, -58.3749),
+    "Leandro N. Alem": (-34.6029, -58.3700),
+    "Dorrego": (-34.5917, -58.4478),
+    "Federico Lacroze": (-34.5872, -58.4546),
+    "Boedo": (-34.6254, -58.4153),
+    "Avenida La Plata": (-34.6265, -58.4263),
+    "José María Moreno": (-34.6283, -58.4340),
+    "Emilio Mitre": (-34.6310, -58.4415),
+    "Medalla Milagrosa": (-34.6350, -58.4470),
+    "Varela": (-34.6398, -58.4563),
+    "Plaza de los Virreyes": (-34.6429, -58.4612),
+}
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas, sin acentos y con espacios colapsados."""
+    sin_acentos = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sin_acentos.lower().split())
+
+
+_REFERENCIAS_NORMALIZADAS = {normalizar_texto(k): v for k, v in {**ESTACIONES_SUBTE, **REFERENCIAS}.items()}
+# Sólo los puntos de referencia se buscan dentro de direcciones: muchas estaciones
+# llevan nombre de calle ("Uruguay 1200" no está en la estación Uruguay)
+_REFERENCIAS_EN_DIRECCION = {normalizar_texto(k): v for k, v in REFERENCIAS.items()}
+_BARRIOS_NORMALIZADOS = {normalizar_texto(k): v for k, v in BARRIOS_COORDS.items()}
+_direcciones: Optional[Dict[str, Tuple[float, float]]] = None
+
+
+def _cargar_direcciones() -> Dict[str, Tuple[float, float]]:
+    global _direcciones
+    if _direcciones is None:
+        _direcciones = {}
+        if os.path.exists(GAZETTEER_PATH):
+            try:
+                with open(GAZETTEER_PATH, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                _direcciones = {normalizar_texto(k): (float(v[0]), float(v[1]))
+                                for k, v in data.get("direcciones", {}).items()}
+                logger.info("Nomenclátor local cargado", extra={"path": GAZETTEER_PATH, "direcciones": len(_direcciones)})
+            except (OSError, ValueError, TypeError, IndexError) as e:
+                logger.warning("Nomenclátor local inválido, se ignora", extra={"path": GAZETTEER_PATH, "error": str(e)})
+    return _direcciones
+
+
+def buscar_referencia(texto: str) -> Optional[Tuple[float, float]]:
+    """Coordenadas de un punto de referencia, estación o barrio por nombre."""
+    clave = normalizar_texto(texto)
+    return _REFERENCIAS_NORMALIZADAS.get(clave) or _BARRIOS_NORMALIZADOS.get(clave)
+
+
+def nombres_referencias():
+    """Nombres normalizados de referencias, estaciones y barrios (para detectar "cerca de X")."""
+    return list(_REFERENCIAS_NORMALIZADAS) + list(_BARRIOS_NORMALIZADOS)
+
+
+def ubicar_propiedad(prop: Dict[str, Any]) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+    """Devuelve (lat, lon, precision) para una propiedad, o (None, None, None) si no hay cómo ubicarla."""
+    try:
+        if prop.get("lat") is not None and prop.get("lon") is not None:
+            return float(prop["lat"]), float(prop["lon"]), "propiedad"
+    except (TypeError, ValueError):
+        pass
+
+    direccion = normalizar_texto(prop.get("direccion") or "")
+    if direccion:
+        coords = _cargar_direcciones().get(direccion)
+        if coords:
+            return coords[0], coords[1], "direccion"
+        for nombre, coords in _REFERENCIAS_EN_DIRECCION.items():
+            if nombre in direccion:
+                return coords[0], coords[1], "referencia"
+
+    coords = _BARRIOS_NORMALIZADOS.get(normalizar_texto(prop.get("barrio") or ""))
+    if coords:
+        return coords[0], coords[1], PRECISION_BARRIO
+    return None, None, None
+
+
+def distancia_subte_km(lat: float, lon: float) -> float:
+    """Distancia a la estación de subte más cercana."""
+    return min(haversine_km(lat, lon, s_lat, s_lon) for s_lat, s_lon in ESTACIONES_SUBTE.values())
@@ -1,104 +1,197 @@
 import os
-import google.generativeai as genai
-from typing import Optional, Dict, Any, List
-
-# ✅ CONFIGURACIÓN GLOBAL
-print("=" * 50)
-print("🔍 INICIALIZANDO GEMINI CLIENT")
-print("=" * 50)
-
-# Cargar API keys
-API_KEYS = []
-for i in range(1, 4):
-    key_name = f"GEMINI_API_KEY_{i}"
-    key_value = os.environ.get(key_name)
-    if key_value and key_value.strip():
-        API_KEYS.append(key_value.strip())
-        print(f"✅ {key_name}: Cargada correctamente")
-
-MODEL = os.environ.get("WORKING_MODEL", "gemini-2.0-flash-001")
-
-print(f"🎯 CONFIGURACIÓN FINAL: Modelo={MODEL}, Claves={len(API_KEYS)}")
-print("=" * 50)
-
-def call_gemini_with_rotation(prompt: str) -> str:
-    """Función para llamar a Gemini API con rotación de claves"""
-    print(f"🎯 INICIANDO ROTACIÓN DE CLAVES")
-    print(f"🔧 Modelo: {MODEL}")
-    print(f"🔑 Claves disponibles: {len(API_KEYS)}")
-    
-    if not API_KEYS:
-        print("⚠️ No hay API keys configuradas, usando modo básico")
+import json
+import asyncio
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import nullcontext
+from typing import Optional, Dict, Any, List, AsyncContextManager, AsyncIterator, Callable, Iterator
+
+from logic.logger import get_logger
+from logic.llm import llm_router, LLMUnavailable, StreamCortado, MODEL
+from logic.deadline import Deadline, DeadlineExceeded, SIN_DEADLINE, esperar
+from logic.singleflight import SingleFlight, normalize_key
+from logic.cache import TieredCache, shared_backend
+from logic.database import catalog_version
+
+logger = get_logger(__name__)
+
+# ✅ PROVEEDORES: claves, modelo y backends viven en logic.llm
+# Configuración histórica, para llamadas sin perfil de generación
+DEFAULT_GENERATION = {"temperature": 0.7, "max_output_tokens": 1000}
+
+# ✅ SINGLE-FLIGHT: prompts idénticos concurrentes comparten una sola llamada a Gemini
+gemini_singleflight = SingleFlight()
+
+# ✅ CACHE DE RESPUESTAS: compartido entre workers e invalidado al cambiar el catálogo
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "600"))
+llm_cache = TieredCache("llm", max_entries=512, ttl=LLM_CACHE_TTL,
+                        backend=shared_backend, version_fn=catalog_version)
+
+def llm_cache_key(prompt: str, generation: Dict[str, Any]) -> str:
+    """Clave de llm_cache (y del single-flight) para un prompt y su configuración de generación"""
+    return normalize_key(prompt + json.dumps(generation, sort_keys=True))
+
+def call_gemini_with_rotation(prompt: str, generation: Optional[Dict[str, Any]] = None,
+                              deadline: Optional[Deadline] = None) -> str:
+    """
+    Llama al LLM (claves de Gemini y, si fallan, el modelo local), coalesciendo prompts idénticos en vuelo.
+    Lanza DeadlineExceeded si el `deadline` vence antes de tener respuesta.
+    """
+    generation = generation or DEFAULT_GENERATION
+    deadline = deadline or SIN_DEADLINE
+    key = llm_cache_key(prompt, generation)
+
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        return gemini_singleflight.do(key, lambda: _generar_y_cachear(key, prompt, generation, deadline),
+                                      deadline.timeout())
+    except FutureTimeoutError:
+        raise DeadlineExceeded("singleflight")
+
+async def call_gemini_async(prompt: str, generation: Optional[Dict[str, Any]] = None,
+                            deadline: Optional[Deadline] = None,
+                            admitir: Optional[Callable[[], AsyncContextManager]] = None) -> str:
+    """
+    call_gemini_with_rotation sin bloquear el event loop. Un acierto de llm_cache vuelve enseguida;
+    sólo un fallo pasa por `admitir` (el slot de admisión), así la cache no espera turno ni da 503.
+    El slot lo pide el líder del single-flight: los prompts idénticos que se le unen no ocupan otro.
+    """
+    generation = generation or DEFAULT_GENERATION
+    deadline = deadline or SIN_DEADLINE
+    key = llm_cache_key(prompt, generation)
+
+    cached = await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        return cached
+
+    async def lider() -> str:
+        async with admitir() if admitir is not None else nullcontext():
+            return await asyncio.to_thread(_generar_y_cachear, key, prompt, generation, deadline)
+
+    try:
+        return await gemini_singleflight.do_async(key, lider, deadline.timeout())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("singleflight")
+
+def _generar_y_cachear(key: str, prompt: str, generation: Dict[str, Any], deadline: Deadline) -> str:
+    answer = _call_llm(prompt, generation, deadline)
+    # No cachear el mensaje de fallback: es un error transitorio, no una respuesta
+    if answer != get_fallback_response():
+        llm_cache.set(key, answer)
+    return answer
+
+def _call_llm(prompt: str, generation: Dict[str, Any], deadline: Deadline) -> str:
+    try:
+        return llm_router.generate(prompt, generation, deadline)
+    except LLMUnavailable:
         return get_fallback_response()
-    
-    for i, key in enumerate(API_KEYS):
+
+# ✅ STREAMING: los tokens llegan al cliente a medida que el modelo los genera
+def _stream_llm(prompt: str, generation: Dict[str, Any], deadline: Optional[Deadline]) -> Iterator[str]:
+    try:
+        yield from llm_router.stream(prompt, generation, deadline)
+    except LLMUnavailable:
+        yield get_fallback_response()
+
+async def stream_gemini(prompt: str, generation: Optional[Dict[str, Any]] = None,
+                        deadline: Optional[Deadline] = None,
+                        admitir: Optional[Callable[[], AsyncContextManager]] = None) -> AsyncIterator[str]:
+    """
+    Fragmentos de la respuesta de Gemini sin bloquear el event loop. Comparte
+    la cache con call_gemini_with_rotation: un acierto sale como un solo fragmento
+    y no pasa por `admitir`, que sólo envuelve la generación real.
+    """
+    generation = generation or DEFAULT_GENERATION
+    key = llm_cache_key(prompt, generation)
+
+    cached = await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        yield cached
+        return
+
+    async with admitir() if admitir is not None else nullcontext():
+        async for chunk in _stream_sin_cache(key, prompt, generation, deadline):
+            yield chunk
+
+async def _stream_sin_cache(key: str, prompt: str, generation: Dict[str, Any],
+                            deadline: Optional[Deadline]) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    cola: asyncio.Queue = asyncio.Queue()
+    fin = object()
+    # Se prende si el consumidor se va o vence el deadline: el hilo deja de leer en el próximo fragmento
+    parar = threading.Event()
+
+    def producir() -> bool:
+        fragmentos = _stream_llm(prompt, generation, deadline)
         try:
-            print(f"🔄 Probando clave {i+1}/{len(API_KEYS)}...")
-            
-            # ✅ CONFIGURACIÓN EXPLÍCITA
-            genai.configure(
-                api_key=key,
-                transport='rest',  # Forzar transporte REST
-            )
-            
-            model = genai.GenerativeModel(MODEL)
-            
-            # ✅ LLAMADA MÁS SIMPLE PARA DIAGNÓSTICO
-            print(f"   📝 Prompt length: {len(prompt)} caracteres")
-            response = model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7,
-                    max_output_tokens=1000,
-                )
-            )
-            
-            print(f"   ✅ Respuesta recibida, partes: {len(response.parts) if response.parts else 0}")
-            
-            if not response.parts:
-                raise Exception("Respuesta vacía de Gemini")
-            
-            answer = response.text.strip()
-            print(f"✅ Éxito con clave {i+1}")
-            print(f"   📄 Respuesta: {answer[:100]}...")
-            return answer
-
-        except Exception as e:
-            error_type = type(e).__name__
-            error_msg = str(e)
-            
-            print(f"❌ ERROR Clave {i+1}:")
-            print(f"   🏷️  Tipo: {error_type}")
-            print(f"   📄 Mensaje: {error_msg}")
-            
-            # Detectar tipo de error específico
-            if "429" in error_msg:
-                print(f"   💡 Clave {i+1} agotada (rate limit)")
-            elif "401" in error_msg or "PermissionDenied" in error_type or "API_KEY_INVALID" in error_msg:
-                print(f"   💡 Clave {i+1} no autorizada/inválida")
-            elif "quota" in error_msg.lower():
-                print(f"   💡 Clave {i+1} sin quota")
-            elif "503" in error_msg or "500" in error_msg:
-                print(f"   💡 Error del servidor Gemini")
-            elif "network" in error_msg.lower() or "connection" in error_msg.lower():
-                print(f"   💡 Error de conexión")
-            
-            continue
-    
-    print("💥 TODAS las claves fallaron - usando modo básico")
-    return get_fallback_response()
+            for chunk in fragmentos:
+                if parar.is_set():
+                    return False
+                loop.call_soon_threadsafe(cola.put_nowait, chunk)
+            return True
+        except StreamCortado:
+            return False
+        finally:
+            # Cierra la respuesta HTTP si se cortó antes de terminar
+            fragmentos.close()
+            loop.call_soon_threadsafe(cola.put_nowait, fin)
+
+    tarea = loop.run_in_executor(None, producir)
+    partes = []
+    try:
+        while True:
+            # Cada fragmento espera a lo sumo lo que queda del deadline, no sólo el primero
+            chunk = await esperar(cola.get(), deadline or SIN_DEADLINE, "stream")
+            if chunk is fin:
+                break
+            partes.append(chunk)
+            yield chunk
+    finally:
+        parar.set()
+
+    completo = await tarea
+    answer = "".join(partes).strip()
+    # Igual que en la versión sin streaming: no cachear el fallback ni una respuesta cortada
+    if completo and answer and answer != get_fallback_response():
+        await asyncio.to_thread(llm_cache.set, key, answer)
 
 def get_fallback_response():
-    """Respuesta de fallback cuando Gemini no funciona"""
+    """Respuesta de fallback cuando ningún backend LLM responde"""
     return "🤖 **Dante Propiedades**\n\n¡Hola! La aplicación está funcionando pero hay un problema temporal con el servicio de IA.\n\n**Sistema disponible:**\n✅ Búsqueda de propiedades\n✅ Filtros por barrio, precio, tipo\n✅ Base de datos cargada\n\n⚠️ **El modo conversacional IA está temporalmente desactivado.**\n\n**Cómo usar:**\n1. Escribí tu búsqueda (ej: \"departamento en palermo\")\n2. La app encontrará propiedades relevantes\n3. Usá los filtros para refinar resultados\n\n🏠 **¡La búsqueda de propiedades funciona perfectamente!**"
 
+# Campos de una propiedad que describen el inmueble (para prompts de detalle y el hash de contenido)
+CAMPOS_DETALLE = [
+    "titulo", "operacion", "tipo", "barrio", "direccion", "precio", "moneda_precio", "ambientes",
+    "metros_cuadrados", "antiguedad", "estado", "orientacion", "expensas", "moneda_expensas",
+    "amenities", "cochera", "balcon", "pileta", "acepta_mascotas", "aire_acondicionado", "descripcion",
+]
+
+def formatear_datos_propiedad(prop: Dict[str, Any]) -> str:
+    """Los campos con valor de una propiedad, uno por línea"""
+    return "\n".join(f"- {campo}: {prop[campo]}" for campo in CAMPOS_DETALLE if prop.get(campo) not in (None, ""))
+
 # ... (el resto de build_prompt permanece igual)
 def build_prompt(user_text, results=None, filters=None, channel="web", style_hint="", property_details=None):
     whatsapp_tone = channel == "whatsapp"
 
     if property_details:
-        # ... (código existente para property_details) ...
-        pass
+        # ✅ PREGUNTA SOBRE UNA PROPIEDAD: prompt corto con sólo sus datos (y el resumen precalculado)
+        prop = property_details["propiedad"]
+        resumen = property_details.get("resumen")
+        faq = property_details.get("faq") or []
+        return (
+            f"El usuario pregunta por la propiedad {prop.get('id_temporal')} ({prop.get('titulo')}): '{user_text}'\n\n"
+            f"DATOS DE LA PROPIEDAD (única fuente válida):\n{formatear_datos_propiedad(prop)}\n"
+            + (f"\nResumen: {resumen}\n" if resumen else "")
+            + ("\nPreguntas frecuentes:\n" + "\n".join(f"- {f['pregunta']} {f['respuesta']}" for f in faq) + "\n" if faq else "")
+            + f"\nINSTRUCCIONES:\n"
+            f"1. Respondé sólo con los datos de arriba, sin inventar\n"
+            f"2. Si el dato no está, decí que hay que consultarlo con la inmobiliaria\n"
+            f"3. Mantén un tono {'breve y directo' if whatsapp_tone else 'profesional y cálido'}\n"
+        )
     
     if results is not None and results:
         # ✅ NUEVA VERSIÓN - SIN LISTAR PROPIEDADES EN EL TEXTO
@@ -114,9 +207,9 @@ def build_prompt(user_text, results=None, filters=None, channel="web", style_hin
         }
         
         # Solo obtener información general para contexto, NO para mostrar
-        tipos = list(set([r.get('tipo', '').title() for r in results if r.get('tipo')]))
-        barrios = list(set([r.get('barrio', '') for r in results if r.get('barrio')]))
-        operaciones = list(set([r.get('operacion', '').title() for r in results if r.get('operacion')]))
+        tipos = sorted(set(r.get('tipo', '').title() for r in results if r.get('tipo')))
+        barrios = sorted(set(r.get('barrio', '') for r in results if r.get('barrio')))
+        operaciones = sorted(set(r.get('operacion', '').title() for r in results if r.get('operacion')))
         
         return (
             f"El usuario busca: '{user_text}'\n\n"
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Perfiles de generación para Gemini según el tipo de respuesta.
+
+La latencia de Gemini la dominan los tokens de salida: una confirmación de
+búsqueda necesita una o dos oraciones, una consulta de asesoramiento algo más.
+Con GEMINI_STRUCTURED_OUTPUT=1 además se pide salida JSON con esquema
+({"mensaje": "..."}), que ya viene sin listados y no necesita limpieza.
+"""
+import os
+import json
+from typing import Any, Dict, List, Optional
+
+GEMINI_STRUCTURED_OUTPUT = os.environ.get("GEMINI_STRUCTURED_OUTPUT", "0") == "1"
+
+CONFIRMACION = "confirmacion"
+SIN_RESULTADOS = "sin_resultados"
+ASESORAMIENTO = "asesoramiento"
+
+GENERATION_PROFILES = {
+    CONFIRMACION: {"temperature": 0.4, "max_output_tokens": 128},
+    SIN_RESULTADOS: {"temperature": 0.5, "max_output_tokens": 192},
+    ASESORAMIENTO: {"temperature": 0.7, "max_output_tokens": 512},
+}
+
+# WhatsApp pide respuestas más cortas todavía
+WHATSAPP_TOKEN_FACTOR = 0.6
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {"mensaje": {"type": "string"}},
+    "required": ["mensaje"],
+}
+
+STRUCTURED_INSTRUCTION = (
+    "\n\nFORMATO: respondé sólo con un objeto JSON {\"mensaje\": \"...\"}. "
+    "El mensaje es texto plano de una o dos oraciones, sin listar propiedades."
+)
+
+
+def select_profile(results: Optional[List[Dict]]) -> str:
+    """Elige el perfil según haya búsqueda con resultados, sin resultados o ninguna búsqueda."""
+    if results is None:
+        return ASESORAMIENTO
+    return CONFIRMACION if results else SIN_RESULTADOS
+
+
+def generation_config_for(profile: str, channel: str = "web",
+                          structured: bool = GEMINI_STRUCTURED_OUTPUT) -> Dict[str, Any]:
+    """Arma el generation_config (dict) para el perfil y canal dados."""
+    config = dict(GENERATION_PROFILES.get(profile, GENERATION_PROFILES[ASESORAMIENTO]))
+    if channel == "whatsapp":
+        config["max_output_tokens"] = int(config["max_output_tokens"] * WHATSAPP_TOKEN_FACTOR)
+    if structured:
+        config["response_mime_type"] = "application/json"
+        config["response_schema"] = RESPONSE_SCHEMA
+    return config
+
+
+def parse_structured_answer(answer: str) -> Optional[str]:
+    """Extrae `mensaje` de una respuesta JSON; None si no vino en ese formato."""
+    try:
+        data = json.loads(answer)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(data, dict) and isinstance(data.get("mensaje"), str) and data["mensaje"].strip():
+        return data["mensaje"].strip()
+    return None
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Utilidades geoespaciales: geohash, cajas envolventes y distancias.
+
+Cada propiedad guarda su geohash (GEOHASH_PRECISION caracteres, ~150 m en
+Buenos Aires) en una columna indexada. Una búsqueda por radio o por caja se
+traduce en unos pocos rangos de prefijo sobre ese índice (`celdas_para_caja`);
+la distancia exacta sólo se calcula sobre los candidatos que devuelve SQLite.
+"""
+import math
+from typing import List, Tuple
+
+GEOHASH_PRECISION = 7
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_CUADRA = 0.1
+
+# Máximo de celdas por consulta: si la caja necesita más, se usa una precisión menor
+MAX_CELDAS = 16
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash estándar de `precision` caracteres."""
+    lat_rango = [-90.0, 90.0]
+    lon_rango = [-180.0, 180.0]
+    resultado = []
+    bits = 0
+    valor = 0
+    par = True  # los bits pares son de longitud
+    while len(resultado) < precision:
+        rango, coord = (lon_rango, lon) if par else (lat_rango, lat)
+        medio = (rango[0] + rango[1]) / 2
+        valor <<= 1
+        if coord >= medio:
+            valor |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        par = not par
+        bits += 1
+        if bits == 5:
+            resultado.append(_BASE32[valor])
+            bits = 0
+            valor = 0
+    return "".join(resultado)
+
+
+def tamano_celda(precision: int) -> Tuple[float, float]:
+    """(alto en grados de latitud, ancho en grados de longitud) de una celda."""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def _pasos(minimo: float, maximo: float, paso: float) -> List[float]:
+    valores = []
+    actual = minimo
+    while actual < maximo:
+        valores.append(actual)
+        actual += paso
+    valores.append(maximo)
+    return valores
+
+
+def celdas_para_caja(min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> List[str]:
+    """
+    Prefijos de geohash que cubren la caja, con la mayor precisión que no
+    supere MAX_CELDAS. Todas las propiedades dentro de la caja tienen un
+    geohash que empieza con alguno de estos prefijos.
+    """
+    for precision in range(GEOHASH_PRECISION, 1, -1):
+        alto, ancho = tamano_celda(precision)
+        filas = math.ceil((max_lat - min_lat) / alto) + 1
+        columnas = math.ceil((max_lon - min_lon) / ancho) + 1
+        if filas * columnas <= MAX_CELDAS:
+            break
+    return sorted({
+        geohash_encode(lat, lon, precision)
+        for lat in _pasos(min_lat, max_lat, alto)
+        for lon in _pasos(min_lon, max_lon, ancho)
+    })
+
+
+def caja_para_radio(lat: float, lon: float, radio_km: float) -> Tuple[float, float, float, float]:
+    """Caja (min_lat, max_lat, min_lon, max_lon) que contiene el círculo."""
+    delta_lat = math.degrees(radio_km / RADIO_TIERRA_KM)
+    delta_lon = math.degrees(radio_km / (RADIO_TIERRA_KM * max(0.01, math.cos(math.radians(lat)))))
+    return lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia en km sobre la esfera."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Clasificador de intención para decidir si una consulta necesita a Gemini.
+
+Las respuestas que quedan totalmente determinadas por los datos (saludos,
+agradecimientos, "encontré N propiedades", "no hay resultados") se resuelven
+con plantillas en logic/templates.py. Sólo las consultas abiertas van al LLM.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+SALUDO = "saludo"
+AGRADECIMIENTO = "agradecimiento"
+BUSQUEDA_CON_RESULTADOS = "busqueda_con_resultados"
+BUSQUEDA_SIN_RESULTADOS = "busqueda_sin_resultados"
+ABIERTA = "abierta"
+DETALLE_PROPIEDAD = "detalle_propiedad"
+
+PALABRAS_SALUDO = {"hola", "hi", "hello", "buenas", "buen", "empezar", "inicio", "ayuda"}
+PALABRAS_AGRADECIMIENTO = {"gracias", "genial", "perfecto", "chau", "adiós", "adios", "listo", "dale", "ok"}
+
+# Indicios de una pregunta que necesita redacción libre (asesoramiento, detalles, comparaciones)
+# (sin "que", "como", "donde"... sin tilde: son demasiado comunes dentro de una búsqueda)
+PALABRAS_ABIERTAS = {
+    "qué", "cuál", "cuáles", "cuales", "cómo", "cuánto", "cuanto", "cuánta", "cuanta",
+    "cuántos", "cuantos", "dónde", "cuándo",
+    "conviene", "recomendás", "recomendas", "recomendar", "recomendación", "opinás", "opinas",
+    "diferencia", "explicame", "explicá", "requisitos", "garantía", "garantia",
+    "financiación", "financiacion", "crédito", "credito", "hipoteca", "escritura", "tasación",
+    "tasacion", "visitar", "visita", "contacto", "teléfono", "telefono",
+}
+
+_TOKEN_RE = re.compile(r"[a-záéíóúüñ]+")
+# Ids de propiedad como "UF001" mencionados en el texto
+_ID_PROPIEDAD_RE = re.compile(r"\b([a-z]{2,5}\d{2,6})\b")
+
+
+def _tokens(text_lower: str) -> List[str]:
+    return _TOKEN_RE.findall(text_lower)
+
+
+def es_pregunta_abierta(text_lower: str) -> bool:
+    if "?" in text_lower or "¿" in text_lower:
+        return True
+    tokens = _tokens(text_lower)
+    if any(t in PALABRAS_ABIERTAS for t in tokens):
+        return True
+    return "por qué" in text_lower
+
+
+def classify_intent(text_lower: str, filters: Dict[str, Any], results: Optional[List[Dict]],
+                    contexto_anterior: Optional[Dict[str, Any]] = None) -> str:
+    """Devuelve la intención de la consulta (una de las constantes del módulo)."""
+    tokens = _tokens(text_lower)
+    abierta = es_pregunta_abierta(text_lower)
+
+    if not filters:
+        if not abierta and tokens and len(tokens) <= 6:
+            if any(t in PALABRAS_SALUDO for t in tokens) and not contexto_anterior:
+                return SALUDO
+            if any(t in PALABRAS_AGRADECIMIENTO for t in tokens):
+                return AGRADECIMIENTO
+        return ABIERTA
+
+    if abierta or results is None:
+        return ABIERTA
+    return BUSQUEDA_CON_RESULTADOS if results else BUSQUEDA_SIN_RESULTADOS
+
+
+def propiedad_en_foco(text_lower: str, filters: Dict[str, Any],
+                      contexto_anterior: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    id_temporal de la propiedad por la que se pregunta: un id mencionado en el texto, o,
+    si es una pregunta sin búsqueda nueva, la única propiedad del contexto anterior.
+    """
+    match = _ID_PROPIEDAD_RE.search(text_lower)
+    if match:
+        return match.group(1).upper()
+    if filters or not contexto_anterior or not es_pregunta_abierta(text_lower):
+        return None
+    foco = contexto_anterior.get("propiedad_focus")
+    if isinstance(foco, dict) and foco.get("id_temporal"):
+        return foco["id_temporal"]
+    resultados = contexto_anterior.get("resultados") or []
+    if len(resultados) == 1:
+        # El frontend manda las propiedades completas; las sesiones WebSocket, sólo los ids
+        unico = resultados[0]
+        return unico.get("id_temporal") if isinstance(unico, dict) else str(unico)
+    return None
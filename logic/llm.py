@@ -0,0 +1,598 @@
+# -*- coding: utf-8 -*-
+"""
+Capa de proveedores de LLM: una sola interfaz para Gemini y un modelo local.
+
+    - Transporte: una requests.Session compartida con pool de conexiones, así
+      cada llamada reusa la conexión TLS abierta en vez de negociar una nueva.
+    - `RetryPolicy`: qué errores se reintentan en el mismo backend (5xx,
+      timeouts, conexión) y con qué backoff; los 429 y las claves inválidas
+      pasan directo al siguiente backend.
+    - Backends: `GeminiBackend` (API REST v1beta, uno por API key) y
+      `OllamaBackend` (modelo local por su API HTTP). Todos exponen
+      `generate` y `stream` y lanzan `LLMError` con el motivo del fallo.
+    - `LLMRouter` recorre los backends en orden: primero las claves de Gemini,
+      y si todas fallan el modelo local, antes de resignarse al mensaje fijo.
+      Una clave que devolvió 429 o resultó inválida se saltea por LLM_COOLDOWN.
+    - Cobertura (hedging): si la llamada en curso tarda más que el percentil
+      LLM_HEDGE_PERCENTILE de las latencias recientes, sale la misma llamada
+      por la siguiente clave de Gemini sana (nunca por el modelo local, que es
+      sólo failover). Gana la primera respuesta; la otra se abandona (su
+      resultado se descarta y, si es un stream, se cierra la conexión). Como
+      la abandonada sigue ocupando un hilo hasta terminar, a lo sumo
+      LLM_HEDGE_MAX_INFLIGHT carreras cubiertas pueden tener hilos en curso;
+      con el cupo lleno no se cubre. Todo respeta el Deadline de la consulta
+      (logic.deadline).
+
+Variables de entorno:
+    GEMINI_API_KEYS        Claves de Gemini separadas por coma, en el orden en que se prueban (la que usa el Dockerfile).
+    GEMINI_API_KEY_1..3    Claves sueltas; se prueban después de las de GEMINI_API_KEYS.
+    WORKING_MODEL          Modelo de Gemini (default gemini-2.0-flash-001).
+    GEMINI_API_ENDPOINT    Base de la API de Gemini (ej: loadtest/fake_gemini.py en http://127.0.0.1:8081).
+    OLLAMA_HOST            Servidor de Ollama (default http://127.0.0.1:11434).
+    OLLAMA_MODEL           Modelo local para failover (default vacío = sin backend local).
+    LLM_POOL_SIZE          Conexiones abiertas por host en el pool (default 16).
+    LLM_CONNECT_TIMEOUT    Segundos para conectar (default 3).
+    LLM_TIMEOUT            Segundos de espera de la respuesta (default 30).
+    LLM_RETRIES            Reintentos por backend ante errores transitorios (default 1).
+    LLM_RETRY_BACKOFF      Espera base del backoff exponencial, en segundos (default 0.5).
+    LLM_COOLDOWN           Segundos que se saltea un backend tras un 429 o una clave inválida (default 30).
+    LLM_HEDGE              1 para cubrir las llamadas lentas con otro backend (default 1).
+    LLM_HEDGE_PERCENTILE   Percentil de latencia a partir del cual se cubre una llamada (default 95).
+    LLM_HEDGE_DELAY        Umbral en segundos mientras no haya muestras suficientes (default 2).
+    LLM_HEDGE_MIN_SAMPLES  Latencias necesarias para usar el percentil (default 20).
+    LLM_HEDGE_WINDOW       Latencias recientes que se miran (default 200).
+    LLM_HEDGE_MAX_INFLIGHT Carreras cubiertas con hilos en curso como máximo (default LLM_POOL_SIZE / 4).
+"""
+import os
+import re
+import json
+import time
+import random
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from logic.deadline import Deadline, DeadlineExceeded, SIN_DEADLINE
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+_claves = os.environ.get("GEMINI_API_KEYS", "").split(",") + [
+    os.environ.get(f"GEMINI_API_KEY_{i}", "") for i in range(1, 4)
+]
+# Sin repetidas: la misma clave en las dos variables sería un backend duplicado
+API_KEYS = list(dict.fromkeys(clave.strip() for clave in _claves if clave.strip()))
+MODEL = os.environ.get("WORKING_MODEL", "gemini-2.0-flash-001")
+API_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT")
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "").strip()
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "16"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "3"))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "30"))
+LLM_RETRIES = int(os.environ.get("LLM_RETRIES", "1"))
+LLM_RETRY_BACKOFF = float(os.environ.get("LLM_RETRY_BACKOFF", "0.5"))
+LLM_COOLDOWN = float(os.environ.get("LLM_COOLDOWN", "30"))
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "1") == "1"
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_DELAY = float(os.environ.get("LLM_HEDGE_DELAY", "2"))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_WINDOW = int(os.environ.get("LLM_HEDGE_WINDOW", "200"))
+LLM_HEDGE_MAX_INFLIGHT = int(os.environ.get("LLM_HEDGE_MAX_INFLIGHT", str(max(1, LLM_POOL_SIZE // 4))))
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+
+
+# ✅ ERRORES Y REINTENTOS
+class LLMError(Exception):
+    """Falla de un backend; `reason` es uno de rate_limit, invalid_key, server_error, timeout,
+    connection, bad_request, empty o bad_response."""
+
+    def __init__(self, reason: str, message: str = "", status: Optional[int] = None):
+        super().__init__(message or reason)
+        self.reason = reason
+        self.status = status
+
+
+class LLMUnavailable(Exception):
+    """Ningún backend pudo responder."""
+
+
+class StreamCortado(Exception):
+    """El stream se cortó después de emitir texto: no se puede pasar a otro backend sin repetirlo."""
+
+
+def error_http(status: int, cuerpo: str) -> LLMError:
+    """LLMError con el motivo que corresponde a una respuesta HTTP fallida."""
+    if status == 429:
+        reason = "rate_limit"
+    elif status in (401, 403) or "API_KEY_INVALID" in cuerpo:
+        reason = "invalid_key"
+    elif status >= 500:
+        reason = "server_error"
+    else:
+        reason = "bad_request"
+    return LLMError(reason, f"HTTP {status}: {cuerpo[:200]}", status)
+
+
+class RetryPolicy:
+    """Reintentos en el mismo backend sólo para fallas transitorias, con backoff exponencial y jitter."""
+
+    REINTENTABLES = frozenset(("server_error", "timeout", "connection"))
+    # Errores que no se arreglan reintentando enseguida con el mismo backend: se lo saltea por un rato
+    ENFRIAN = frozenset(("rate_limit", "invalid_key"))
+
+    def __init__(self, retries: int = LLM_RETRIES, backoff: float = LLM_RETRY_BACKOFF, max_backoff: float = 4.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def reintentar(self, error: LLMError, intento: int) -> bool:
+        return error.reason in self.REINTENTABLES and intento < self.retries
+
+    def espera(self, intento: int) -> float:
+        return min(self.max_backoff, self.backoff * 2 ** intento) * random.uniform(0.5, 1.0)
+
+
+retry_policy = RetryPolicy()
+
+
+# ✅ TRANSPORTE: una sesión con pool de conexiones para todos los backends
+def crear_sesion(pool_size: int = LLM_POOL_SIZE) -> requests.Session:
+    sesion = requests.Session()
+    # Sin reintentos de urllib3: los decide RetryPolicy, que conoce el motivo del error
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    sesion.mount("http://", adapter)
+    sesion.mount("https://", adapter)
+    return sesion
+
+
+http_session = crear_sesion()
+
+
+def _post(sesion: requests.Session, url: str, cuerpo: Dict[str, Any], timeout: float, stream: bool = False,
+          headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    if timeout <= 0:
+        raise LLMError("timeout", "Sin tiempo para la llamada")
+    try:
+        respuesta = sesion.post(url, json=cuerpo, headers=headers, stream=stream,
+                                timeout=(min(LLM_CONNECT_TIMEOUT, timeout), timeout))
+    except requests.Timeout as e:
+        raise LLMError("timeout", str(e)) from e
+    except requests.RequestException as e:
+        raise LLMError("connection", str(e)) from e
+    if respuesta.status_code != 200:
+        cuerpo_error = respuesta.text
+        respuesta.close()
+        raise error_http(respuesta.status_code, cuerpo_error)
+    return respuesta
+
+
+class MedidorLatencia:
+    """Últimas latencias exitosas; de su percentil sale el umbral para cubrir una llamada."""
+
+    def __init__(self, ventana: int = LLM_HEDGE_WINDOW):
+        self._muestras: deque = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos: float):
+        with self._lock:
+            self._muestras.append(segundos)
+
+    def percentil(self, p: float) -> Optional[float]:
+        with self._lock:
+            muestras = sorted(self._muestras)
+        if not muestras:
+            return None
+        return muestras[min(len(muestras) - 1, int(len(muestras) * p / 100))]
+
+    def umbral(self) -> float:
+        """Segundos de espera antes de cubrir una llamada."""
+        if len(self._muestras) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DELAY
+        return self.percentil(LLM_HEDGE_PERCENTILE)
+
+    def stats(self) -> Dict[str, Any]:
+        def ms(p: float) -> Optional[float]:
+            valor = self.percentil(p)
+            return None if valor is None else round(valor * 1000, 1)
+        return {
+            "samples": len(self._muestras),
+            "p50_ms": ms(50), "p95_ms": ms(95), "p99_ms": ms(99),
+            "hedge_after_ms": round(self.umbral() * 1000, 1),
+        }
+
+
+class BackendStats:
+    def __init__(self):
+        self.calls = 0
+        self.ok = 0
+        self.errors: Counter = Counter()
+        self._total_ms = 0.0
+
+    def registrar(self, inicio: float, error: Optional[LLMError] = None):
+        self.calls += 1
+        if error is None:
+            self.ok += 1
+            self._total_ms += (time.perf_counter() - inicio) * 1000
+        else:
+            self.errors[error.reason] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "ok": self.ok,
+            "errors": dict(self.errors),
+            "avg_ms": round(self._total_ms / self.ok, 1) if self.ok else None,
+        }
+
+
+# ✅ BACKENDS
+class LLMBackend:
+    """Interfaz común: `generate` devuelve el texto completo, `stream` lo emite en fragmentos."""
+
+    kind = "base"
+
+    def __init__(self, name: str, sesion: requests.Session = http_session):
+        self.name = name
+        self.sesion = sesion
+        self.stats = BackendStats()
+        self.enfriado_hasta = 0.0
+
+    def sano(self) -> bool:
+        return time.monotonic() >= self.enfriado_hasta
+
+    def enfriar(self, segundos: float = LLM_COOLDOWN):
+        self.enfriado_hasta = time.monotonic() + segundos
+
+    def generate(self, prompt: str, generation: Dict[str, Any], timeout: float = LLM_TIMEOUT) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, generation: Dict[str, Any], timeout: float = LLM_TIMEOUT) -> Iterator[str]:
+        raise NotImplementedError
+
+
+def _camel(nombre: str) -> str:
+    return re.sub(r"_([a-z])", lambda m: m.group(1).upper(), nombre)
+
+
+def _esquema_gemini(esquema: Any) -> Any:
+    """El esquema de la API REST usa los tipos en mayúsculas (OBJECT, STRING...)."""
+    if isinstance(esquema, dict):
+        return {clave: valor.upper() if clave == "type" and isinstance(valor, str) else _esquema_gemini(valor)
+                for clave, valor in esquema.items()}
+    if isinstance(esquema, list):
+        return [_esquema_gemini(valor) for valor in esquema]
+    return esquema
+
+
+def generation_config_gemini(generation: Dict[str, Any]) -> Dict[str, Any]:
+    """generation_config en snake_case (como lo arma logic.generation) -> generationConfig de la API REST."""
+    config = {_camel(clave): valor for clave, valor in generation.items()}
+    if "responseSchema" in config:
+        config["responseSchema"] = _esquema_gemini(config["responseSchema"])
+    return config
+
+
+def _texto_candidato(data: Dict[str, Any]) -> str:
+    candidatos = data.get("candidates") or [{}]
+    partes = (candidatos[0].get("content") or {}).get("parts") or []
+    return "".join(p.get("text", "") for p in partes)
+
+
+class GeminiBackend(LLMBackend):
+    kind = "gemini"
+
+    def __init__(self, api_key: str, index: int, model: str = MODEL, endpoint: Optional[str] = API_ENDPOINT,
+                 sesion: requests.Session = http_session):
+        super().__init__(f"gemini:{index}", sesion)
+        self.index = index
+        self.model = model
+        base = (endpoint or GEMINI_BASE_URL).rstrip("/")
+        if "://" not in base:
+            base = f"https://{base}"
+        self._url = f"{base}/v1beta/models/{model}"
+        # La clave va en un header: no aparece en URLs ni en logs de acceso
+        self._headers = {"x-goog-api-key": api_key}
+
+    def _cuerpo(self, prompt: str, generation: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": generation_config_gemini(generation),
+        }
+
+    def generate(self, prompt: str, generation: Dict[str, Any], timeout: float = LLM_TIMEOUT) -> str:
+        respuesta = _post(self.sesion, f"{self._url}:generateContent", self._cuerpo(prompt, generation), timeout,
+                          headers=self._headers)
+        try:
+            texto = _texto_candidato(respuesta.json()).strip()
+        except ValueError as e:
+            raise LLMError("bad_response", str(e)) from e
+        if not texto:
+            raise LLMError("empty", "Respuesta vacía de Gemini")
+        return texto
+
+    def stream(self, prompt: str, generation: Dict[str, Any], timeout: float = LLM_TIMEOUT) -> Iterator[str]:
+        respuesta = _post(self.sesion, f"{self._url}:streamGenerateContent?alt=sse",
+                          self._cuerpo(prompt, generation), timeout, stream=True, headers=self._headers)
+        with respuesta:
+            for linea in respuesta.iter_lines(decode_unicode=True):
+                if linea and linea.startswith("data:"):
+                    texto = _texto_candidato(json.loads(linea[5:]))
+                    if texto:
+                        yield texto
+
+
+class OllamaBackend(LLMBackend):
+    """Modelo local servido por Ollama (/api/generate): no gasta quota y no depende de la red."""
+
+    kind = "ollama"
+
+    def __init__(self, model: str = OLLAMA_MODEL, host: str = OLLAMA_HOST, sesion: requests.Session = http_session):
+        super().__init__(f"ollama:{model}", sesion)
+        self.model = model
+        self._url = f"{host.rstrip('/')}/api/generate"
+
+    def _cuerpo(self, prompt: str, generation: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+        cuerpo = {"model": self.model, "prompt": prompt, "stream": stream, "options": {}}
+        if "temperature" in generation:
+            cuerpo["options"]["temperature"] = generation["temperature"]
+        if "max_output_tokens" in generation:
+            cuerpo["options"]["num_predict"] = generation["max_output_tokens"]
+        if generation.get("response_mime_type") == "application/json":
+            # Ollama acepta el mismo JSON schema en `format`
+            cuerpo["format"] = generation.get("response_schema") or "json"
+        return cuerpo
+
+    def generate(self, prompt: str, generation: Dict[str, Any], timeout: float = LLM_TIMEOUT) -> str:
+        respuesta = _post(self.sesion, self._url, self._cuerpo(prompt, generation, stream=False), timeout)
+        try:
+            texto = (respuesta.json().get("response") or "").strip()
+        except ValueError as e:
+            raise LLMError("bad_response", str(e)) from e
+        if not texto:
+            raise LLMError("empty", "Respuesta vacía del modelo local")
+        return texto
+
+    def stream(self, prompt: str, generation: Dict[str, Any], timeout: float = LLM_TIMEOUT) -> Iterator[str]:
+        respuesta = _post(self.sesion, self._url, self._cuerpo(prompt, generation, stream=True), timeout, stream=True)
+        with respuesta:
+            for linea in respuesta.iter_lines(decode_unicode=True):
+                if not linea:
+                    continue
+                data = json.loads(linea)
+                if data.get("error"):
+                    raise LLMError("server_error", str(data["error"])[:200])
+                if data.get("response"):
+                    yield data["response"]
+
+
+# ✅ ROUTER: failover en orden entre backends, con cobertura de las llamadas lentas
+class LLMRouter:
+    def __init__(self, backends: List[LLMBackend], policy: RetryPolicy = retry_policy,
+                 sleep: Callable[[float], None] = time.sleep, hedge: bool = LLM_HEDGE):
+        self.backends = backends
+        self.policy = policy
+        self.hedge = hedge
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # Las llamadas corren acá para poder esperar la primera de dos sin bloquear a ninguna
+        self._ejecutor = ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix="llm")
+        # Cada carrera cubierta retiene su cupo hasta que terminan todos sus hilos (también el abandonado)
+        self._cupo_coberturas = threading.BoundedSemaphore(max(1, LLM_HEDGE_MAX_INFLIGHT))
+        # Latencia de una respuesta completa y hasta el primer fragmento de un stream
+        self.latencia = {"generate": MedidorLatencia(), "stream": MedidorLatencia()}
+        self.failovers = 0
+        self.unavailable = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+        self.abandoned = 0
+        self.deadline_exceeded = 0
+
+    def _contar(self, campo: str):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def _fallo(self, backend: LLMBackend, inicio: float, error: Exception) -> LLMError:
+        if not isinstance(error, LLMError):
+            error = LLMError("bad_response", f"{type(error).__name__}: {error}")
+        backend.stats.registrar(inicio, error)
+        if error.reason in self.policy.ENFRIAN:
+            backend.enfriar()
+        logger.warning("Error con backend LLM", extra={
+            "backend": backend.name, "reason": error.reason, "status": error.status, "error": str(error)[:200],
+        })
+        return error
+
+    def _sin_backends(self):
+        self._contar("unavailable")
+        if self.backends:
+            logger.error("Todos los backends LLM fallaron", extra={"backends": len(self.backends)})
+        else:
+            logger.warning("No hay backends LLM configurados, usando modo básico")
+        raise LLMUnavailable("Ningún backend LLM disponible")
+
+    def _puede_cubrir(self, backend: LLMBackend) -> bool:
+        """Cubrir sólo con otra clave de Gemini y si queda cupo; toma el cupo si devuelve True."""
+        if not isinstance(backend, GeminiBackend):
+            return False
+        if not self._cupo_coberturas.acquire(blocking=False):
+            self._contar("hedges_skipped")
+            return False
+        return True
+
+    def _liberar_cupo(self, futuros: List[Future]):
+        """Devuelve el cupo de cobertura cuando termina el último hilo de la carrera."""
+        restantes = [len(futuros)]
+
+        def terminado(_):
+            with self._lock:
+                restantes[0] -= 1
+                ultimo = restantes[0] == 0
+            if ultimo:
+                self._cupo_coberturas.release()
+
+        for futuro in futuros:
+            futuro.add_done_callback(terminado)
+
+    def _intentar(self, backend: LLMBackend, llamar: Callable[[LLMBackend, float], Any], deadline: Deadline,
+                  medidor: MedidorLatencia, abandonado: threading.Event) -> Any:
+        """Una llamada a `backend` con los reintentos que permita la política y el deadline."""
+        intento = 0
+        while True:
+            inicio = time.perf_counter()
+            try:
+                resultado = llamar(backend, deadline.acotar(LLM_TIMEOUT))
+            except Exception as e:
+                error = self._fallo(backend, inicio, e)
+                espera = self.policy.espera(intento)
+                if abandonado.is_set() or not self.policy.reintentar(error, intento) or espera >= deadline.restante():
+                    raise error
+                self._sleep(espera)
+                intento += 1
+                continue
+            backend.stats.registrar(inicio)
+            # También la del perdedor de una cobertura: es justo la cola que el percentil tiene que ver
+            medidor.registrar(time.perf_counter() - inicio)
+            return resultado
+
+    def _carrera(self, llamar: Callable[[LLMBackend, float], Any], deadline: Optional[Deadline],
+                 medidor: MedidorLatencia, descartar: Optional[Callable[[Any], None]] = None) -> Tuple[LLMBackend, Any]:
+        """
+        Corre `llamar(backend, timeout)` por los backends sanos en orden hasta que uno responda. Si el
+        que está en curso pasa el umbral de `medidor`, lanza el siguiente en paralelo y gana el primero.
+        """
+        deadline = deadline or SIN_DEADLINE
+        pendientes = [b for b in self.backends if b.sano()] or list(self.backends)
+        if not pendientes:
+            self._sin_backends()
+        en_curso: Dict[Future, Tuple[LLMBackend, threading.Event]] = {}
+        cobertura: Optional[LLMBackend] = None
+        cobertura_decidida = False
+        # Hilos de la carrera mientras tiene cupo de cobertura, para devolverlo al terminar todos
+        cubiertos: List[Future] = []
+
+        def lanzar() -> float:
+            backend = pendientes.pop(0)
+            abandonado = threading.Event()
+            futuro = self._ejecutor.submit(self._intentar, backend, llamar, deadline, medidor, abandonado)
+            en_curso[futuro] = (backend, abandonado)
+            if cubiertos:
+                cubiertos.append(futuro)
+            return time.monotonic()
+
+        lanzado = lanzar()
+        try:
+            while en_curso:
+                espera = deadline.timeout()
+                cubrir_en = None
+                if self.hedge and not cobertura_decidida and pendientes and len(en_curso) == 1:
+                    cubrir_en = max(0.0, lanzado + medidor.umbral() - time.monotonic())
+                    espera = cubrir_en if espera is None else min(espera, cubrir_en)
+                listos, _ = wait(en_curso, timeout=espera, return_when=FIRST_COMPLETED)
+
+                if not listos:
+                    if deadline.vencido():
+                        self._contar("deadline_exceeded")
+                        raise DeadlineExceeded("llm")
+                    if cubrir_en is not None:
+                        # Se decide una sola vez por carrera: sin cupo o sin otra clave, se espera a la que está en curso
+                        cobertura_decidida = True
+                        if not self._puede_cubrir(pendientes[0]):
+                            continue
+                        cobertura = pendientes[0]
+                        cubiertos.extend(en_curso)
+                        self._contar("hedges")
+                        logger.info("Llamada lenta, cubriendo con otro backend", extra={
+                            "backend": cobertura.name, "after_ms": round(medidor.umbral() * 1000, 1),
+                        })
+                        lanzar()
+                    continue
+
+                ganador = None
+                for futuro in listos:
+                    backend, _ = en_curso.pop(futuro)
+                    if futuro.exception() is not None:
+                        continue
+                    if ganador is None:
+                        ganador = (backend, futuro.result())
+                    elif descartar is not None:
+                        descartar(futuro.result())
+                if ganador is not None:
+                    if ganador[0] is cobertura:
+                        self._contar("hedge_wins")
+                    if ganador[0] is not self.backends[0]:
+                        self._contar("failovers")
+                        logger.info("Respuesta de backend alternativo", extra={"backend": ganador[0].name})
+                    return ganador
+                if not en_curso and pendientes:
+                    lanzado = lanzar()
+            self._sin_backends()
+        finally:
+            # Los que siguen en curso perdieron: no reintentan y lo que devuelvan se descarta
+            for futuro, (backend, abandonado) in en_curso.items():
+                abandonado.set()
+                self._contar("abandoned")
+                if not futuro.cancel() and descartar is not None:
+                    futuro.add_done_callback(
+                        lambda f: descartar(f.result()) if not f.cancelled() and f.exception() is None else None
+                    )
+            if cubiertos:
+                self._liberar_cupo(cubiertos)
+
+    def generate(self, prompt: str, generation: Dict[str, Any], deadline: Optional[Deadline] = None) -> str:
+        _, texto = self._carrera(lambda backend, timeout: backend.generate(prompt, generation, timeout),
+                                 deadline, self.latencia["generate"])
+        return texto
+
+    def stream(self, prompt: str, generation: Dict[str, Any], deadline: Optional[Deadline] = None) -> Iterator[str]:
+        """
+        Como `generate` pero en fragmentos. La carrera (y la cobertura) es hasta el primer fragmento;
+        después ya no se puede cambiar de backend sin repetir texto.
+        """
+        def abrir(backend: LLMBackend, timeout: float) -> Tuple[str, Iterator[str]]:
+            fragmentos = backend.stream(prompt, generation, timeout)
+            for primero in fragmentos:
+                return primero, fragmentos
+            raise LLMError("empty", "Respuesta vacía")
+
+        backend, (primero, fragmentos) = self._carrera(
+            abrir, deadline, self.latencia["stream"], descartar=lambda abierto: abierto[1].close(),
+        )
+        yield primero
+        try:
+            yield from fragmentos
+        except Exception as e:
+            logger.warning("Stream de LLM cortado", extra={"backend": backend.name, "error": str(e)[:200]})
+            raise StreamCortado(str(e)) from e
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backends": {b.name: {**b.stats.to_dict(), "healthy": b.sano()} for b in self.backends},
+            "latency": {operacion: medidor.stats() for operacion, medidor in self.latencia.items()},
+            "failovers": self.failovers,
+            "unavailable": self.unavailable,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedges_skipped": self.hedges_skipped,
+            "abandoned": self.abandoned,
+            "deadline_exceeded": self.deadline_exceeded,
+        }
+
+
+def backends_configurados() -> List[LLMBackend]:
+    backends: List[LLMBackend] = [GeminiBackend(key, i + 1) for i, key in enumerate(API_KEYS)]
+    if OLLAMA_MODEL:
+        backends.append(OllamaBackend())
+    return backends
+
+
+llm_router = LLMRouter(backends_configurados())
+
+logger.info("Proveedores LLM inicializados", extra={
+    "model": MODEL, "keys": len(API_KEYS), "endpoint": API_ENDPOINT or "default", "local_model": OLLAMA_MODEL or None,
+})
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Retención de los logs de conversación.
+
+La tabla `logs` de LOG_PATH sólo guarda la ventana caliente (LOG_RETENTION_DAYS).
+Un job en segundo plano toma los días más viejos, uno por uno, y:
+
+    1. escribe las filas crudas del día en LOG_ARCHIVE_DIR como NDJSON
+       comprimido, particionado por día: logs-AAAA-MM-DD.<desde_id>-<hasta_id>.ndjson.gz
+    2. suma el día a `logs_diarios` (mensajes, búsquedas, tiempos por canal)
+    3. borra esas filas de `logs`
+
+Antes de archivar, el worker reclama el día en `logs_compactando` (BEGIN
+IMMEDIATE): si otro lo tiene reclamado, lo saltea. Cada worker escribe su
+propio temporal (tempfile.mkstemp) y lo renombra al archivo final. Los pasos
+2 y 3 se confirman en una misma transacción junto con el registro del archivo
+en `logs_archivos`, sólo si el reclamo sigue siendo suyo, y al final se libera. Así un corte a mitad de camino o dos workers compactando a la
+vez no duplican agregados ni borran filas de un archivo ajeno. Un reclamo de
+un worker que murió vence a los LOG_CLAIM_TTL segundos.
+
+Variables de entorno:
+    LOG_RETENTION_DAYS       Días de logs crudos en la BD (default 30).
+    LOG_ARCHIVE_DIR          Carpeta de los NDJSON comprimidos (default instance/log_archive).
+    LOG_RETENTION_INTERVAL   Segundos entre compactaciones (default 3600, 0 = desactivado).
+    LOG_VACUUM_MIN_ROWS      Filas borradas a partir de las cuales se hace VACUUM (default 1000).
+    LOG_CLAIM_TTL            Segundos hasta considerar abandonado el reclamo de un día (default 600).
+
+Uso manual:
+    python -m logic.log_retention
+"""
+import os
+import json
+import gzip
+import time
+import uuid
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from logic.database import LOG_PATH, asegurar_tabla_logs
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+LOG_RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", "30"))
+LOG_ARCHIVE_DIR = os.environ.get("LOG_ARCHIVE_DIR", os.path.join(os.getcwd(), "instance", "log_archive"))
+LOG_RETENTION_INTERVAL = float(os.environ.get("LOG_RETENTION_INTERVAL", "3600"))
+LOG_VACUUM_MIN_ROWS = int(os.environ.get("LOG_VACUUM_MIN_ROWS", "1000"))
+LOG_CLAIM_TTL = float(os.environ.get("LOG_CLAIM_TTL", "600"))
+
+ROLLUP_TABLES_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS logs_diarios (
+        dia TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        mensajes INTEGER NOT NULL DEFAULT 0,
+        busquedas INTEGER NOT NULL DEFAULT 0,
+        sin_resultados INTEGER NOT NULL DEFAULT 0,
+        resultados_total INTEGER NOT NULL DEFAULT 0,
+        tiempo_total REAL NOT NULL DEFAULT 0,
+        tiempo_max REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (dia, channel)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS logs_archivos (
+        archivo TEXT PRIMARY KEY,
+        dia TEXT NOT NULL,
+        filas INTEGER NOT NULL,
+        desde_id INTEGER NOT NULL,
+        hasta_id INTEGER NOT NULL,
+        creado TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS logs_compactando (
+        dia TEXT PRIMARY KEY,
+        token TEXT NOT NULL,
+        desde REAL NOT NULL
+    )
+    ''',
+]
+
+COLUMNAS_LOG = ["id", "timestamp", "channel", "user_message", "bot_response",
+                "response_time", "search_performed", "results_count"]
+
+
+class RetentionStats:
+    def __init__(self):
+        self.runs = 0
+        self.archived_rows = 0
+        self.archived_files = 0
+        self.last_run: Optional[str] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "retention_days": LOG_RETENTION_DAYS,
+            "runs": self.runs,
+            "archived_rows": self.archived_rows,
+            "archived_files": self.archived_files,
+            "last_run": self.last_run,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error,
+        }
+
+
+retention_stats = RetentionStats()
+
+
+def _conectar() -> sqlite3.Connection:
+    conn = sqlite3.connect(LOG_PATH, timeout=10, isolation_level=None)
+    cursor = conn.cursor()
+    asegurar_tabla_logs(cursor)
+    for sql in ROLLUP_TABLES_SQL:
+        cursor.execute(sql)
+    return conn
+
+
+def _escribir_archivo(nombre: str, filas: List[tuple]):
+    """Escribe el NDJSON comprimido en un temporal y lo renombra: nunca queda un archivo a medias."""
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    destino = os.path.join(LOG_ARCHIVE_DIR, nombre)
+    # Temporal propio de este proceso: dos workers nunca escriben en el mismo archivo
+    fd, temporal = tempfile.mkstemp(dir=LOG_ARCHIVE_DIR, prefix=nombre + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                for fila in filas:
+                    linea = json.dumps(dict(zip(COLUMNAS_LOG, fila)), ensure_ascii=False)
+                    gz.write(linea.encode("utf-8") + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _rollup(filas: List[tuple]) -> Dict[str, Dict[str, float]]:
+    """Agregados por canal de las filas de un día."""
+    por_canal: Dict[str, Dict[str, float]] = {}
+    for _, _, channel, _, _, response_time, search_performed, results_count in filas:
+        agg = por_canal.setdefault(channel, {"mensajes": 0, "busquedas": 0, "sin_resultados": 0,
+                                             "resultados_total": 0, "tiempo_total": 0.0, "tiempo_max": 0.0})
+        agg["mensajes"] += 1
+        if search_performed:
+            agg["busquedas"] += 1
+            if not results_count:
+                agg["sin_resultados"] += 1
+        agg["resultados_total"] += results_count or 0
+        agg["tiempo_total"] += response_time or 0.0
+        agg["tiempo_max"] = max(agg["tiempo_max"], response_time or 0.0)
+    return por_canal
+
+
+def _reclamar_dia(cursor: sqlite3.Cursor, dia: str) -> Optional[str]:
+    """Reclama `dia` para este worker; devuelve el token, o None si otro lo tiene reclamado."""
+    token = uuid.uuid4().hex
+    ahora = time.time()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        fila = cursor.execute("SELECT desde FROM logs_compactando WHERE dia = ?", (dia,)).fetchone()
+        if fila and fila[0] > ahora - LOG_CLAIM_TTL:
+            cursor.execute("ROLLBACK")
+            return None
+        cursor.execute("INSERT OR REPLACE INTO logs_compactando (dia, token, desde) VALUES (?, ?, ?)", (dia, token, ahora))
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return token
+
+
+def _liberar_dia(cursor: sqlite3.Cursor, dia: str, token: str):
+    cursor.execute("DELETE FROM logs_compactando WHERE dia = ? AND token = ?", (dia, token))
+
+
+def _compactar_dia(conn: sqlite3.Connection, dia: str, hasta_id: int) -> int:
+    """Archiva, agrega y borra las filas de `dia` con id <= hasta_id. Devuelve filas archivadas."""
+    cursor = conn.cursor()
+    token = _reclamar_dia(cursor, dia)
+    if token is None:
+        # Otro worker lo está compactando
+        return 0
+    try:
+        return _archivar_dia(cursor, dia, hasta_id, token)
+    finally:
+        try:
+            _liberar_dia(cursor, dia, token)
+        except sqlite3.Error:
+            # Si no se pudo liberar, el reclamo vence solo a los LOG_CLAIM_TTL segundos
+            logger.warning("No se pudo liberar el reclamo de compactación", extra={"dia": dia})
+
+
+def _archivar_dia(cursor: sqlite3.Cursor, dia: str, hasta_id: int, token: str) -> int:
+    filas = cursor.execute(
+        f"SELECT {', '.join(COLUMNAS_LOG)} FROM logs WHERE timestamp >= ? AND timestamp < ? AND id <= ? ORDER BY id",
+        (dia, _dia_siguiente(dia), hasta_id),
+    ).fetchall()
+    if not filas:
+        return 0
+
+    nombre = f"logs-{dia}.{filas[0][0]}-{filas[-1][0]}.ndjson.gz"
+    _escribir_archivo(nombre, filas)
+
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        reclamo = cursor.execute("SELECT token FROM logs_compactando WHERE dia = ?", (dia,)).fetchone()
+        if reclamo is None or reclamo[0] != token or \
+                cursor.execute("SELECT 1 FROM logs_archivos WHERE archivo = ?", (nombre,)).fetchone():
+            # El reclamo venció y lo tomó otro worker, o ya se compactó: no tocar sus filas
+            cursor.execute("ROLLBACK")
+            return 0
+        for channel, agg in _rollup(filas).items():
+            cursor.execute('''
+                INSERT INTO logs_diarios (dia, channel, mensajes, busquedas, sin_resultados,
+                                          resultados_total, tiempo_total, tiempo_max)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dia, channel) DO UPDATE SET
+                    mensajes = mensajes + excluded.mensajes,
+                    busquedas = busquedas + excluded.busquedas,
+                    sin_resultados = sin_resultados + excluded.sin_resultados,
+                    resultados_total = resultados_total + excluded.resultados_total,
+                    tiempo_total = tiempo_total + excluded.tiempo_total,
+                    tiempo_max = MAX(tiempo_max, excluded.tiempo_max)
+            ''', (dia, channel, agg["mensajes"], agg["busquedas"], agg["sin_resultados"],
+                  agg["resultados_total"], agg["tiempo_total"], agg["tiempo_max"]))
+        cursor.execute(
+            "INSERT INTO logs_archivos (archivo, dia, filas, desde_id, hasta_id, creado) VALUES (?, ?, ?, ?, ?, datetime('now'))",
+            (nombre, dia, len(filas), filas[0][0], filas[-1][0]),
+        )
+        cursor.execute(
+            "DELETE FROM logs WHERE timestamp >= ? AND timestamp < ? AND id BETWEEN ? AND ?",
+            (dia, _dia_siguiente(dia), filas[0][0], filas[-1][0]),
+        )
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return len(filas)
+
+
+def _dia_siguiente(dia: str) -> str:
+    return (datetime.strptime(dia, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def compactar_logs(ahora: Optional[datetime] = None, retention_days: int = LOG_RETENTION_DAYS) -> Dict[str, int]:
+    """Compacta todos los días fuera de la ventana de retención. Seguro de correr en paralelo (reclamo por día)."""
+    ahora = ahora or datetime.now(timezone.utc)
+    corte = (ahora - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+    inicio = time.perf_counter()
+    archivadas = 0
+    archivos = 0
+    retention_stats.runs += 1
+    try:
+        conn = _conectar()
+        try:
+            cursor = conn.cursor()
+            # Fijar el tope de id al arrancar: lo que llegue durante la compactación queda para la próxima
+            hasta_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM logs").fetchone()[0]
+            dias = [fila[0] for fila in cursor.execute(
+                "SELECT DISTINCT substr(timestamp, 1, 10) FROM logs WHERE timestamp < ? ORDER BY 1", (corte,)
+            ).fetchall()]
+            for dia in dias:
+                filas = _compactar_dia(conn, dia, hasta_id)
+                if filas:
+                    archivadas += filas
+                    archivos += 1
+            if archivadas >= LOG_VACUUM_MIN_ROWS:
+                cursor.execute("VACUUM")
+        finally:
+            conn.close()
+        retention_stats.last_error = None
+    except (sqlite3.Error, OSError) as e:
+        retention_stats.last_error = str(e)
+        logger.exception("Error compactando logs")
+
+    retention_stats.archived_rows += archivadas
+    retention_stats.archived_files += archivos
+    retention_stats.last_run = ahora.isoformat()
+    retention_stats.last_duration_ms = round((time.perf_counter() - inicio) * 1000, 1)
+    if archivadas:
+        logger.info("Logs compactados", extra={"rows": archivadas, "files": archivos, "cutoff": corte,
+                                              "duration_ms": retention_stats.last_duration_ms})
+    return {"rows": archivadas, "files": archivos}
+
+
+if __name__ == "__main__":
+    print(compactar_logs())
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Logging estructurado y no bloqueante para el backend.
+
+Los módulos piden su logger con get_logger(__name__). Los registros se
+encolan en memoria (QueueHandler) y un hilo aparte (QueueListener) los
+escribe en stdout, así el request nunca espera al pipe de logs de Render.
+
+Variables de entorno:
+    LOG_LEVEL               Nivel mínimo (DEBUG, INFO, WARNING...). Default INFO.
+    LOG_FORMAT              "json" (default) o "text" para desarrollo local.
+    LOG_DEBUG_SAMPLE_RATE   Fracción de eventos DEBUG que se emiten (0.0 - 1.0).
+    LOG_QUEUE_SIZE          Tamaño máximo de la cola; si se llena se descartan registros.
+"""
+import os
+import sys
+import copy
+import json
+import queue
+import random
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+ROOT_LOGGER_NAME = "dante"
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+# Atributos estándar de LogRecord: todo lo demás viene de `extra` y se serializa como campo
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Serializa cada registro como una línea JSON con los campos de `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            payload["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legible para desarrollo: `nivel logger evento clave=valor ...`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        campos = " ".join(
+            f"{key}={value}" for key, value in record.__dict__.items()
+            if key not in _RESERVED_ATTRS and not key.startswith("_")
+        )
+        linea = f"{record.levelname:<7} {record.name} {record.getMessage()}"
+        if campos:
+            linea = f"{linea} {campos}"
+        if record.exc_info:
+            linea = f"{linea}\n{self.formatException(record.exc_info)}"
+        if record.stack_info:
+            linea = f"{linea}\n{self.formatStack(record.stack_info)}"
+        return linea
+
+
+class DebugSampler(logging.Filter):
+    """Deja pasar sólo una fracción de los registros DEBUG; el resto siempre pasa."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que descarta (y cuenta) registros si la cola está llena en vez de bloquear."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Resuelve el mensaje pero conserva exc_info y stack_info: QueueHandler.prepare los mete en
+        `msg` y los borra, y el traceback terminaría dentro de "event" en vez de su propio campo.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging() -> QueueListener:
+    """Configura el logger raíz del proyecto una sola vez (idempotente)."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        queue_handler = DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(queue_handler)
+        root.propagate = False
+
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el hilo escritor."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            root = logging.getLogger(ROOT_LOGGER_NAME)
+            for handler in list(root.handlers):
+                if isinstance(handler, DroppingQueueHandler):
+                    root.removeHandler(handler)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Devuelve un logger hijo de `dante`, inicializando el logging si hace falta."""
+    setup_logging()
+    if name == "__main__" or not name:
+        name = "main"
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+atexit.register(shutdown_logging)
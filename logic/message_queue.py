@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Cola durable en SQLite y pool de workers para los mensajes del webhook de WhatsApp.
+
+El webhook sólo encola y responde 200 al instante; los workers procesan en
+segundo plano. Garantías:
+
+    - Sin duplicados: el id de mensaje del proveedor es UNIQUE, los reintentos
+      del webhook no vuelven a encolar.
+    - Orden por conversación: sólo se toma el mensaje más viejo de cada
+      conversación, y únicamente cuando no hay otro de ella en proceso.
+      Conversaciones distintas se procesan en paralelo.
+    - Durabilidad: un mensaje tomado tiene un lease; si el proceso muere, al
+      vencer vuelve a pendiente. La respuesta generada se guarda antes de
+      enviarla, así un reintento no vuelve a llamar a Gemini, y el envío lleva
+      el id del mensaje como clave de idempotencia.
+    - Reintentos con backoff exponencial; tras WHATSAPP_MAX_ATTEMPTS el
+      mensaje queda "fallido" y la conversación sigue con el siguiente. Un
+      error permanente (PermanentError, p. ej. un 4xx del proveedor) lo deja
+      fallido en el primer intento.
+    - Si falla la escritura del estado en SQLite (p. ej. "database is
+      locked"), el worker lo registra y sigue: el lease vence y el mensaje
+      vuelve a entregarse.
+
+Variables de entorno:
+    WHATSAPP_QUEUE_PATH     Archivo SQLite de la cola (default instance/whatsapp_queue.db).
+    WHATSAPP_WORKERS        Workers concurrentes (default 4).
+    WHATSAPP_MAX_ATTEMPTS   Intentos por mensaje (default 5).
+    WHATSAPP_LEASE_SECONDS  Segundos de lease de un mensaje en proceso (default 120).
+"""
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+WHATSAPP_QUEUE_PATH = os.environ.get("WHATSAPP_QUEUE_PATH", os.path.join(os.getcwd(), "instance", "whatsapp_queue.db"))
+WHATSAPP_WORKERS = int(os.environ.get("WHATSAPP_WORKERS", "4"))
+WHATSAPP_MAX_ATTEMPTS = int(os.environ.get("WHATSAPP_MAX_ATTEMPTS", "5"))
+WHATSAPP_LEASE_SECONDS = float(os.environ.get("WHATSAPP_LEASE_SECONDS", "120"))
+
+PENDIENTE = "pendiente"
+PROCESANDO = "procesando"
+ENVIADO = "enviado"
+FALLIDO = "fallido"
+
+
+class RetryLater(Exception):
+    """El procesamiento falló de forma transitoria; reintentar en `retry_after` segundos."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PermanentError(Exception):
+    """El procesamiento falló de forma definitiva: reintentar no lo arregla, el mensaje queda fallido."""
+
+
+class MessageQueue:
+    def __init__(self, path: str = WHATSAPP_QUEUE_PATH, max_attempts: int = WHATSAPP_MAX_ATTEMPTS,
+                 lease_seconds: float = WHATSAPP_LEASE_SECONDS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS mensajes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id TEXT NOT NULL UNIQUE,
+                    conversation TEXT NOT NULL,
+                    texto TEXT NOT NULL,
+                    estado TEXT NOT NULL DEFAULT 'pendiente',
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    disponible_en REAL NOT NULL,
+                    lease_hasta REAL,
+                    respuesta TEXT,
+                    error TEXT,
+                    creado REAL NOT NULL,
+                    actualizado REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_mensajes_conv ON mensajes(conversation, estado, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_mensajes_estado ON mensajes(estado, disponible_en)")
+            self._initialized = True
+        return conn
+
+    def enqueue(self, message_id: str, conversation: str, texto: str) -> bool:
+        """Encola un mensaje. Devuelve False si ese message_id ya estaba (reintento del proveedor)."""
+        ahora = time.time()
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO mensajes (message_id, conversation, texto, disponible_en, creado, actualizado) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (message_id, conversation, texto, ahora, ahora, ahora),
+        )
+        return cursor.rowcount == 1
+
+    def claim(self, limit: int = 1) -> List[Dict[str, Any]]:
+        """Toma hasta `limit` mensajes, como mucho uno por conversación y respetando el orden."""
+        conn = self._connect()
+        ahora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Devolver a la cola lo que quedó tomado por un worker que murió
+            conn.execute(
+                "UPDATE mensajes SET estado = ?, lease_hasta = NULL WHERE estado = ? AND lease_hasta < ?",
+                (PENDIENTE, PROCESANDO, ahora),
+            )
+            filas = conn.execute('''
+                SELECT id, message_id, conversation, texto, intentos, respuesta FROM mensajes AS m
+                WHERE estado = ? AND disponible_en <= ?
+                  AND id = (SELECT MIN(id) FROM mensajes
+                            WHERE conversation = m.conversation AND estado IN (?, ?))
+                ORDER BY id LIMIT ?
+            ''', (PENDIENTE, ahora, PENDIENTE, PROCESANDO, limit)).fetchall()
+            conn.executemany(
+                "UPDATE mensajes SET estado = ?, lease_hasta = ?, intentos = intentos + 1, actualizado = ? WHERE id = ?",
+                [(PROCESANDO, ahora + self.lease_seconds, ahora, fila[0]) for fila in filas],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [
+            {"id": f[0], "message_id": f[1], "conversation": f[2], "texto": f[3], "intentos": f[4] + 1, "respuesta": f[5]}
+            for f in filas
+        ]
+
+    def save_reply(self, id_: int, respuesta: str):
+        """Guarda la respuesta generada antes de enviarla (un reintento no vuelve a generarla)."""
+        self._connect().execute(
+            "UPDATE mensajes SET respuesta = ?, actualizado = ? WHERE id = ?", (respuesta, time.time(), id_)
+        )
+
+    def complete(self, id_: int):
+        self._connect().execute(
+            "UPDATE mensajes SET estado = ?, lease_hasta = NULL, error = NULL, actualizado = ? WHERE id = ?",
+            (ENVIADO, time.time(), id_),
+        )
+
+    def fail(self, id_: int, intentos: int, error: str, retry_after: Optional[float] = None,
+             permanente: bool = False) -> str:
+        """Reprograma con backoff o marca como fallido (ya, si `permanente`). Devuelve el nuevo estado."""
+        ahora = time.time()
+        if permanente or intentos >= self.max_attempts:
+            estado, disponible = FALLIDO, ahora
+        else:
+            estado = PENDIENTE
+            disponible = ahora + (retry_after if retry_after is not None else min(60.0, 2.0 ** intentos))
+        self._connect().execute(
+            "UPDATE mensajes SET estado = ?, lease_hasta = NULL, disponible_en = ?, error = ?, actualizado = ? WHERE id = ?",
+            (estado, disponible, error[:500], ahora, id_),
+        )
+        return estado
+
+    def stats(self) -> Dict[str, int]:
+        filas = self._connect().execute("SELECT estado, COUNT(*) FROM mensajes GROUP BY estado").fetchall()
+        return {estado: n for estado, n in filas}
+
+
+Handler = Callable[[str, str], Awaitable[str]]
+
+
+class WorkerPool:
+    """Workers asyncio que procesan la cola: `handler(conversación, texto)` -> respuesta -> `sender`."""
+
+    def __init__(self, queue: MessageQueue, handler: Handler, sender, concurrency: int = WHATSAPP_WORKERS,
+                 poll_interval: float = 1.0):
+        self.queue = queue
+        self.handler = handler
+        self.sender = sender
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Despierta a los workers (se llama al encolar)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, n: int):
+        while True:
+            try:
+                mensajes = await asyncio.to_thread(self.queue.claim, 1)
+            except sqlite3.Error as e:
+                logger.warning("Error tomando mensajes de la cola", extra={"worker": n, "error": str(e)})
+                mensajes = []
+            if not mensajes:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(mensajes[0])
+
+    async def _process(self, mensaje: Dict[str, Any]):
+        inicio = time.monotonic()
+        try:
+            respuesta = mensaje["respuesta"]
+            if respuesta is None:
+                respuesta = await self.handler(mensaje["conversation"], mensaje["texto"])
+                await asyncio.to_thread(self.queue.save_reply, mensaje["id"], respuesta)
+            await self.sender.send(mensaje["conversation"], respuesta, idempotency_key=mensaje["message_id"])
+        except asyncio.CancelledError:
+            # Apagado: el lease vence y otro worker lo retoma
+            raise
+        except Exception as e:
+            await self._fallo(mensaje, e)
+            return
+
+        try:
+            await asyncio.to_thread(self.queue.complete, mensaje["id"])
+        except sqlite3.Error as e:
+            # Ya se envió: al volver a entregarse, la clave de idempotencia evita el duplicado
+            logger.warning("Error marcando mensaje como enviado", extra={"message_id": mensaje["message_id"], "error": str(e)})
+            return
+        self.processed += 1
+        logger.info("Mensaje de WhatsApp respondido", extra={
+            "message_id": mensaje["message_id"],
+            "attempt": mensaje["intentos"],
+            "duration_ms": round((time.monotonic() - inicio) * 1000, 1),
+        })
+
+    async def _fallo(self, mensaje: Dict[str, Any], e: Exception):
+        retry_after = e.retry_after if isinstance(e, RetryLater) else None
+        try:
+            estado = await asyncio.to_thread(
+                self.queue.fail, mensaje["id"], mensaje["intentos"], f"{type(e).__name__}: {e}", retry_after,
+                isinstance(e, PermanentError),
+            )
+        except sqlite3.Error as error_bd:
+            # Igual que en claim: el worker sigue y el lease vencido lo vuelve a entregar
+            logger.warning("Error registrando el fallo de un mensaje", extra={
+                "message_id": mensaje["message_id"], "error": str(e), "db_error": str(error_bd),
+            })
+            return
+        if estado == FALLIDO:
+            self.failed += 1
+            logger.error("Mensaje de WhatsApp descartado", extra={"message_id": mensaje["message_id"], "error": str(e)})
+        else:
+            self.retried += 1
+            logger.warning("Mensaje de WhatsApp reprogramado", extra={
+                "message_id": mensaje["message_id"], "attempt": mensaje["intentos"], "error": str(e),
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "queue": self.queue.stats(),
+        }
+
+
+def new_message_id() -> str:
+    """Id para mensajes que llegan sin id del proveedor."""
+    return uuid.uuid4().hex
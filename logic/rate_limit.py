@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Rate limiting por cliente con token buckets, como middleware ASGI.
+
+Cada combinación ruta + IP tiene su bucket. La IP es la del par TCP, o con
+RATE_LIMIT_TRUSTED_HOPS > 0 la que agregó a X-Forwarded-For el último proxy de
+confianza (Render pone uno adelante). Nada que el cliente controle (el primer
+salto de X-Forwarded-For, X-Session-Id, X-Channel) elige el bucket: cambiarlo
+no da un bucket nuevo. Los buckets viven en un LRU acotado y se descartan
+cuando quedan inactivos.
+
+Variables de entorno:
+    RATE_LIMITS              Reglas "ruta=pedidos/segundos" separadas por coma.
+                             Default "/chat=20/60,/properties=120/60,/chat/batch=500/3600". En
+                             /chat/batch cada consulta del lote cuesta una ficha (ver RateLimiter.charge).
+    RATE_LIMIT_MAX_BUCKETS   Buckets en memoria como máximo (default 10000).
+    RATE_LIMIT_IDLE_TTL      Segundos sin uso tras los que se descarta un bucket (default 600).
+    RATE_LIMIT_TRUSTED_HOPS  Proxies de confianza delante de la app que agregan X-Forwarded-For
+                             (default 0: se usa la IP del par TCP).
+"""
+import os
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+DEFAULT_RATE_LIMITS = "/chat=20/60,/properties=120/60,/chat/batch=500/3600"
+RATE_LIMIT_MAX_BUCKETS = int(os.environ.get("RATE_LIMIT_MAX_BUCKETS", "10000"))
+RATE_LIMIT_IDLE_TTL = float(os.environ.get("RATE_LIMIT_IDLE_TTL", "600"))
+RATE_LIMIT_TRUSTED_HOPS = int(os.environ.get("RATE_LIMIT_TRUSTED_HOPS", "0"))
+
+
+class RateRule:
+    __slots__ = ("capacity", "refill_per_second")
+
+    def __init__(self, capacity: int, period_seconds: float):
+        self.capacity = capacity
+        self.refill_per_second = capacity / period_seconds
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+
+def parse_rules(spec: str) -> Dict[str, RateRule]:
+    """Parsea "ruta=pedidos/segundos,..." a un dict ruta -> RateRule."""
+    rules = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        path, _, rate = item.partition("=")
+        cantidad, _, segundos = rate.partition("/")
+        rules[path.strip()] = RateRule(int(cantidad), float(segundos or 1))
+    return rules
+
+
+class RateLimiter:
+    def __init__(self, rules: Dict[str, RateRule], max_buckets: int = RATE_LIMIT_MAX_BUCKETS,
+                 idle_ttl: float = RATE_LIMIT_IDLE_TTL):
+        self.rules = rules
+        self.max_buckets = max_buckets
+        self.idle_ttl = idle_ttl
+        self._buckets: "OrderedDict[Tuple, TokenBucket]" = OrderedDict()
+        self.limited = 0
+        self.evicted = 0
+
+    def rule_for(self, path: str) -> Optional[RateRule]:
+        return self.rules.get(path)
+
+    def _evict(self, now: float):
+        # El LRU está ordenado por último uso: los inactivos están al principio
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_buckets and now - bucket.updated < self.idle_ttl:
+                break
+            del self._buckets[key]
+            self.evicted += 1
+
+    def hit(self, key: Tuple, rule: RateRule, cost: int = 1) -> Tuple[bool, int, int]:
+        """Consume `cost` tokens. Devuelve (permitido, tokens restantes, segundos hasta reset)."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rule.capacity, now)
+            self._buckets[key] = bucket
+        else:
+            bucket.tokens = min(rule.capacity, bucket.tokens + (now - bucket.updated) * rule.refill_per_second)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+
+        allowed = bucket.tokens >= cost
+        if allowed:
+            bucket.tokens -= cost
+        else:
+            self.limited += 1
+        self._evict(now)
+
+        faltante = (cost - bucket.tokens) if not allowed else (rule.capacity - bucket.tokens)
+        reset = math.ceil(faltante / rule.refill_per_second)
+        return allowed, int(bucket.tokens), reset
+
+    def charge(self, path: str, scope, cost: int = 1) -> Optional[Tuple[bool, int, int]]:
+        """Cobra `cost` fichas del bucket de `path` para el cliente de `scope`; None si la ruta no tiene regla."""
+        rule = self.rule_for(path)
+        if rule is None:
+            return None
+        return self.hit((path,) + client_key(scope), rule, cost)
+
+    def stats(self) -> Dict[str, int]:
+        return {"buckets": len(self._buckets), "limited": self.limited, "evicted": self.evicted}
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def client_ip(scope, trusted_hops: int = RATE_LIMIT_TRUSTED_HOPS) -> str:
+    """
+    IP del cliente para el bucket. Cada proxy agrega al final de X-Forwarded-For la IP que le
+    habló, así que sólo los últimos `trusted_hops` saltos son confiables: lo anterior lo escribe el cliente.
+    """
+    if trusted_hops > 0:
+        saltos = [s.strip() for s in (_header(scope, b"x-forwarded-for") or "").split(",") if s.strip()]
+        if len(saltos) >= trusted_hops:
+            return saltos[-trusted_hops]
+    client = scope.get("client")
+    return client[0] if client else "desconocido"
+
+
+def client_key(scope) -> Tuple[str]:
+    return (client_ip(scope),)
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI: 429 con Retry-After al superar el límite, headers X-RateLimit-* siempre."""
+
+    def __init__(self, app, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS":
+            return await self.app(scope, receive, send)
+        rule = self.limiter.rule_for(scope["path"])
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        allowed, remaining, reset = self.limiter.charge(scope["path"], scope)
+        headers = [
+            (b"x-ratelimit-limit", str(rule.capacity).encode()),
+            (b"x-ratelimit-remaining", str(remaining).encode()),
+            (b"x-ratelimit-reset", str(reset).encode()),
+        ]
+
+        if not allowed:
+            body = json.dumps({"detail": "Demasiadas consultas, probá de nuevo en unos segundos."}, ensure_ascii=False).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": headers + [
+                    (b"retry-after", str(reset).encode()),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+rate_limiter = RateLimiter(parse_rules(os.environ.get("RATE_LIMITS", DEFAULT_RATE_LIMITS)))
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Envío de respuestas de WhatsApp.
+
+Cada sender expone `async send(destino, texto, idempotency_key)`. La clave de
+idempotencia es el id del mensaje entrante: si un reintento vuelve a enviar la
+misma respuesta, el proveedor (o el stand-in local) la descarta.
+
+Variables de entorno:
+    WHATSAPP_SENDER         "log" (default, stand-in local) o "http".
+    WHATSAPP_SENDER_URL     Endpoint al que se hace POST con el sender "http".
+    WHATSAPP_SENDER_TOKEN   Bearer token opcional para el sender "http".
+    WHATSAPP_SENDER_TIMEOUT Timeout en segundos del POST (default 10).
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from logic.message_queue import RetryLater, PermanentError
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+WHATSAPP_SENDER = os.environ.get("WHATSAPP_SENDER", "log")
+WHATSAPP_SENDER_URL = os.environ.get("WHATSAPP_SENDER_URL", "")
+WHATSAPP_SENDER_TOKEN = os.environ.get("WHATSAPP_SENDER_TOKEN", "")
+WHATSAPP_SENDER_TIMEOUT = float(os.environ.get("WHATSAPP_SENDER_TIMEOUT", "10"))
+
+
+class LogSender:
+    """Stand-in local: registra los envíos en memoria y en el log. Sirve para desarrollo y pruebas."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.sent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.duplicates = 0
+
+    async def send(self, destino: str, texto: str, idempotency_key: str):
+        if idempotency_key in self.sent:
+            self.duplicates += 1
+            return
+        self.sent[idempotency_key] = {"to": destino, "text": texto, "ts": time.time()}
+        if len(self.sent) > self.max_entries:
+            self.sent.popitem(last=False)
+        logger.info("WhatsApp (stand-in) enviado", extra={"to": destino, "idempotency_key": idempotency_key})
+
+    def messages_for(self, destino: str) -> List[str]:
+        return [m["text"] for m in self.sent.values() if m["to"] == destino]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"type": "log", "sent": len(self.sent), "duplicates": self.duplicates}
+
+
+class HttpSender:
+    """POST JSON {to, text} al proveedor con la cabecera Idempotency-Key."""
+
+    def __init__(self, url: str, token: str = "", timeout: float = WHATSAPP_SENDER_TIMEOUT):
+        import requests
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        self.sent = 0
+        self.errors = 0
+
+    def _post(self, destino: str, texto: str, idempotency_key: str):
+        import requests
+        try:
+            resp = self.session.post(
+                self.url,
+                json={"to": destino, "text": texto},
+                headers={"Idempotency-Key": idempotency_key},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise RetryLater(f"Error de red enviando a WhatsApp: {e}")
+        if resp.status_code == 429 or resp.status_code >= 500:
+            retry_after = resp.headers.get("Retry-After")
+            raise RetryLater(
+                f"El proveedor respondió {resp.status_code}",
+                float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        # Otros 4xx (pedido inválido, token, destino) no se arreglan reintentando
+        if resp.status_code >= 400:
+            raise PermanentError(f"El proveedor respondió {resp.status_code}: {resp.text[:200]}")
+
+    async def send(self, destino: str, texto: str, idempotency_key: str):
+        try:
+            await asyncio.to_thread(self._post, destino, texto, idempotency_key)
+            self.sent += 1
+        except Exception:
+            self.errors += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {"type": "http", "sent": self.sent, "errors": self.errors}
+
+
+def create_sender():
+    if WHATSAPP_SENDER == "http":
+        if not WHATSAPP_SENDER_URL:
+            logger.warning("WHATSAPP_SENDER=http sin WHATSAPP_SENDER_URL, se usa el stand-in local")
+        else:
+            return HttpSender(WHATSAPP_SENDER_URL, WHATSAPP_SENDER_TOKEN)
+    return LogSender()
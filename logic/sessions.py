@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Sesiones de chat en memoria para las conexiones WebSocket.
+
+Cada sesión guarda el historial reciente, los últimos filtros y los ids de los
+últimos resultados. Mientras el usuario está activo el prompt se arma con este
+historial en vez de leer los logs de SQLite, y el contexto se construye del
+lado del servidor (el cliente no necesita mandar `contexto_anterior`).
+
+También recuerda la última búsqueda (filtros canónicos, ids con su distancia y
+versión del catálogo, no los registros) para que un seguimiento como "y con 3
+ambientes?" la refine en memoria. Las usan /ws/chat, /chat sólo cuando el cliente
+manda `session_id` y el webhook de WhatsApp (una por conversación).
+
+Las sesiones sobreviven a una reconexión: el cliente vuelve a conectarse con el
+mismo `session_id` y recupera su estado mientras no haya vencido. Solo se
+retoman ids emitidos por el servidor (uuid4); un id desconocido o inventado
+abre una sesión nueva con id propio. Las sesiones de WhatsApp viven en otro
+store (`whatsapp_sessions`), indexado por conversación, que /chat y /ws no ven.
+
+Variables de entorno:
+    CHAT_SESSION_TTL       Segundos de inactividad hasta descartar una sesión (default 1800).
+    CHAT_SESSION_MAX       Sesiones en memoria como máximo, LRU (default 5000).
+    CHAT_SESSION_HISTORY   Turnos (pregunta + respuesta) que se guardan por sesión (default 5).
+"""
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+CHAT_SESSION_TTL = float(os.environ.get("CHAT_SESSION_TTL", "1800"))
+CHAT_SESSION_MAX = int(os.environ.get("CHAT_SESSION_MAX", "5000"))
+CHAT_SESSION_HISTORY = int(os.environ.get("CHAT_SESSION_HISTORY", "5"))
+
+
+class ChatSession:
+    __slots__ = ("session_id", "channel", "historial", "last_filters", "last_result_ids",
+                 "last_intent", "mensajes", "creado", "ultimo_uso",
+                 "busqueda_filtros", "busqueda_coincidencias", "busqueda_version")
+
+    def __init__(self, session_id: str, channel: str = "web", history: int = CHAT_SESSION_HISTORY):
+        self.session_id = session_id
+        self.channel = channel
+        self.historial: Deque[str] = deque(maxlen=2 * history)
+        self.last_filters: Dict[str, Any] = {}
+        self.last_result_ids: List[str] = []
+        self.last_intent: Optional[str] = None
+        self.mensajes = 0
+        self.creado = time.time()
+        self.ultimo_uso = self.creado
+        # Última búsqueda: filtros canónicos, [id_temporal, distancia_km] de los resultados y
+        # versión del catálogo en que se hizo (los registros se resuelven de nuevo en property_catalog)
+        self.busqueda_filtros: Optional[Dict[str, Any]] = None
+        self.busqueda_coincidencias: List[Tuple[str, Optional[float]]] = []
+        self.busqueda_version: Optional[str] = None
+
+    def recordar_busqueda(self, filtros: Dict[str, Any], resultados: List[Mapping], version: str):
+        self.busqueda_filtros = filtros
+        self.busqueda_coincidencias = [(r["id_temporal"], r.get("distancia_km")) for r in resultados]
+        self.busqueda_version = version
+        self.ultimo_uso = time.time()
+
+    def registrar_turno(self, user_text: str, answer: str, filters: Dict[str, Any],
+                        results: Optional[List[Dict]], intent: str):
+        self.historial.append(f"Usuario: {user_text}")
+        self.historial.append(f"Bot: {answer}")
+        if filters:
+            self.last_filters = dict(filters)
+        if results is not None:
+            self.last_result_ids = [r.get("id_temporal") for r in results if r.get("id_temporal")]
+        self.last_intent = intent
+        self.mensajes += 1
+        self.ultimo_uso = time.time()
+
+    def historial_prompt(self) -> List[str]:
+        """Historial con lo más reciente primero, en el mismo formato que get_historial_canal."""
+        turnos = list(self.historial)
+        pares = [turnos[i:i + 2] for i in range(0, len(turnos), 2)]
+        return [linea for par in reversed(pares) for linea in par]
+
+    def contexto(self) -> Optional[Dict[str, Any]]:
+        """Equivalente server-side del `contexto_anterior` que manda el frontend."""
+        if not self.mensajes:
+            return None
+        return {
+            "tipo": self.last_intent,
+            "filtros_usados": self.last_filters,
+            "resultados": self.last_result_ids,
+            "timestamp": self.ultimo_uso,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "mensajes": self.mensajes,
+            "last_filters": self.last_filters,
+            "last_result_ids": self.last_result_ids,
+        }
+
+
+def id_emitido(session_id: Optional[str]) -> bool:
+    """True si `session_id` tiene la forma de los ids que emite el servidor (uuid4 en hex)."""
+    if not isinstance(session_id, str) or len(session_id) != 32:
+        return False
+    try:
+        return uuid.UUID(hex=session_id).version == 4
+    except ValueError:
+        return False
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = CHAT_SESSION_MAX, ttl: float = CHAT_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.created = 0
+        self.resumed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get_or_create(self, session_id: Optional[str] = None, channel: str = "web") -> ChatSession:
+        """Recupera la sesión si sigue viva; si no, crea una nueva con un id emitido acá.
+
+        Nunca adopta el id que manda el cliente: si no es uno que este store emitió y sigue
+        vivo, la sesión nueva lleva un uuid4 propio.
+        """
+        self._purgar()
+        session = self._sessions.get(session_id) if id_emitido(session_id) else None
+        if session is not None:
+            return self._retomar(session_id, session)
+        return self._crear(channel)
+
+    def get_or_create_interna(self, clave: str, channel: str) -> ChatSession:
+        """Sesión indexada por una clave del servidor (p. ej. el número de WhatsApp).
+
+        Solo para stores internos: la clave no se expone y el session_id sigue siendo un uuid4.
+        """
+        self._purgar()
+        session = self._sessions.get(clave)
+        if session is not None:
+            return self._retomar(clave, session)
+        return self._crear(channel, clave)
+
+    def _retomar(self, clave: str, session: ChatSession) -> ChatSession:
+        self._sessions.move_to_end(clave)
+        session.ultimo_uso = time.time()
+        self.resumed += 1
+        return session
+
+    def _crear(self, channel: str, clave: Optional[str] = None) -> ChatSession:
+        session = ChatSession(uuid.uuid4().hex, channel)
+        self._sessions[clave or session.session_id] = session
+        self.created += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+        return session
+
+    def touch(self, session: ChatSession):
+        if self._sessions.get(session.session_id) is session:
+            self._sessions.move_to_end(session.session_id)
+
+    def _purgar(self):
+        """Descarta las sesiones inactivas (las más viejas están al principio)."""
+        limite = time.time() - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.ultimo_uso >= limite:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self._sessions),
+            "created": self.created,
+            "resumed": self.resumed,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+chat_sessions = SessionStore()
+# Una por conversación de WhatsApp; separado para que ningún cliente pueda direccionarlas
+whatsapp_sessions = SessionStore()
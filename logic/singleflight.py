@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Single-flight: llamadas concurrentes con la misma clave comparten una sola ejecución.
+
+El primer hilo que llega con una clave ejecuta la función ("líder"); los que
+llegan mientras está en vuelo esperan su resultado (o su excepción) en vez de
+repetir la llamada. Thread-safe, pensado para funciones bloqueantes que corren
+en el threadpool de FastAPI; `do_async` hace lo mismo para corrutinas y comparte
+las llamadas en vuelo con `do`.
+"""
+import re
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+def normalize_key(text: str) -> str:
+    """Clave estable para un prompt: minúsculas, espacios colapsados, sha256."""
+    normalizado = re.sub(r"\s+", " ", text.strip().lower())
+    return hashlib.sha256(normalizado.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        # Por llamada en vuelo: cuántos esperan su resultado y la tarea que la ejecuta (do_async)
+        self._esperando: Dict[Future, int] = {}
+        self._tareas: Dict[Future, asyncio.Task] = {}
+        self.calls = 0       # ejecuciones reales
+        self.coalesced = 0   # llamadas ahorradas (esperaron a otra en vuelo)
+        self.abandoned = 0   # ejecuciones canceladas porque no quedó nadie esperándolas
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Ejecuta `fn` o se une a la ejecución en vuelo con la misma `key`. Quien se une espera a lo
+        sumo `timeout` segundos (concurrent.futures.TimeoutError); el líder no se ve afectado.
+        """
+        future, leader = self._unirse(key)
+        try:
+            if not leader:
+                return future.result(timeout)
+            try:
+                result = fn()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        finally:
+            self._salir(key, future)
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        Como `do` pero con una corrutina: sólo el líder la ejecuta, así lo que haga adentro (por
+        ejemplo pedir un slot de admisión) no lo repiten los que se unen. Quien se une espera a lo
+        sumo `timeout` segundos (asyncio.TimeoutError).
+
+        La corrutina corre en su propia tarea, no en la del líder: si al líder lo cancelan (se
+        desconectó el cliente) los que se unieron siguen esperando el resultado. La tarea se
+        cancela recién cuando no queda nadie esperándola.
+        """
+        future, leader = self._unirse(key)
+        if leader:
+            tarea = asyncio.ensure_future(self._ejecutar(key, fn, future))
+            with self._lock:
+                if not future.done():
+                    self._tareas[future] = tarea
+        try:
+            # shield: si vence o se cancela la espera de uno, la llamada compartida sigue para los demás
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), None if leader else timeout)
+        finally:
+            self._salir(key, future)
+
+    async def _ejecutar(self, key: str, fn: Callable[[], Awaitable[Any]], future: Future):
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Sólo llega acá desde _salir, cuando ya no queda nadie esperando
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+                self._tareas.pop(future, None)
+
+    def _unirse(self, key: str):
+        """(future, es_líder) para `key`: registra la llamada en vuelo si no había una."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                self._esperando[future] += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self._esperando[future] = 1
+            self.calls += 1
+            return future, True
+
+    def _salir(self, key: str, future: Future):
+        """Uno menos esperando `future`; si era el último y sigue en vuelo, se cancela su tarea."""
+        with self._lock:
+            quedan = self._esperando[future] - 1
+            if quedan:
+                self._esperando[future] = quedan
+                return
+            del self._esperando[future]
+            tarea = self._tareas.pop(future, None)
+            if tarea is None or future.done():
+                return
+            # Los que lleguen después arrancan una ejecución nueva en vez de unirse a la cancelada
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            self.abandoned += 1
+        tarea.get_loop().call_soon_threadsafe(tarea.cancel)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "inflight": len(self._inflight),
+                "abandoned": self.abandoned,
+            }
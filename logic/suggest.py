@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Sugerencias mientras se escribe (GET /suggest?q=).
+
+Por cada versión del catálogo se arma un índice en memoria con barrios, tipos,
+operaciones, frases con las combinaciones que existen en el catálogo
+("Departamento en venta en Palermo"), "Cerca de X" para los puntos de
+referencia y estaciones, las búsquedas con resultados más repetidas en los logs
+y los títulos de las publicaciones. Cada sugerencia trae sus filtros, así el
+frontend busca sin depender de que detect_filters entienda el texto.
+
+El índice es un arreglo ordenado de claves normalizadas (también desde cada
+palabra: "crespo" encuentra "Villa Crespo") que se recorre con bisect. Las
+sugerencias se ordenan una sola vez por popularidad en los logs, así que la
+posición de cada una es su ranking; los prefijos que abarcan muchas claves
+tienen su top precalculado. Responder no toca la BD: bisect y concatenar el
+JSON ya codificado de cada sugerencia.
+
+Variables de entorno:
+    SUGGEST_LIMIT          Sugerencias por respuesta como máximo (default 8).
+    SUGGEST_LOG_MESSAGES   Mensajes distintos de los logs que se miran para la popularidad (default 5000).
+    SUGGEST_MIN_FRASE      Veces que se tiene que repetir una búsqueda para sugerirla tal cual (default 3).
+    SUGGEST_REFRESH        Segundos hasta rearmar el índice aunque el catálogo no cambie (default 3600).
+"""
+import os
+import json
+import time
+import heapq
+import asyncio
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from logic.catalog import property_catalog
+from logic.database import catalog_version, get_mensajes_populares
+from logic.filter_data import BARRIOS, OPERACIONES, TIPOS
+from logic.filters import detect_filters, CUADRAS_CERCA_SUBTE
+from logic.gazetteer import normalizar_texto, REFERENCIAS, ESTACIONES_SUBTE
+from logic.geo import KM_POR_CUADRA
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+SUGGEST_LIMIT = int(os.environ.get("SUGGEST_LIMIT", "8"))
+SUGGEST_LOG_MESSAGES = int(os.environ.get("SUGGEST_LOG_MESSAGES", "5000"))
+SUGGEST_MIN_FRASE = int(os.environ.get("SUGGEST_MIN_FRASE", "3"))
+SUGGEST_REFRESH = float(os.environ.get("SUGGEST_REFRESH", "3600"))
+
+# Desempate con la misma popularidad: primero lo que más filtra con menos texto
+PRIORIDAD = {"barrio": 0, "tipo": 1, "operacion": 2, "frase": 3, "referencia": 4, "propiedad": 5}
+# Prefijos que abarcan más claves que esto tienen su top precalculado; los demás se recorren
+RANGO_MAXIMO = 64
+# Palabras desde las que se indexa cada sugerencia, sin arrancar en conectores
+MAX_PALABRAS_INDEXADAS = 6
+CONECTORES = {"en", "de", "del", "la", "el", "los", "las", "y", "a", "al", "con"}
+# Mayor que cualquier carácter de una clave normalizada (ASCII): cierra el rango de un prefijo
+_FIN_PREFIJO = "\x7f"
+
+
+def _json(valor: Any) -> bytes:
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _nombre_tipo(tipo: str) -> str:
+    return tipo.upper() if len(tipo) <= 2 else tipo.capitalize()
+
+
+def _frase(tipo: str, operacion: Optional[str] = None, barrio: Optional[str] = None) -> str:
+    partes = [_nombre_tipo(tipo)] + [p for p in (operacion and operacion.lower(), barrio) if p]
+    return " en ".join(partes)
+
+
+def _mejores(posiciones: Iterable[int], limite: int) -> List[int]:
+    # Una sugerencia puede aparecer varias veces en un rango (una por palabra indexada)
+    return heapq.nsmallest(limite, set(posiciones))
+
+
+class _Indice:
+    """Índice inmutable: sugerencias ordenadas por ranking y claves ordenadas para bisect."""
+
+    def __init__(self, sugerencias: List[Dict[str, Any]]):
+        self.json = [_json({"text": s["text"], "kind": s["kind"], "filters": s["filters"], "count": s["count"]})
+                     for s in sugerencias]
+        pares = []
+        for posicion, sugerencia in enumerate(sugerencias):
+            palabras = sugerencia["clave"].split(" ")
+            for inicio in range(min(len(palabras), MAX_PALABRAS_INDEXADAS)):
+                if inicio == 0 or palabras[inicio] not in CONECTORES:
+                    pares.append((" ".join(palabras[inicio:]), posicion))
+        pares.sort()
+        self.claves = [clave for clave, _ in pares]
+        self.posiciones = array("I", (posicion for _, posicion in pares))
+
+        self.top: Dict[str, List[int]] = {"": list(range(min(SUGGEST_LIMIT, len(sugerencias))))}
+        grandes: Dict[str, bool] = {}
+        for clave in self.claves:
+            for largo in range(1, len(clave) + 1):
+                prefijo = clave[:largo]
+                grande = grandes.get(prefijo)
+                if grande is None:
+                    desde, hasta = self.rango(prefijo)
+                    grande = grandes[prefijo] = hasta - desde > RANGO_MAXIMO
+                    if grande:
+                        self.top[prefijo] = _mejores(self.posiciones[desde:hasta], SUGGEST_LIMIT)
+                if not grande:
+                    # Los prefijos más largos abarcan todavía menos claves
+                    break
+
+    def rango(self, prefijo: str) -> Tuple[int, int]:
+        return bisect_left(self.claves, prefijo), bisect_left(self.claves, prefijo + _FIN_PREFIJO)
+
+    def buscar(self, prefijo: str, limite: int) -> List[int]:
+        top = self.top.get(prefijo)
+        if top is None:
+            desde, hasta = self.rango(prefijo)
+            top = _mejores(self.posiciones[desde:hasta], limite)
+        return top[:limite]
+
+
+def construir_sugerencias(propiedades: Iterable[Mapping], mensajes: Sequence[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    """Sugerencias ordenadas por ranking a partir del catálogo y de los mensajes más repetidos de los logs."""
+    barrios, tipos, operaciones = Counter(), Counter(), Counter()
+    combinaciones, combinaciones_barrio, tipo_barrio = Counter(), Counter(), Counter()
+    titulos: Dict[str, List[Any]] = {}
+    for prop in propiedades:
+        tipo, operacion, barrio = prop.get("tipo"), prop.get("operacion"), prop.get("barrio")
+        barrios[barrio] += 1
+        tipos[tipo] += 1
+        operaciones[operacion] += 1
+        if tipo and barrio:
+            tipo_barrio[(tipo, barrio)] += 1
+        if tipo and operacion:
+            combinaciones[(tipo, operacion)] += 1
+            if barrio:
+                combinaciones_barrio[(tipo, operacion, barrio)] += 1
+        titulo = " ".join(str(prop.get("titulo") or "").split())
+        if titulo:
+            # [cantidad, id de la primera, tipo, barrio]
+            datos = titulos.setdefault(titulo, [0, prop.get("id_temporal"), tipo, barrio])
+            datos[0] += 1
+
+    # Popularidad: cuántas búsquedas de los logs pidieron cada barrio, tipo, combinación o referencia
+    popularidad: Counter = Counter()
+    frases_logs = []
+    for mensaje, veces in mensajes:
+        filtros = detect_filters(mensaje.lower())
+        if not filtros:
+            continue
+        tipo, operacion, barrio = filtros.get("tipo"), filtros.get("operacion"), filtros.get("neighborhood")
+        claves = {normalizar_texto(mensaje)}
+        for valor in (tipo, operacion, barrio):
+            if valor:
+                claves.add(normalizar_texto(valor))
+        if tipo and barrio:
+            claves.add(normalizar_texto(_frase(tipo, barrio=barrio)))
+        if tipo and operacion:
+            claves.add(normalizar_texto(_frase(tipo, operacion)))
+            if barrio:
+                claves.add(normalizar_texto(_frase(tipo, operacion, barrio)))
+        if filtros.get("cerca_de"):
+            claves.add(normalizar_texto(f"cerca de {filtros['cerca_de']}"))
+        if filtros.get("max_dist_subte_km"):
+            claves.add("cerca del subte")
+        for clave in claves:
+            popularidad[clave] += veces
+        texto = " ".join(mensaje.split())
+        if veces >= SUGGEST_MIN_FRASE and len(texto) <= 80:
+            frases_logs.append((texto[:1].upper() + texto[1:], filtros))
+
+    candidatas: Dict[str, Dict[str, Any]] = {}
+
+    def agregar(texto: str, kind: str, filtros: Dict[str, Any], count: int = 0):
+        clave = normalizar_texto(texto)
+        if not clave:
+            return
+        if clave in candidatas:
+            candidatas[clave]["count"] += count
+            return
+        candidatas[clave] = {"clave": clave, "text": texto, "kind": kind, "filters": filtros, "count": count,
+                             "pop": popularidad.get(clave, 0)}
+
+    for barrio in list(BARRIOS) + [b for b in barrios if b and b not in BARRIOS]:
+        agregar(barrio, "barrio", {"neighborhood": barrio}, barrios.get(barrio, 0))
+    for tipo in TIPOS:
+        agregar(_nombre_tipo(tipo), "tipo", {"tipo": tipo}, tipos.get(tipo, 0))
+    for operacion in OPERACIONES:
+        agregar(operacion.capitalize(), "operacion", {"operacion": operacion}, operaciones.get(operacion, 0))
+    for (tipo, barrio), n in tipo_barrio.items():
+        agregar(_frase(tipo, barrio=barrio), "frase", {"tipo": tipo, "neighborhood": barrio}, n)
+    for (tipo, operacion), n in combinaciones.items():
+        agregar(_frase(tipo, operacion), "frase", {"tipo": tipo, "operacion": operacion}, n)
+    for (tipo, operacion, barrio), n in combinaciones_barrio.items():
+        agregar(_frase(tipo, operacion, barrio), "frase",
+                {"tipo": tipo, "operacion": operacion, "neighborhood": barrio}, n)
+    for texto, filtros in frases_logs:
+        agregar(texto, "frase", filtros)
+    agregar("Cerca del subte", "referencia", {"max_dist_subte_km": CUADRAS_CERCA_SUBTE * KM_POR_CUADRA})
+    for nombre in list(REFERENCIAS) + list(ESTACIONES_SUBTE):
+        agregar(f"Cerca de {nombre}", "referencia", {"cerca_de": normalizar_texto(nombre)})
+    # Los títulos van últimos: uno igual a una frase ya agregada sólo le suma publicaciones
+    for titulo, (n, id_temporal, tipo, barrio) in titulos.items():
+        filtros = {"id_temporal": id_temporal} if n == 1 else {"tipo": tipo, "neighborhood": barrio}
+        agregar(titulo, "propiedad", filtros, n)
+
+    return sorted(candidatas.values(), key=lambda s: (-s["pop"], PRIORIDAD[s["kind"]], -s["count"],
+                                                      len(s["clave"]), s["clave"]))
+
+
+class SuggestIndex:
+    """Índice de sugerencias del catálogo actual; se rearma en segundo plano cuando cambia."""
+
+    def __init__(self, cargar_propiedades: Callable[[], Iterable[Mapping]] = lambda: property_catalog.registros().values(),
+                 cargar_mensajes: Callable[[], Sequence[Tuple[str, int]]] = lambda: get_mensajes_populares(SUGGEST_LOG_MESSAGES),
+                 version_fn: Callable[[], str] = catalog_version, refresh: float = SUGGEST_REFRESH):
+        self._cargar_propiedades = cargar_propiedades
+        self._cargar_mensajes = cargar_mensajes
+        self._version_fn = version_fn
+        self.refresh = refresh
+        self._indice: Optional[_Indice] = None
+        self._version: Optional[str] = None
+        self._construido = 0.0
+        self._tarea: Optional[asyncio.Future] = None
+        self.builds = 0
+        self.queries = 0
+        self.last_build_ms: Optional[float] = None
+
+    def desactualizado(self) -> bool:
+        return (self._indice is None or self._version != self._version_fn()
+                or time.monotonic() - self._construido > self.refresh)
+
+    def reconstruir(self):
+        inicio = time.perf_counter()
+        version = self._version_fn()
+        sugerencias = construir_sugerencias(self._cargar_propiedades(), self._cargar_mensajes())
+        self._indice = _Indice(sugerencias)
+        self._version = version
+        self._construido = time.monotonic()
+        self.builds += 1
+        self.last_build_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        logger.info("Índice de sugerencias armado", extra={
+            "version": version, "suggestions": len(sugerencias), "keys": len(self._indice.claves),
+            "duration_ms": self.last_build_ms,
+        })
+
+    async def asegurar(self):
+        """Rearma el índice si quedó viejo: la primera vez espera, después se sigue usando el anterior."""
+        if not self.desactualizado():
+            return
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.ensure_future(asyncio.to_thread(self.reconstruir))
+        if self._indice is None:
+            await asyncio.shield(self._tarea)
+
+    def sugerir_json(self, q: str, limit: int = SUGGEST_LIMIT) -> bytes:
+        """{"q", "suggestions": [{"text", "kind", "filters", "count"}]} armado con los bytes precalculados."""
+        self.queries += 1
+        indice = self._indice
+        posiciones = indice.buscar(normalizar_texto(q), max(1, min(limit, SUGGEST_LIMIT))) if indice else []
+        return (b'{"q":' + _json(q) + b',"suggestions":['
+                + b",".join(indice.json[p] for p in posiciones) + b"]}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self._version,
+            "suggestions": len(self._indice.json) if self._indice else 0,
+            "keys": len(self._indice.claves) if self._indice else 0,
+            "precomputed_prefixes": len(self._indice.top) if self._indice else 0,
+            "builds": self.builds,
+            "queries": self.queries,
+            "last_build_ms": self.last_build_ms,
+        }
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Resúmenes y preguntas frecuentes por propiedad, precalculados con Gemini.
+
+Un job recorre el catálogo y, para cada propiedad cuyo contenido cambió
+(hash de CAMPOS_DETALLE), pide a Gemini un resumen corto y hasta
+SUMMARY_MAX_FAQ preguntas frecuentes con respuesta, y los guarda en
+SUMMARIES_PATH. Cada resultado se confirma apenas llega: si el job se corta
+(o se agotan las claves) la próxima corrida sigue desde donde quedó, y una
+propiedad que no cambió nunca se vuelve a generar.
+
+Con eso una pregunta sobre una propiedad puntual se responde desde su FAQ sin
+llamar a Gemini, o con un prompt corto que sólo lleva sus datos.
+
+Variables de entorno:
+    SUMMARIES_PATH          SQLite con los resúmenes (default instance/summaries.db).
+    SUMMARY_RATE_PER_MIN    Llamadas a Gemini por minuto del job (default 20).
+    SUMMARY_MAX_FAQ         Preguntas frecuentes por propiedad (default 5).
+    SUMMARY_JOB_INTERVAL    Segundos entre corridas en segundo plano (default 0 = sólo manual).
+
+Uso manual:
+    python -m logic.summaries [--limit N] [--rate-per-min R] [--force]
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from logic.database import get_property, get_all_properties
+from logic.gemini_client import (
+    call_gemini_with_rotation, get_fallback_response, formatear_datos_propiedad, CAMPOS_DETALLE, MODEL,
+)
+from logic.llm import llm_router
+from logic.gazetteer import normalizar_texto
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
+
+SUMMARIES_PATH = os.environ.get("SUMMARIES_PATH", os.path.join(os.getcwd(), "instance", "summaries.db"))
+SUMMARY_RATE_PER_MIN = float(os.environ.get("SUMMARY_RATE_PER_MIN", "20"))
+SUMMARY_MAX_FAQ = int(os.environ.get("SUMMARY_MAX_FAQ", "5"))
+SUMMARY_JOB_INTERVAL = float(os.environ.get("SUMMARY_JOB_INTERVAL", "0"))
+
+SUMMARY_GENERATION = {
+    "temperature": 0.3,
+    "max_output_tokens": 600,
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {
+            "resumen": {"type": "string"},
+            "faq": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"pregunta": {"type": "string"}, "respuesta": {"type": "string"}},
+                    "required": ["pregunta", "respuesta"],
+                },
+            },
+        },
+        "required": ["resumen", "faq"],
+    },
+}
+
+# Coincidencia mínima (Jaccard de palabras) para responder una pregunta desde la FAQ
+FAQ_MIN_SIMILITUD = 0.5
+_PALABRAS_VACIAS = {
+    "el", "la", "los", "las", "un", "una", "de", "del", "en", "y", "o", "a", "al", "que", "es", "se",
+    "lo", "le", "por", "para", "con", "su", "sus", "me", "mi", "esta", "este", "hay", "tiene", "tienen",
+    "cual", "cuanto", "cuantos", "como", "propiedad", "departamento", "casa",
+}
+
+
+def content_hash(prop: Dict[str, Any]) -> str:
+    """Hash de los campos descriptivos: cambia sólo si cambia lo que el resumen describe."""
+    contenido = json.dumps({campo: prop.get(campo) for campo in CAMPOS_DETALLE}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+# ✅ ALMACENAMIENTO
+def _conectar() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(SUMMARIES_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(SUMMARIES_PATH, timeout=10)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS resumenes (
+            id_temporal TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            resumen TEXT NOT NULL,
+            faq TEXT NOT NULL,
+            modelo TEXT,
+            generado TEXT NOT NULL
+        )
+    ''')
+    return conn
+
+
+def obtener_resumen(id_temporal: str, hash_actual: str) -> Optional[Dict[str, Any]]:
+    """Resumen guardado si corresponde al contenido actual de la propiedad."""
+    try:
+        with _conectar() as conn:
+            fila = conn.execute(
+                "SELECT resumen, faq FROM resumenes WHERE id_temporal = ? AND content_hash = ?",
+                (id_temporal, hash_actual),
+            ).fetchone()
+    except sqlite3.Error:
+        logger.exception("Error leyendo resumen")
+        return None
+    return {"resumen": fila[0], "faq": json.loads(fila[1])} if fila else None
+
+
+def detalle_propiedad(id_temporal: str) -> Optional[Dict[str, Any]]:
+    """{"propiedad", "resumen", "faq"} de una propiedad; resumen/faq en None si no hay uno vigente."""
+    prop = get_property(id_temporal)
+    if prop is None:
+        return None
+    guardado = obtener_resumen(id_temporal, content_hash(prop)) or {}
+    return {"propiedad": prop, "resumen": guardado.get("resumen"), "faq": guardado.get("faq")}
+
+
+def _palabras(texto: str) -> set:
+    return {p for p in re.findall(r"[a-z0-9]+", normalizar_texto(texto)) if p not in _PALABRAS_VACIAS}
+
+
+def responder_desde_faq(pregunta: str, faq: Optional[List[Dict[str, str]]]) -> Optional[str]:
+    """Respuesta de la FAQ cuya pregunta más se parece a la del usuario, si se parece lo suficiente."""
+    palabras = _palabras(pregunta)
+    if not faq or not palabras:
+        return None
+    mejor, similitud = None, 0.0
+    for item in faq:
+        otras = _palabras(item["pregunta"])
+        if otras:
+            actual = len(palabras & otras) / len(palabras | otras)
+            if actual > similitud:
+                mejor, similitud = item, actual
+    return mejor["respuesta"] if mejor and similitud >= FAQ_MIN_SIMILITUD else None
+
+
+# ✅ GENERACIÓN
+def prompt_resumen(prop: Dict[str, Any]) -> str:
+    return (
+        "Sos un asistente inmobiliario. Con SOLO estos datos de la propiedad, escribí:\n"
+        "- \"resumen\": 2 o 3 oraciones que la describan para un interesado.\n"
+        f"- \"faq\": hasta {SUMMARY_MAX_FAQ} preguntas que haría un interesado (cochera, mascotas, expensas, "
+        "ambientes, ubicación...) con su respuesta. Si un dato no está, la respuesta es que hay que "
+        "consultarlo con la inmobiliaria.\n"
+        "Respondé sólo con JSON {\"resumen\": \"...\", \"faq\": [{\"pregunta\": \"...\", \"respuesta\": \"...\"}]}.\n\n"
+        f"Datos:\n{formatear_datos_propiedad(prop)}"
+    )
+
+
+def parse_resumen(answer: str) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(answer)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("resumen"), str) or not data["resumen"].strip():
+        return None
+    faq = [
+        {"pregunta": f["pregunta"].strip(), "respuesta": f["respuesta"].strip()}
+        for f in data.get("faq") or []
+        if isinstance(f, dict) and isinstance(f.get("pregunta"), str) and isinstance(f.get("respuesta"), str)
+    ]
+    return {"resumen": data["resumen"].strip(), "faq": faq[:SUMMARY_MAX_FAQ]}
+
+
+class SummaryStats:
+    def __init__(self):
+        self.runs = 0
+        self.generated = 0
+        self.errors = 0
+        self.pending: Optional[int] = None
+        self.last_run: Optional[str] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_stop: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "generated": self.generated,
+            "errors": self.errors,
+            "pending": self.pending,
+            "last_run": self.last_run,
+            "last_duration_ms": self.last_duration_ms,
+            "last_stop": self.last_stop,
+        }
+
+
+summary_stats = SummaryStats()
+
+
+def generar_resumenes(limit: Optional[int] = None, rate_per_min: float = SUMMARY_RATE_PER_MIN, force: bool = False,
+                      llamar: Callable[[str, Dict[str, Any]], str] = call_gemini_with_rotation,
+                      sleep: Callable[[float], None] = time.sleep) -> Dict[str, int]:
+    """Genera los resúmenes que faltan o quedaron viejos, a lo sumo `rate_per_min` por minuto."""
+    inicio = time.perf_counter()
+    summary_stats.runs += 1
+    summary_stats.last_stop = None
+    resultado = {"catalog": 0, "up_to_date": 0, "generated": 0, "errors": 0, "pruned": 0}
+
+    propiedades = get_all_properties()
+    resultado["catalog"] = len(propiedades)
+    with _conectar() as conn:
+        guardados = dict(conn.execute("SELECT id_temporal, content_hash FROM resumenes").fetchall())
+        # Las propiedades que salieron del catálogo no necesitan resumen
+        ids = {p["id_temporal"] for p in propiedades}
+        viejos = [(i,) for i in guardados if i not in ids]
+        conn.executemany("DELETE FROM resumenes WHERE id_temporal = ?", viejos)
+        resultado["pruned"] = len(viejos)
+
+    pendientes = []
+    for prop in propiedades:
+        hash_actual = content_hash(prop)
+        if not force and guardados.get(prop["id_temporal"]) == hash_actual:
+            resultado["up_to_date"] += 1
+        else:
+            pendientes.append((prop, hash_actual))
+    summary_stats.pending = len(pendientes)
+
+    if pendientes and llamar is call_gemini_with_rotation and not llm_router.backends:
+        summary_stats.last_stop = "sin backends LLM"
+        logger.warning("Resúmenes pendientes pero no hay backends LLM configurados", extra={"pending": len(pendientes)})
+        pendientes = []
+
+    intervalo = 60.0 / rate_per_min if rate_per_min > 0 else 0.0
+    proxima = 0.0
+    for prop, hash_actual in pendientes[:limit]:
+        espera = proxima - time.monotonic()
+        if espera > 0:
+            sleep(espera)
+        proxima = time.monotonic() + intervalo
+
+        answer = llamar(prompt_resumen(prop), SUMMARY_GENERATION)
+        if answer == get_fallback_response():
+            # Todos los backends fallaron: cortar y dejar el resto para la próxima corrida
+            summary_stats.last_stop = "LLM no disponible"
+            logger.warning("LLM no disponible, job de resúmenes interrumpido", extra=resultado)
+            break
+        datos = parse_resumen(answer)
+        if datos is None:
+            resultado["errors"] += 1
+            logger.warning("Resumen inválido", extra={"id_temporal": prop["id_temporal"], "answer": answer[:200]})
+            continue
+        with _conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO resumenes (id_temporal, content_hash, resumen, faq, modelo, generado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (prop["id_temporal"], hash_actual, datos["resumen"], json.dumps(datos["faq"], ensure_ascii=False),
+                 MODEL, datetime.now(timezone.utc).isoformat()),
+            )
+        resultado["generated"] += 1
+        summary_stats.pending -= 1
+
+    summary_stats.generated += resultado["generated"]
+    summary_stats.errors += resultado["errors"]
+    summary_stats.last_run = datetime.now(timezone.utc).isoformat()
+    summary_stats.last_duration_ms = round((time.perf_counter() - inicio) * 1000, 1)
+    logger.info("Job de resúmenes terminado", extra={**resultado, "duration_ms": summary_stats.last_duration_ms})
+    return resultado
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Genera resúmenes y FAQ por propiedad con Gemini")
+    parser.add_argument("--limit", type=int, help="Propiedades a generar en esta corrida")
+    parser.add_argument("--rate-per-min", type=float, default=SUMMARY_RATE_PER_MIN)
+    parser.add_argument("--force", action="store_true", help="Regenerar aunque el contenido no haya cambiado")
+    args = parser.parse_args()
+    print(generar_resumenes(args.limit, args.rate_per_min, args.force))
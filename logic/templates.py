@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Respuestas por plantilla para las intenciones deterministas (ver logic/intents.py).
+
+Cada intención tiene varias redacciones por canal para no sonar repetitivo.
+render_template devuelve None cuando la intención necesita a Gemini.
+"""
+import random
+from typing import Any, Dict, List, Optional
+
+from logic.filter_data import BARRIOS
+from logic.filters import canonicalize_filters
+from logic.intents import SALUDO, AGRADECIMIENTO, BUSQUEDA_CON_RESULTADOS, BUSQUEDA_SIN_RESULTADOS
+
+# tipo -> (singular, plural)
+NOMBRES_TIPOS = {
+    "casa": ("casa", "casas"),
+    "departamento": ("departamento", "departamentos"),
+    "ph": ("PH", "PH"),
+    "terreno": ("terreno", "terrenos"),
+    "oficina": ("oficina", "oficinas"),
+    "casaquinta": ("casaquinta", "casaquintas"),
+    "local": ("local", "locales"),
+    "galpon": ("galpón", "galpones"),
+}
+NOMBRE_GENERICO = ("propiedad", "propiedades")
+
+TEMPLATES = {
+    SALUDO: {
+        "web": [
+            "¡Hola! 👋 Soy tu asistente de Dante Propiedades.\n\n"
+            "Te ayudo a encontrar la propiedad ideal. Podés:\n"
+            "• Usar los filtros a la izquierda para búsquedas específicas\n"
+            "• Contarme directamente qué estás buscando\n"
+            "• Preguntarme sobre propiedades que veas\n\n"
+            "¿En qué tipo de propiedad estás interesado hoy?",
+            "¡Hola! 👋 Bienvenido a Dante Propiedades.\n\n"
+            "Contame qué buscás (tipo de propiedad, barrio, presupuesto) o usá los filtros "
+            "de la izquierda, y te muestro las opciones disponibles.",
+        ],
+        "whatsapp": [
+            "¡Hola! 👋 Soy el asistente de Dante Propiedades. ¿Qué estás buscando?",
+            "¡Hola! Contame qué propiedad buscás y en qué zona 🏡",
+        ],
+    },
+    AGRADECIMIENTO: {
+        "web": [
+            "¡De nada! Si querés seguir buscando, contame qué necesitás o ajustá los filtros.",
+            "¡Un placer ayudarte! Cuando quieras podemos ver más opciones.",
+        ],
+        "whatsapp": [
+            "¡De nada! 😊",
+            "¡Un placer! Cualquier cosa escribime.",
+        ],
+    },
+    BUSQUEDA_CON_RESULTADOS: {
+        "web": [
+            "¡Perfecto! Encontré {cantidad} {busqueda}. Mirá el detalle en las tarjetas de abajo 👇\n\n"
+            "Si querés, puedo ayudarte a refinar la búsqueda o contarte más sobre alguna.",
+            "Excelente, tengo {cantidad} {busqueda} que podrían interesarte. "
+            "Están en las tarjetas de abajo 👇 ¿Querés que ajuste algún filtro?",
+            "Encontré {cantidad} {busqueda}. Te dejo el detalle en las tarjetas 👇 "
+            "Preguntame lo que quieras sobre cualquiera.",
+        ],
+        "whatsapp": [
+            "¡Listo! Encontré {cantidad} {busqueda} 👇",
+            "Tengo {cantidad} {busqueda}. Te paso el detalle 👇",
+        ],
+        # Con un solo resultado (ver render_template)
+        "web_singular": [
+            "¡Perfecto! Encontré {cantidad} {busqueda}. Mirá el detalle en la tarjeta de abajo 👇\n\n"
+            "Si querés, puedo ayudarte a refinar la búsqueda o contarte más detalles.",
+            "Excelente, tengo {cantidad} {busqueda} que podría interesarte. "
+            "Está en la tarjeta de abajo 👇 ¿Querés que ajuste algún filtro?",
+            "Encontré {cantidad} {busqueda}. Te dejo el detalle en la tarjeta 👇 "
+            "Preguntame lo que quieras sobre la publicación.",
+        ],
+        "whatsapp_singular": [
+            "¡Listo! Encontré {cantidad} {busqueda} 👇",
+            "Tengo {cantidad} {busqueda}. Te paso el detalle 👇",
+        ],
+    },
+    BUSQUEDA_SIN_RESULTADOS: {
+        "web": [
+            "No encontré {busqueda} con esos filtros. Podés {sugerencias}. ¿Querés que probemos así?",
+            "Por ahora no tengo {busqueda} disponibles con esos filtros. Te sugiero {sugerencias}. ¿Te ayudo a ajustar la búsqueda?",
+        ],
+        "whatsapp": [
+            "No encontré {busqueda} 😕 ¿Probamos {sugerencias}?",
+            "Sin resultados para {busqueda}. ¿Querés {sugerencias}?",
+        ],
+    },
+}
+
+
+def describir_busqueda(filters: Dict[str, Any], cantidad: Optional[int] = None) -> str:
+    """
+    Arma un texto tipo "casas en venta en Palermo de 3+ ambientes" a partir de los filtros.
+    Los números salen de los filtros canónicos: un valor que no es número ("3+", "mucho") no se menciona.
+    """
+    canonicos = canonicalize_filters(filters)
+    singular, plural = NOMBRES_TIPOS.get(canonicos.get("tipo", ""), NOMBRE_GENERICO)
+    partes = [singular if cantidad == 1 else plural]
+    if canonicos.get("operacion"):
+        partes.append(f"en {canonicos['operacion']}")
+    # El barrio se muestra como vino (con acentos); el canónico está normalizado
+    barrio = filters.get("neighborhood") or filters.get("barrio")
+    if isinstance(barrio, str) and barrio.strip():
+        partes.append(f"en {barrio.strip().title()}")
+    if canonicos.get("min_rooms"):
+        partes.append(f"de {int(canonicos['min_rooms'])}+ ambientes")
+    if canonicos.get("max_price"):
+        moneda = "$" if canonicos.get("moneda") == "ARS" else "USD"
+        partes.append(f"hasta {moneda} {int(canonicos['max_price']):,}".replace(",", "."))
+    return " ".join(partes)
+
+
+def sugerencias_para(filters: Dict[str, Any]) -> str:
+    """Sugerencias concretas para ampliar una búsqueda sin resultados."""
+    sugerencias: List[str] = []
+    canonicos = canonicalize_filters(filters)
+    barrio = filters.get("neighborhood") or filters.get("barrio")
+    if barrio:
+        otros = [b for b in BARRIOS if b.lower() != str(barrio).lower()][:2]
+        sugerencias.append(f"buscar en otro barrio (por ejemplo {' o '.join(otros)})")
+    if canonicos.get("max_price"):
+        sugerencias.append("subir el precio máximo")
+    if canonicos.get("min_price"):
+        sugerencias.append("bajar el precio mínimo")
+    if canonicos.get("min_rooms"):
+        sugerencias.append("buscar con menos ambientes")
+    if canonicos.get("min_sqm") or canonicos.get("max_sqm"):
+        sugerencias.append("ajustar los metros cuadrados")
+    if filters.get("tipo"):
+        sugerencias.append("considerar otro tipo de propiedad")
+    if not sugerencias:
+        sugerencias.append("ampliar la búsqueda")
+    sugerencias = sugerencias[:3]
+    if len(sugerencias) == 1:
+        return sugerencias[0]
+    return ", ".join(sugerencias[:-1]) + " o " + sugerencias[-1]
+
+
+def render_template(intent: str, channel: str, results: Optional[List[Dict]] = None,
+                    filters: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Devuelve la respuesta por plantilla, o None si la intención necesita a Gemini."""
+    por_canal = TEMPLATES.get(intent)
+    if por_canal is None:
+        return None
+
+    filters = filters or {}
+    n = len(results) if results else 0
+    canal = channel if channel in por_canal else "web"
+    variantes = por_canal.get(f"{canal}_singular") if n == 1 else None
+    variantes = variantes or por_canal[canal]
+
+    return random.choice(variantes).format(
+        cantidad=n,
+        busqueda=describir_busqueda(filters, n if n else None),
+        sugerencias=sugerencias_para(filters),
+    )
@@ -1,37 +1,62 @@
 """
 Backend para Dante Propiedades - Asistente Inmobiliario con IA
 """
+import time
+_IMPORT_START = time.perf_counter()
+
 import os
 import re
 import json
-import time
-from functools import lru_cache
+import asyncio
+import hashlib
+import hmac
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.openapi.utils import get_openapi
-from typing import Optional, Dict, Any, List
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple
 from pydantic import BaseModel, Field
 
 # Importar lógica de negocio
 from logic.database import (
     initialize_databases,
     verificar_y_reparar_bd,
-    query_properties,
+    buscar_ids,
     get_historial_canal,
     get_last_bot_response,
     log_conversation,
+    catalog_version,
     DB_PATH,
     LOG_PATH
 )
-from logic.filters import detect_filters
-from logic.gemini_client import call_gemini_with_rotation, build_prompt
+from logic.filters import detect_filters, canonicalize_filters, FiltroInvalido, combinar_filtros, es_refinamiento, es_seguimiento, filtrar_en_memoria
+from logic.catalog import property_catalog, json_lista, PropertyRecord
+from logic.suggest import suggest_index, SUGGEST_LIMIT
+from logic.gemini_client import call_gemini_async, stream_gemini, build_prompt, gemini_singleflight, llm_cache
+from logic.llm import llm_router
 from logic.filter_data import BARRIOS, OPERACIONES, TIPOS
+from logic.intents import classify_intent, propiedad_en_foco, BUSQUEDA_CON_RESULTADOS, BUSQUEDA_SIN_RESULTADOS, DETALLE_PROPIEDAD
+from logic.admission import gemini_admission, LLMSaturated
+from logic.deadline import Deadline, DeadlineExceeded, CHAT_DEADLINE, esperar
+from logic.rate_limit import RateLimitMiddleware, rate_limiter
+from logic.cache import TieredCache, make_key, shared_backend
+from logic.generation import generation_config_for, select_profile, parse_structured_answer, STRUCTURED_INSTRUCTION, ASESORAMIENTO
+from logic.templates import render_template
+from logic.log_retention import compactar_logs, retention_stats, LOG_RETENTION_INTERVAL
+from logic.analytics import analytics_report, flush_analytics, ANALYTICS_FLUSH_INTERVAL
+from logic.message_queue import MessageQueue, WorkerPool, RetryLater, new_message_id
+from logic.senders import create_sender
+from logic.sessions import chat_sessions, whatsapp_sessions, ChatSession
+from logic.summaries import detalle_propiedad, responder_desde_faq, generar_resumenes, summary_stats, SUMMARY_JOB_INTERVAL
+from logic.batch import BatchSearch, run_bounded, CHAT_BATCH_CONCURRENCY, CHAT_BATCH_MAX_ITEMS
+from logic.logger import get_logger
+
+logger = get_logger(__name__)
 
 # ✅ INICIALIZACIÓN Y CONFIGURACIÓN
-verificar_y_reparar_bd()
 CACHE_DURATION = 300  # 5 minutos para cache
 
 class Metrics:
@@ -41,6 +66,8 @@ class Metrics:
         self.failed_requests = 0
         self.gemini_calls = 0
         self.search_queries = 0
+        self.search_refinements = 0
+        self.template_responses = 0
         self.start_time = time.time()
     
     def increment_requests(self): self.requests_count += 1
@@ -48,16 +75,83 @@ class Metrics:
     def increment_failures(self): self.failed_requests += 1
     def increment_gemini_calls(self): self.gemini_calls += 1
     def increment_searches(self): self.search_queries += 1
+    def increment_refinements(self): self.search_refinements += 1
+    def increment_template_responses(self): self.template_responses += 1
     def get_uptime(self): return time.time() - self.start_time
 
 metrics = Metrics()
 
+# ✅ WARMUP EN SEGUNDO PLANO: el puerto se abre enseguida y la BD se prepara después
+class Warmup:
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.ready = False
+        self.error: Optional[str] = None
+        self.duration_ms: Optional[float] = None
+
+    async def run(self):
+        inicio = time.perf_counter()
+        try:
+            await run_in_threadpool(verificar_y_reparar_bd)
+            await run_in_threadpool(initialize_databases)
+            # Dejar el catálogo en memoria listo antes de la primera búsqueda
+            await run_in_threadpool(property_catalog.registros)
+            await run_in_threadpool(suggest_index.reconstruir)
+            self.ready = True
+        except Exception as e:
+            self.error = str(e)
+            logger.exception("Error en warmup")
+        self.duration_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        logger.info("Warmup terminado", extra={"ready": self.ready, "duration_ms": self.duration_ms})
+
+    async def wait(self):
+        """Espera a que termine el warmup (los requests que llegan antes no ven la BD a medio crear)."""
+        if self.task is not None and not self.task.done():
+            await asyncio.shield(self.task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "error": self.error, "duration_ms": self.duration_ms}
+
+warmup = Warmup()
+
+# ✅ RETENCIÓN DE LOGS: compacta al arrancar y después cada LOG_RETENTION_INTERVAL segundos
+async def retention_loop():
+    await warmup.wait()
+    while True:
+        await run_in_threadpool(compactar_logs)
+        await asyncio.sleep(LOG_RETENTION_INTERVAL)
+
+# ✅ RESÚMENES: genera los que falten cada SUMMARY_JOB_INTERVAL segundos (con rate limit propio)
+async def summaries_loop():
+    await warmup.wait()
+    while True:
+        await run_in_threadpool(generar_resumenes)
+        await asyncio.sleep(SUMMARY_JOB_INTERVAL)
+
+# ✅ ANALÍTICA: vuelca los agregados de este worker para que /analytics combine todos
+async def analytics_loop():
+    while True:
+        await asyncio.sleep(ANALYTICS_FLUSH_INTERVAL)
+        await run_in_threadpool(flush_analytics)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("🔄 Iniciando ciclo de vida de la aplicación...")
-    initialize_databases()
+    logger.info("Iniciando ciclo de vida de la aplicación", extra={"import_ms": IMPORT_MS})
+    warmup.task = asyncio.create_task(warmup.run())
+    retention_task = asyncio.create_task(retention_loop()) if LOG_RETENTION_INTERVAL > 0 else None
+    summaries_task = asyncio.create_task(summaries_loop()) if SUMMARY_JOB_INTERVAL > 0 else None
+    analytics_task = asyncio.create_task(analytics_loop())
+    whatsapp_pool.start()
     yield
-    print("✅ Finalizando ciclo de vida de la aplicación.")
+    if retention_task is not None:
+        retention_task.cancel()
+    if summaries_task is not None:
+        summaries_task.cancel()
+    analytics_task.cancel()
+    await whatsapp_pool.stop()
+    await warmup.wait()
+    await run_in_threadpool(flush_analytics)
+    logger.info("Finalizando ciclo de vida de la aplicación")
 
 # ✅ APP PRINCIPAL
 app = FastAPI(
@@ -76,38 +170,44 @@ origins = [
     "http://127.0.0.1:8000",
 ]
 
+# Canales que un cliente puede pedir al abrir /ws/chat (cambian el tono y el perfil de generación)
+CANALES_WS = ("web", "whatsapp")
+
+# ✅ RATE LIMITING por cliente (se registra antes que CORS para que los 429 lleven headers CORS)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "Retry-After"],
 )
 
 # Servir archivos estáticos de la carpeta 'imgs'
 app.mount("/imgs", StaticFiles(directory="imgs"), name="images")
 
-# ✅ CACHE
-query_cache = {}
+# ✅ CACHE (LRU en memoria + SQLite compartido entre workers, versionado por catálogo)
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "256"))
+# Namespace propio: las entradas guardan [id_temporal, distancia_km], no propiedades completas
+search_cache = TieredCache("search_ids", max_entries=SEARCH_CACHE_SIZE, ttl=CACHE_DURATION,
+                           backend=shared_backend, version_fn=catalog_version)
 
 def get_cache_key(filters: Dict[str, Any]) -> str:
-    return json.dumps(filters, sort_keys=True)
-
-def cache_query_results(filters: Dict[str, Any], results: List[Dict]):
-    cache_key = get_cache_key(filters)
-    query_cache[cache_key] = {'results': results, 'timestamp': time.time()}
-
-def get_cached_results(filters: Dict[str, Any]) -> Optional[List[Dict]]:
-    cache_key = get_cache_key(filters)
-    cached = query_cache.get(cache_key)
-    if cached and (time.time() - cached['timestamp']) < CACHE_DURATION:
-        return cached['results']
-    return None
-
-@lru_cache(maxsize=100)
-def query_properties_cached(filters_json: str):
-    filters = json.loads(filters_json) if filters_json else {}
-    return query_properties(filters)
+    """Clave por filtros canónicos: "Palermo"/"palermo", barrio/neighborhood comparten entrada"""
+    return make_key(canonicalize_filters(filters))
+
+def query_properties_cached(filters: Dict[str, Any]) -> List[PropertyRecord]:
+    canonicos = canonicalize_filters(filters)
+    key = make_key(canonicos)
+    # El cache guarda sólo [id_temporal, distancia_km]; las propiedades salen del catálogo en memoria
+    coincidencias = search_cache.get(key)
+    if coincidencias is None:
+        # Consultar con los filtros canónicos: misma clave implica mismos resultados
+        coincidencias = buscar_ids(canonicos)
+        search_cache.set(key, coincidencias)
+    return property_catalog.resolver(coincidencias)
 
 # ✅ MODELOS DE DATOS
 class PropertyResponse(BaseModel):
@@ -136,8 +236,22 @@ class PropertyResponse(BaseModel):
     videos: Optional[List[str]] = None
     fotos: Optional[List[str]] = None
     moneda_precio: Optional[str] = None
+    precio_usd: Optional[float] = None
     moneda_expensas: Optional[str] = None
     fecha_procesamiento: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    geo_precision: Optional[str] = None
+    dist_subte_km: Optional[float] = None
+    distancia_km: Optional[float] = None
+
+class FAQItem(BaseModel):
+    pregunta: str
+    respuesta: str
+
+class PropertyDetailResponse(PropertyResponse):
+    resumen: Optional[str] = None
+    faq: Optional[List[FAQItem]] = None
 
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=1000)
@@ -145,21 +259,295 @@ class ChatRequest(BaseModel):
     filters: Optional[Dict[str, Any]] = None
     contexto_anterior: Optional[Dict[str, Any]] = None
     es_seguimiento: Optional[bool] = False
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     results_count: Optional[int] = None
     search_performed: bool
     propiedades: Optional[List[PropertyResponse]] = None
+    session_id: Optional[str] = None
+
+# ✅ LIMPIEZA DE RESPUESTAS
+def limpiar_respuesta_con_resultados(answer: str, results_count: int) -> str:
+    """Quita de la respuesta de Gemini los listados de propiedades que ya se muestran en las tarjetas."""
+    # Eliminar listados numerados de propiedades del texto
+    lines = answer.split('\n')
+    clean_lines = []
+    skip_next_lines = False
+
+    for i, line in enumerate(lines):
+        line_stripped = line.strip()
+
+        # Detectar inicio de listado (líneas que empiezan con número)
+        if (line_stripped and 
+            (line_stripped[0].isdigit() and 
+             ('.' in line_stripped or ')' in line_stripped or '🏠' in line_stripped or '📍' in line_stripped))):
+            skip_next_lines = True
+            continue
+
+        # Detectar líneas con emojis de propiedades que deben omitirse
+        if any(emoji in line for emoji in ['🏠', '📍', '💰', '📋', '💬']):
+            continue
+
+        # Si estamos en modo salto, buscar dónde termina el listado
+        if skip_next_lines:
+            if line_stripped == "" or i == len(lines) - 1:
+                skip_next_lines = False
+            continue
+
+        clean_lines.append(line)
+
+    # Reconstruir la respuesta
+    answer = '\n'.join(clean_lines).strip()
+
+    # Si la respuesta quedó muy corta, usar un mensaje genérico
+    if not answer or len(answer) < 20:
+        answer = f"✅ Encontré {results_count} propiedades que coinciden con tu búsqueda. Te las muestro abajo:"
+    else:
+        # Asegurar que termine con indicación de ver propiedades
+        if "propiedad" not in answer.lower() and "encontré" not in answer.lower():
+            answer += f"\n\n📊 **Encontré {results_count} propiedades** - Te las muestro en detalle abajo 👇"
+
+    return answer
 
 # ✅ ENDPOINTS
 @app.get("/")
 def root():
     return FileResponse("index.html")
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+def armar_prompt(user_text: str, results: Optional[List[Dict]], filters: Dict[str, Any], channel: str,
+                 historial: List[str], detalle: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+    """Prompt y generation_config para Gemini (también lo usa bench/replay.py para reproducir /chat)."""
+    if detalle is not None:
+        # Pregunta sobre una propiedad puntual: sólo sus datos, sin historial ni catálogo
+        prompt = build_prompt(user_text, channel=channel, property_details=detalle)
+        generation = generation_config_for(ASESORAMIENTO, channel)
+        if "response_mime_type" in generation:
+            prompt += STRUCTURED_INSTRUCTION
+        return prompt, generation
+
+    contexto_historial = "\nHistorial reciente:\n" + "\n".join(f"- {m}" for m in historial) if historial else ""
+
+    contexto_dinamico = (
+        f"Barrios disponibles: {', '.join(BARRIOS)}.\n"
+        f"Tipos de propiedad: {', '.join(TIPOS)}.\n"
+        f"Operaciones disponibles: {', '.join(OPERACIONES)}."
+    )
+
+    style_hint = "Respondé de forma breve, directa y cálida como si fuera un mensaje de WhatsApp." if channel == "whatsapp" else "Respondé de forma explicativa, profesional y cálida como si fuera una consulta web."
+
+    prompt = build_prompt(user_text, results, filters, channel, f"{style_hint}\n{contexto_dinamico}\n{contexto_historial}")
+
+    # ✅ PERFIL DE GENERACIÓN: tope de tokens según el tipo de respuesta
+    generation = generation_config_for(select_profile(results), channel)
+    if "response_mime_type" in generation:
+        prompt += STRUCTURED_INSTRUCTION
+    return prompt, generation
+
+@asynccontextmanager
+async def turno_gemini(channel: str, deadline: Deadline):
+    """Slot de admisión para una llamada real al LLM (los aciertos de llm_cache no lo piden)."""
+    async with gemini_admission.slot(channel, deadline.acotar(gemini_admission.queue_timeout)):
+        metrics.increment_gemini_calls()
+        yield
+
+async def procesar_consulta(user_text: str, channel: str, filters_from_frontend: Optional[Dict[str, Any]] = None,
+                            contexto_anterior: Optional[Dict[str, Any]] = None,
+                            historial: Optional[List[str]] = None,
+                            on_results: Optional[Callable[[List[Dict]], Awaitable[None]]] = None,
+                            on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+                            buscar: Optional[Callable[[Dict[str, Any]], Awaitable[List[Dict]]]] = None,
+                            admission_channel: Optional[str] = None,
+                            registrar: bool = True,
+                            session: Optional[ChatSession] = None,
+                            seguimiento: bool = False) -> Dict[str, Any]:
+    """
+    Núcleo de /chat: detecta filtros, busca, responde por plantilla o con Gemini y registra la conversación.
+    `historial` reemplaza la lectura de los logs (sesiones WebSocket); `on_results` y `on_token`
+    permiten empujar las tarjetas y los tokens de Gemini a medida que están listos.
+    `buscar` reemplaza la búsqueda (lotes deduplicados), `admission_channel` elige la cola de
+    admisión de Gemini y `registrar=False` no guarda la conversación en los logs.
+    Con `session`, un seguimiento (`seguimiento=True` o detectado en el texto) suma sus filtros a
+    la búsqueda anterior, y si sólo la acota se filtran en memoria los resultados anteriores.
+    Toda la consulta tiene CHAT_DEADLINE segundos: la búsqueda, la cola de admisión, la llamada a
+    Gemini y el registro esperan sólo lo que queda. Sin tiempo para buscar se responde 503; después
+    de la búsqueda se degrada a la plantilla igual que con Gemini saturado.
+    """
     start_time = time.time()
+    deadline = Deadline(CHAT_DEADLINE)
+    await warmup.wait()
+
+    filters_from_frontend = filters_from_frontend or {}
+    text_lower = user_text.lower()
+    filters = filters_from_frontend.copy()
+    detected_filters = detect_filters(text_lower)
+    filters.update(detected_filters)
+    try:
+        canonicalize_filters(filters)
+    except FiltroInvalido as e:
+        # Un radio o precio ilegible no se ignora: buscar sin él devolvería otra cosa
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # ✅ DIAGNÓSTICO (DEBUG muestreado, no bloquea el request)
+    logger.debug("Consulta usuario", extra={
+        "channel": channel,
+        "user_text": user_text,
+        "detected_filters": detected_filters,
+        "frontend_filters": filters_from_frontend,
+        "filters": filters,
+    })
+
+    # ✅ SEGUIMIENTO: "y con 3 ambientes?" conserva los filtros de la búsqueda anterior
+    previa = session.busqueda_filtros if session is not None else None
+    if previa is not None and filters and (seguimiento or es_seguimiento(text_lower)):
+        filters = combinar_filtros(previa, filters)
+
+    results = None
+    search_performed = False
+
+    if filters:
+        search_performed = True
+        metrics.increment_searches()
+        canonicos = canonicalize_filters(filters)
+        version = catalog_version()
+        if previa is not None and session.busqueda_version == version and es_refinamiento(previa, canonicos):
+            # Sólo se agregan o ajustan filtros: los resultados son un subconjunto de los anteriores
+            anteriores = property_catalog.resolver(session.busqueda_coincidencias)
+            results = filtrar_en_memoria(anteriores, canonicos)
+            metrics.increment_refinements()
+        else:
+            # SQLite, verificación de la BD y recarga del catálogo: fuera del event loop
+            busqueda = buscar(filters) if buscar is not None else run_in_threadpool(query_properties_cached, filters)
+            try:
+                results = await esperar(busqueda, deadline, "busqueda")
+            except FiltroInvalido as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            except DeadlineExceeded as e:
+                logger.warning("Deadline vencido en la búsqueda", extra={"channel": channel, "reason": e.reason})
+                raise HTTPException(
+                    status_code=503,
+                    detail="Estamos con mucha demanda, probá de nuevo en unos segundos.",
+                    headers={"Retry-After": str(e.retry_after)},
+                )
+        if session is not None:
+            session.recordar_busqueda(canonicos, results, version)
+        if on_results is not None:
+            await on_results(results)
+
+    # ✅ FAST PATH: las respuestas determinadas por los datos no pasan por Gemini
+    intent = classify_intent(text_lower, filters, results, contexto_anterior)
+
+    # ✅ DETALLE DE UNA PROPIEDAD: FAQ precalculada o prompt corto con sus datos
+    detalle = None
+    id_foco = propiedad_en_foco(text_lower, filters, contexto_anterior)
+    if id_foco:
+        try:
+            detalle = await esperar(run_in_threadpool(detalle_propiedad, id_foco), deadline, "detalle")
+        except DeadlineExceeded:
+            # Sin tiempo para la FAQ precalculada, responde la plantilla del intent
+            detalle = None
+    if detalle is not None:
+        intent = DETALLE_PROPIEDAD
+        answer = responder_desde_faq(user_text, detalle["faq"])
+    else:
+        answer = render_template(intent, channel, results, filters)
+
+    if answer is not None:
+        metrics.increment_template_responses()
+    else:
+        # ✅ ADMISIÓN: límite de llamadas simultáneas y cola justa por canal, sólo si la cache no responde
+        def admitir():
+            return turno_gemini(admission_channel or channel, deadline)
+
+        try:
+            if deadline.vencido():
+                # Ni historial ni prompt: va directo a la plantilla (o al 503 si no hubo búsqueda)
+                raise DeadlineExceeded("plantilla")
+            if historial is None and detalle is None:
+                historial = await esperar(run_in_threadpool(get_historial_canal, channel), deadline, "historial")
+            # Procesamiento normal con IA
+            prompt, generation = armar_prompt(user_text, results, filters, channel, historial or [], detalle)
+            if on_token is not None and "response_mime_type" not in generation:
+                # Con salida JSON no tiene sentido mostrar tokens sueltos: sólo se streamea texto plano
+                partes = []
+                async for chunk in stream_gemini(prompt, generation, deadline, admitir):
+                    partes.append(chunk)
+                    await on_token(chunk)
+                answer = "".join(partes).strip()
+            else:
+                # En el threadpool: no bloquea el event loop y permite coalescer prompts idénticos
+                answer = await call_gemini_async(prompt, generation, deadline, admitir)
+
+            # Con salida estructurada el mensaje ya viene limpio; si no, limpiar listados
+            mensaje = parse_structured_answer(answer) if "response_mime_type" in generation else None
+            if mensaje is not None:
+                answer = mensaje
+            elif results and len(results) > 0:
+                answer = limpiar_respuesta_con_resultados(answer, len(results))
+        except (LLMSaturated, DeadlineExceeded) as e:
+            logger.warning("Gemini saturado", extra={"channel": channel, "reason": e.reason, "retry_after": e.retry_after})
+            if detalle is not None and detalle["resumen"]:
+                # Sobre una propiedad puntual, el resumen precalculado es mejor que un 503
+                answer = detalle["resumen"]
+                metrics.increment_template_responses()
+            elif results is None:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Estamos con mucha demanda, probá de nuevo en unos segundos.",
+                    headers={"Retry-After": str(e.retry_after)},
+                )
+            else:
+                # Con búsqueda hecha, degradar a la respuesta por plantilla en vez de fallar
+                intent = BUSQUEDA_CON_RESULTADOS if results else BUSQUEDA_SIN_RESULTADOS
+                answer = render_template(intent, channel, results, filters)
+                metrics.increment_template_responses()
+
+    response_time = time.time() - start_time
+    if registrar:
+        registro = run_in_threadpool(log_conversation, user_text, answer, channel, response_time, search_performed,
+                                     len(results) if results else 0, filters)
+        try:
+            # shield: si vence el deadline la respuesta sale igual y la escritura termina por su cuenta
+            await esperar(asyncio.shield(registro), deadline, "log")
+        except DeadlineExceeded:
+            logger.warning("Deadline vencido registrando la conversación", extra={"channel": channel})
+
+    logger.info("Chat respondido", extra={
+        "channel": channel,
+        "intent": intent,
+        "search_performed": search_performed,
+        "results_count": len(results) if results else 0,
+        "response_time_ms": round(response_time * 1000, 1),
+    })
+
+    return {
+        "answer": answer,
+        "results": results,
+        "search_performed": search_performed,
+        "intent": intent,
+        "filters": filters,
+    }
+
+def chat_response_json(resultado: Dict[str, Any]) -> bytes:
+    """ChatResponse serializado concatenando el JSON precalculado de cada propiedad (sin pydantic)."""
+    results = resultado["results"]
+    return b"".join([
+        b'{"response":', json.dumps(resultado["answer"], ensure_ascii=False).encode("utf-8"),
+        b',"results_count":', str(len(results)).encode() if results is not None else b"null",
+        b',"search_performed":', b"true" if resultado["search_performed"] else b"false",
+        b',"propiedades":', json_lista(results) if results is not None else b"null",
+        b',"session_id":', json.dumps(resultado.get("session_id")).encode("utf-8"),
+        b"}",
+    ])
+
+async def atender_chat(request: ChatRequest, session: Optional[ChatSession] = None) -> Dict[str, Any]:
+    """Lógica de /chat con sus métricas y errores; también la usa el worker de WhatsApp.
+
+    `session` la pasan los canales internos (WhatsApp) con su propia sesión; si no viene y el
+    cliente manda `session_id` se resuelve contra chat_sessions, que solo retoma ids emitidos.
+    Sin `session_id` no se crea sesión (cada POST sería una sesión nueva que nadie retoma).
+    """
     metrics.increment_requests()
     
     try:
@@ -167,131 +555,205 @@ async def chat(request: ChatRequest):
         if not user_text:
             raise HTTPException(status_code=400, detail="El mensaje no puede estar vacío")
 
-        channel = request.channel.strip()
-        filters_from_frontend = request.filters or {}
-        contexto_anterior = request.contexto_anterior
-        es_seguimiento = request.es_seguimiento
-
-        text_lower = user_text.lower()
-        filters = filters_from_frontend.copy()
-        detected_filters = detect_filters(text_lower)
-        filters.update(detected_filters)
-
-        # ✅ AGREGAR DIAGNÓSTICO AQUÍ
-        print(f"🎯 CONSULTA USUARIO: '{user_text}'")
-        print(f"🔍 FILTROS DETECTADOS: {detected_filters}")
-        print(f"🔍 FILTROS FRONTEND: {filters_from_frontend}")
-        print(f"🔍 FILTROS COMBINADOS: {filters}")
-
-        results = None
-        search_performed = False
-        
-        if filters:
-            search_performed = True
-            metrics.increment_searches()
-            results = query_properties(filters)
-            print(f"📊 RESULTADOS OBTENIDOS: {len(results) if results else 0} propiedades")
-
-        historial = get_historial_canal(channel)
-        contexto_historial = "\nHistorial reciente:\n" + "\n".join(f"- {m}" for m in historial) if historial else ""
-        
-        contexto_dinamico = (
-            f"Barrios disponibles: {', '.join(BARRIOS)}.\n"
-            f"Tipos de propiedad: {', '.join(TIPOS)}.\n"
-            f"Operaciones disponibles: {', '.join(OPERACIONES)}."
+        # La sesión recuerda la última búsqueda para refinar los seguimientos
+        if session is None and request.session_id:
+            session = chat_sessions.get_or_create(request.session_id, request.channel.strip())
+        resultado = await procesar_consulta(
+            user_text, request.channel.strip(), request.filters, request.contexto_anterior,
+            session=session, seguimiento=bool(request.es_seguimiento),
         )
-
-        style_hint = "Respondé de forma breve, directa y cálida como si fuera un mensaje de WhatsApp." if channel == "whatsapp" else "Respondé de forma explicativa, profesional y cálida como si fuera una consulta web."
-        
-        # ✅ EVITAR DOBLE BIENVENIDA - Detectar si es un saludo inicial
-        palabras_bienvenida = ['hola', 'hi', 'hello', 'buenas', 'empezar', 'inicio', 'ayuda']
-        es_saludo_inicial = any(palabra in text_lower for palabra in palabras_bienvenida) and not contexto_anterior
-
-        if es_saludo_inicial:
-            print("🎯 DETECTADO: Saludo inicial - enviando bienvenida mejorada")
-            answer = """¡Hola! 👋 Soy tu asistente de Dante Propiedades. 
-
-        Te ayudo a encontrar la propiedad ideal. Podés:
-        • Usar los filtros a la izquierda para búsquedas específicas
-        • Contarme directamente qué estás buscando
-        • Preguntarme sobre propiedades que veas
-
-        ¿En qué tipo de propiedad estás interesado hoy?"""
-        else:
-            # Procesamiento normal con IA
-            prompt = build_prompt(user_text, results, filters, channel, f"{style_hint}\n{contexto_dinamico}\n{contexto_historial}")
-            metrics.increment_gemini_calls()
-            answer = call_gemini_with_rotation(prompt)
-            
-            # ✅ NUEVA MODIFICACIÓN: Limpiar respuesta cuando hay resultados
-            if results and len(results) > 0:
-                print("🎯 DETECTADO: Hay resultados - limpiando duplicación en respuesta")
-                
-                # Eliminar listados numerados de propiedades del texto
-                lines = answer.split('\n')
-                clean_lines = []
-                skip_next_lines = False
-                
-                for i, line in enumerate(lines):
-                    line_stripped = line.strip()
-                    
-                    # Detectar inicio de listado (líneas que empiezan con número)
-                    if (line_stripped and 
-                        (line_stripped[0].isdigit() and 
-                         ('.' in line_stripped or ')' in line_stripped or '🏠' in line_stripped or '📍' in line_stripped))):
-                        skip_next_lines = True
-                        continue
-                    
-                    # Detectar líneas con emojis de propiedades que deben omitirse
-                    if any(emoji in line for emoji in ['🏠', '📍', '💰', '📋', '💬']):
-                        continue
-                        
-                    # Si estamos en modo salto, buscar dónde termina el listado
-                    if skip_next_lines:
-                        if line_stripped == "" or i == len(lines) - 1:
-                            skip_next_lines = False
-                        continue
-                    
-                    clean_lines.append(line)
-                
-                # Reconstruir la respuesta
-                answer = '\n'.join(clean_lines).strip()
-                
-                # Si la respuesta quedó muy corta, usar un mensaje genérico
-                if not answer or len(answer) < 20:
-                    answer = f"✅ Encontré {len(results)} propiedades que coinciden con tu búsqueda. Te las muestro abajo:"
-                else:
-                    # Asegurar que termine con indicación de ver propiedades
-                    if "propiedad" not in answer.lower() and "encontré" not in answer.lower():
-                        answer += f"\n\n📊 **Encontré {len(results)} propiedades** - Te las muestro en detalle abajo 👇"
-        
-        response_time = time.time() - start_time
-        log_conversation(user_text, answer, channel, response_time, search_performed, len(results) if results else 0)
         metrics.increment_success()
-        
-        # ✅ AGREGAR DIAGNÓSTICO DE RESPUESTA AQUÍ
-        response_data = ChatResponse(
-            response=answer,
-            results_count=len(results) if results is not None else None,
-            search_performed=search_performed,
-            propiedades=results
-        )
-        
-        print(f"📤 ENVIANDO RESPUESTA AL FRONTEND:")
-        print(f"   📝 Respuesta: {answer[:100]}...")
-        print(f"   📊 Resultados: {len(results) if results else 0} propiedades")
-        print(f"   🔍 Búsqueda realizada: {search_performed}")
-        if results:
-            for i, prop in enumerate(results[:2]):
-                print(f"   🏠 Prop {i+1}: {prop['titulo']} - {prop['operacion']}")
-        
-        return response_data
+        return {**resultado, "session_id": session.session_id if session is not None else None}
     
+    except HTTPException:
+        metrics.increment_failures()
+        raise
     except Exception as e:
         metrics.increment_failures()
-        print(f"❌ ERROR en endpoint /chat: {type(e).__name__}: {e}")
+        logger.exception("Error en endpoint /chat", extra={"error_type": type(e).__name__})
         raise HTTPException(status_code=500, detail="Ocurrió un error procesando tu consulta.")
 
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    resultado = await atender_chat(request)
+    return Response(content=chat_response_json(resultado), media_type="application/json")
+
+# ✅ CHAT EN LOTE: muchas consultas concurrentes con tope de paralelismo
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest] = Field(..., min_items=1, max_items=CHAT_BATCH_MAX_ITEMS)
+    concurrency: int = Field(default=CHAT_BATCH_CONCURRENCY, ge=1, le=CHAT_BATCH_CONCURRENCY)
+    stream: bool = False
+    registrar: bool = True
+
+class BatchItemResult(BaseModel):
+    index: int
+    status_code: int
+    response: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchItemResult]
+    stats: Dict[str, Any]
+
+async def procesar_item_lote(index: int, request: ChatRequest, buscar: BatchSearch, registrar: bool) -> BatchItemResult:
+    metrics.increment_requests()
+    user_text = request.message.strip()
+    if not user_text:
+        metrics.increment_failures()
+        return BatchItemResult(index=index, status_code=400, error="El mensaje no puede estar vacío")
+    try:
+        resultado = await procesar_consulta(
+            user_text, request.channel.strip(), request.filters, request.contexto_anterior,
+            buscar=buscar, admission_channel="batch", registrar=registrar,
+        )
+    except HTTPException as e:
+        metrics.increment_failures()
+        return BatchItemResult(index=index, status_code=e.status_code, error=str(e.detail))
+    except Exception as e:
+        metrics.increment_failures()
+        logger.exception("Error en /chat/batch", extra={"index": index, "error_type": type(e).__name__})
+        return BatchItemResult(index=index, status_code=500, error="Ocurrió un error procesando tu consulta.")
+
+    metrics.increment_success()
+    results = resultado["results"]
+    return BatchItemResult(index=index, status_code=200, response=ChatResponse(
+        response=resultado["answer"],
+        results_count=len(results) if results is not None else None,
+        search_performed=resultado["search_performed"],
+        # Un dict por registro (una sola decodificación) para el modelo pydantic del lote
+        propiedades=[r.to_dict() for r in results] if results is not None else None
+    ))
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(batch: BatchChatRequest, http_request: Request):
+    """
+    Procesa una lista de ChatRequest en paralelo (hasta `concurrency` a la vez). Las búsquedas con
+    los mismos filtros se hacen una sola vez y las llamadas a Gemini van por su propia cola de admisión
+    ("batch"), así un lote no le quita turno al tráfico interactivo.
+    Con `stream=true` devuelve NDJSON, una línea por consulta a medida que terminan (con su `index`).
+    Cada consulta del lote cuesta una ficha del límite de /chat/batch (el middleware ya cobró la primera).
+    """
+    cobro = rate_limiter.charge("/chat/batch", http_request.scope, len(batch.requests) - 1)
+    if cobro is not None and not cobro[0]:
+        raise HTTPException(
+            status_code=429,
+            detail=f"El lote de {len(batch.requests)} consultas supera tu límite disponible, probá más tarde o con menos.",
+            headers={"Retry-After": str(cobro[2])},
+        )
+    await warmup.wait()
+    inicio = time.perf_counter()
+    buscar = BatchSearch(lambda filters: run_in_threadpool(query_properties_cached, filters))
+
+    async def procesar(index: int, request: ChatRequest) -> BatchItemResult:
+        return await procesar_item_lote(index, request, buscar, batch.registrar)
+
+    def resumen(resultados: List[BatchItemResult]) -> Dict[str, Any]:
+        return {
+            "items": len(batch.requests),
+            "ok": sum(1 for r in resultados if r.status_code == 200),
+            "errors": sum(1 for r in resultados if r.status_code != 200),
+            "concurrency": batch.concurrency,
+            "search": buscar.stats(),
+            "duration_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        }
+
+    if batch.stream:
+        async def generar():
+            resultados = []
+            async for _, resultado in run_bounded(batch.requests, procesar, batch.concurrency):
+                resultados.append(resultado)
+                yield resultado.json() + "\n"
+            yield json.dumps({"stats": resumen(resultados)}) + "\n"
+        return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+    resultados: List[Optional[BatchItemResult]] = [None] * len(batch.requests)
+    async for index, resultado in run_bounded(batch.requests, procesar, batch.concurrency):
+        resultados[index] = resultado
+    return BatchChatResponse(results=resultados, stats=resumen(resultados))
+
+# ✅ CHAT POR WEBSOCKET: conexión persistente y sesión del lado del servidor
+def mensaje_propiedades(results: List[PropertyRecord]) -> str:
+    """Mensaje "propiedades" del socket con la variante tarjeta del JSON de cada propiedad."""
+    return (b'{"type":"propiedades","results_count":' + str(len(results)).encode()
+            + b',"propiedades":' + json_lista(results, tarjeta=True) + b"}").decode("utf-8")
+
+@app.websocket("/ws/chat")
+async def ws_chat(websocket: WebSocket, session_id: Optional[str] = None, channel: str = "web"):
+    """
+    Protocolo (JSON):
+        cliente -> {"message": "...", "filters": {...}}
+        servidor -> {"type": "session", "session_id", "state"} al conectar
+                    {"type": "propiedades", "results_count", "propiedades"} apenas termina la búsqueda (campos de tarjeta)
+                    {"type": "token", "text"} fragmentos de Gemini
+                    {"type": "done", "response", "results_count", "search_performed"} respuesta final (ya limpia)
+                    {"type": "error", "detail", "retry_after"?}
+    Cada mensaje cuesta una ficha del mismo límite que POST /chat (el middleware no ve los mensajes
+    de un socket abierto); sin fichas se responde un error con `retry_after` y no se procesa.
+    El handshake se rechaza (1008) si el Origin no está en la lista de CORS o el canal no es válido:
+    el navegador no aplica CORS a los WebSockets.
+    """
+    origin = websocket.headers.get("origin")
+    if origin not in origins or channel not in CANALES_WS:
+        logger.warning("WebSocket rechazado", extra={"origin": origin, "channel": channel})
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    session = chat_sessions.get_or_create(session_id, channel)
+    await websocket.send_json({"type": "session", "session_id": session.session_id, "state": session.to_dict()})
+
+    async def enviar_resultados(results: List[PropertyRecord]):
+        await websocket.send_text(mensaje_propiedades(results))
+
+    async def enviar_token(texto: str):
+        await websocket.send_json({"type": "token", "text": texto})
+
+    try:
+        while True:
+            data = await websocket.receive_json()
+            user_text = str(data.get("message") or "").strip()[:1000] if isinstance(data, dict) else ""
+            if not user_text:
+                await websocket.send_json({"type": "error", "detail": "El mensaje no puede estar vacío"})
+                continue
+            cobro = rate_limiter.charge("/chat", websocket.scope)
+            if cobro is not None and not cobro[0]:
+                await websocket.send_json({"type": "error", "detail": "Demasiadas consultas, probá de nuevo en unos segundos.",
+                                           "retry_after": cobro[2]})
+                continue
+
+            metrics.increment_requests()
+            try:
+                resultado = await procesar_consulta(
+                    user_text, session.channel, data.get("filters"), session.contexto(),
+                    historial=session.historial_prompt(), on_results=enviar_resultados, on_token=enviar_token,
+                    session=session, seguimiento=bool(data.get("es_seguimiento")),
+                )
+            except HTTPException as e:
+                metrics.increment_failures()
+                await websocket.send_json({"type": "error", "detail": e.detail,
+                                           "retry_after": (e.headers or {}).get("Retry-After")})
+                continue
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                metrics.increment_failures()
+                logger.exception("Error en /ws/chat", extra={"error_type": type(e).__name__})
+                await websocket.send_json({"type": "error", "detail": "Ocurrió un error procesando tu consulta."})
+                continue
+
+            metrics.increment_success()
+            session.registrar_turno(user_text, resultado["answer"], resultado["filters"],
+                                    resultado["results"], resultado["intent"])
+            chat_sessions.touch(session)
+            results = resultado["results"]
+            await websocket.send_json({
+                "type": "done",
+                "response": resultado["answer"],
+                "results_count": len(results) if results is not None else None,
+                "search_performed": resultado["search_performed"],
+            })
+    except WebSocketDisconnect:
+        logger.debug("WebSocket cerrado", extra={"session_id": session.session_id, "mensajes": session.mensajes})
+
 @app.get("/filters")
 def get_all_filters():
     """Endpoint para obtener filtros estáticos desde filter_data."""
@@ -301,16 +763,57 @@ def get_all_filters():
         "barrios": BARRIOS
     }
 
+@app.get("/suggest")
+async def suggest(q: str = "", limit: int = SUGGEST_LIMIT):
+    """
+    Sugerencias para el cuadro de búsqueda, por prefijo (también desde cada palabra) y ordenadas por
+    popularidad en los logs. Cada una trae los filtros que aplica: {"text", "kind", "filters", "count"}.
+    """
+    await warmup.wait()
+    await suggest_index.asegurar()
+    return Response(content=suggest_index.sugerir_json(q[:100], limit), media_type="application/json")
+
 @app.get("/properties", response_model=List[PropertyResponse])
-def get_properties_endpoint(
+async def get_properties_endpoint(
     neighborhood: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None,
     min_rooms: Optional[int] = None, operacion: Optional[str] = None, tipo: Optional[str] = None,
-    min_sqm: Optional[float] = None, max_sqm: Optional[float] = None, limit: int = 20
+    min_sqm: Optional[float] = None, max_sqm: Optional[float] = None, limit: int = 20,
+    moneda: Optional[str] = None,
+    cerca_de: Optional[str] = None, lat: Optional[float] = None, lon: Optional[float] = None,
+    radio_km: Optional[float] = None, min_lat: Optional[float] = None, max_lat: Optional[float] = None,
+    min_lon: Optional[float] = None, max_lon: Optional[float] = None, max_dist_subte_km: Optional[float] = None,
+    view: str = "full"
 ):
-    filters = {k: v for k, v in locals().items() if v is not None and k != 'limit'}
-    results = query_properties(filters)
-    print(f"📊 RESULTADOS OBTENIDOS: {len(results) if results else 0} propiedades")
-    return results[:limit]
+    """`view=card` devuelve sólo los campos de la tarjeta del frontend."""
+    filters = {k: v for k, v in locals().items() if v is not None and k not in ('limit', 'view')}
+    await warmup.wait()
+    try:
+        results = await run_in_threadpool(query_properties_cached, filters)
+    except FiltroInvalido as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return Response(content=json_lista(results[:limit], tarjeta=view == "card"), media_type="application/json")
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match puede traer varias etiquetas, débiles (W/...) o "*"."""
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip() for e in if_none_match.split(",")]
+    return "*" in etiquetas or etag in [e[2:] if e.startswith("W/") else e for e in etiquetas]
+
+@app.get("/properties/{id_temporal}", response_model=PropertyDetailResponse)
+async def get_property_endpoint(id_temporal: str, request: Request):
+    """Una propiedad con su resumen y preguntas frecuentes precalculadas (ETag sobre el contenido)."""
+    await warmup.wait()
+    detalle = await run_in_threadpool(detalle_propiedad, id_temporal)
+    if detalle is None:
+        raise HTTPException(status_code=404, detail="Propiedad no encontrada")
+    body = PropertyDetailResponse(**detalle["propiedad"], resumen=detalle["resumen"], faq=detalle["faq"]).json(
+        ensure_ascii=False).encode("utf-8")
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/status")
 def status():
@@ -319,9 +822,129 @@ def status():
         "uptime_seconds": metrics.get_uptime(),
         "total_requests": metrics.requests_count,
         "gemini_calls": metrics.gemini_calls,
-        "search_queries": metrics.search_queries
+        "template_responses": metrics.template_responses,
+        "search_queries": metrics.search_queries,
+        "search_refinements": metrics.search_refinements,
+        "gemini_singleflight": gemini_singleflight.stats(),
+        "gemini_admission": gemini_admission.stats(),
+        "llm": llm_router.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "cache": {"search": search_cache.stats(), "llm": llm_cache.stats()},
+        "startup": {"import_ms": IMPORT_MS, "warmup": warmup.stats()},
+        "log_retention": retention_stats.to_dict(),
+        "whatsapp": {**whatsapp_pool.stats(), "sender": whatsapp_sender.stats()},
+        "ws_sessions": chat_sessions.stats(),
+        "whatsapp_sessions": whatsapp_sessions.stats(),
+        "summaries": summary_stats.to_dict(),
+        "catalog": property_catalog.stats(),
+        "suggest": suggest_index.stats()
     }
 
+@app.get("/analytics")
+def analytics(scope: str = "all"):
+    """Percentiles de latencia, tasa de acierto de búsquedas, consultas sin resultados y barrios más pedidos."""
+    return analytics_report(scope)
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: el proceso responde. No toca la BD ni Gemini."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 503 hasta que termina el warmup de la BD."""
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **warmup.stats()})
+    return {"status": "ready", **warmup.stats()}
+
+# ✅ WEBHOOK DE WHATSAPP: ack inmediato, cola durable y pool de workers
+WHATSAPP_VERIFY_TOKEN = os.environ.get("WHATSAPP_VERIFY_TOKEN", "")
+# El POST se autentica con la firma de Meta (X-Hub-Signature-256, HMAC-SHA256 del cuerpo con el
+# app secret) o, para proveedores sin firma, con un token compartido en X-Webhook-Token
+WHATSAPP_APP_SECRET = os.environ.get("WHATSAPP_APP_SECRET", "")
+WHATSAPP_WEBHOOK_TOKEN = os.environ.get("WHATSAPP_WEBHOOK_TOKEN", "")
+# El formato plano {message_id, from, text} es para pruebas locales; en producción queda apagado
+WHATSAPP_ACCEPT_PLAIN = os.environ.get("WHATSAPP_ACCEPT_PLAIN", "0") == "1"
+whatsapp_queue = MessageQueue()
+whatsapp_sender = create_sender()
+
+def autenticar_webhook_whatsapp(headers, body: bytes):
+    """Exige firma HMAC válida o el token compartido; 403 si no hay ninguno configurado, 401 si no coincide."""
+    if not WHATSAPP_APP_SECRET and not WHATSAPP_WEBHOOK_TOKEN:
+        raise HTTPException(status_code=403, detail="Webhook de WhatsApp sin credenciales configuradas")
+    if WHATSAPP_APP_SECRET:
+        firma = headers.get("x-hub-signature-256", "")
+        esperada = "sha256=" + hmac.new(WHATSAPP_APP_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        if firma and hmac.compare_digest(firma, esperada):
+            return
+    if WHATSAPP_WEBHOOK_TOKEN:
+        token = headers.get("x-webhook-token", "")
+        if token and hmac.compare_digest(token, WHATSAPP_WEBHOOK_TOKEN):
+            return
+    raise HTTPException(status_code=401, detail="Firma del webhook inválida")
+
+def extraer_mensajes_whatsapp(payload: Dict[str, Any], aceptar_plano: bool = WHATSAPP_ACCEPT_PLAIN) -> List[Dict[str, str]]:
+    """Mensajes de texto del payload: formato de la Cloud API de Meta o, si `aceptar_plano`, {message_id, from, text}."""
+    mensajes = []
+    if "entry" in payload:
+        for entry in payload.get("entry") or []:
+            for change in entry.get("changes") or []:
+                for msg in (change.get("value") or {}).get("messages") or []:
+                    texto = (msg.get("text") or {}).get("body")
+                    if msg.get("from") and texto:
+                        mensajes.append({"message_id": msg.get("id") or new_message_id(), "from": msg["from"], "text": texto})
+    elif aceptar_plano and payload.get("from") and payload.get("text"):
+        mensajes.append({
+            "message_id": payload.get("message_id") or new_message_id(),
+            "from": str(payload["from"]),
+            "text": str(payload["text"]),
+        })
+    return mensajes
+
+async def responder_whatsapp(conversation: str, texto: str) -> str:
+    """Procesa un mensaje encolado con la misma lógica que /chat."""
+    try:
+        # Una sesión por conversación: "y con cochera?" refina la búsqueda anterior del mismo número
+        session = whatsapp_sessions.get_or_create_interna(conversation, "whatsapp")
+        resultado = await atender_chat(ChatRequest(message=texto[:1000], channel="whatsapp"), session=session)
+    except HTTPException as e:
+        if e.status_code == 503:
+            retry_after = (e.headers or {}).get("Retry-After")
+            raise RetryLater(str(e.detail), float(retry_after) if retry_after else None)
+        raise
+    return resultado["answer"]
+
+whatsapp_pool = WorkerPool(whatsapp_queue, responder_whatsapp, whatsapp_sender)
+
+@app.get("/webhook/whatsapp")
+def verificar_webhook_whatsapp(request: Request):
+    """Verificación de suscripción del proveedor (hub.challenge)."""
+    params = request.query_params
+    if params.get("hub.mode") == "subscribe" and WHATSAPP_VERIFY_TOKEN and params.get("hub.verify_token") == WHATSAPP_VERIFY_TOKEN:
+        return PlainTextResponse(params.get("hub.challenge", ""))
+    raise HTTPException(status_code=403, detail="Token de verificación inválido")
+
+@app.post("/webhook/whatsapp")
+async def webhook_whatsapp(request: Request):
+    """Encola los mensajes y responde enseguida; la respuesta sale después por el sender."""
+    body = await request.body()
+    autenticar_webhook_whatsapp(request.headers, body)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="JSON inválido")
+
+    mensajes = extraer_mensajes_whatsapp(payload)
+    aceptados = 0
+    for msg in mensajes:
+        if await run_in_threadpool(whatsapp_queue.enqueue, msg["message_id"], msg["from"], msg["text"]):
+            aceptados += 1
+    if aceptados:
+        whatsapp_pool.notify()
+    return {"status": "queued", "accepted": aceptados, "duplicates": len(mensajes) - aceptados}
+
 
 @app.get("/debug-images")
 def debug_images():
@@ -342,6 +965,9 @@ def debug_images():
         return {"error": f"Error al leer carpeta: {str(e)}"}
 
 
+# Tiempo de import del módulo (sin contar el arranque de uvicorn)
+IMPORT_MS = round((time.perf_counter() - _IMPORT_START) * 1000, 1)
+
 # ✅ INICIO
 if __name__ == "__main__":
     import uvicorn
@@ -1 +0,0 @@
-# Módulo Gemini inicializado
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Control de admisión: round-robin entre canales y 429 con la cola llena."""
+import asyncio
+
+import pytest
+
+from logic.admission import AdmissionController, LLMSaturated
+
+
+def test_round_robin_entre_canales():
+    async def escenario():
+        admision = AdmissionController(max_concurrency=1, max_queue=10, queue_timeout=5)
+        orden = []
+
+        async def pedido(canal):
+            async with admision.slot(canal):
+                orden.append(canal)
+                await asyncio.sleep(0)
+
+        async with admision.slot("web"):
+            tareas = [asyncio.ensure_future(pedido(c)) for c in ("web", "web", "web", "whatsapp")]
+            await asyncio.sleep(0)
+            assert admision.stats()["queued_by_channel"] == {"web": 3, "whatsapp": 1}
+        await asyncio.gather(*tareas)
+        return orden, admision
+
+    orden, admision = asyncio.run(escenario())
+    # WhatsApp no espera a que se vacíe la cola web
+    assert orden == ["web", "whatsapp", "web", "web"]
+    assert admision.running == 0
+    assert admision.stats()["queued"] == 0
+
+
+def test_cola_llena_rechaza_con_retry_after():
+    async def escenario():
+        admision = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+        async with admision.slot("web"):
+            en_cola = asyncio.ensure_future(admision.slot("web").__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(LLMSaturated) as error:
+                async with admision.slot("web"):
+                    pass
+            en_cola.cancel()
+            await asyncio.gather(en_cola, return_exceptions=True)
+        return admision, error.value
+
+    admision, error = asyncio.run(escenario())
+    assert error.reason == "queue_full"
+    assert error.retry_after >= 1
+    assert admision.rejected == 1
+    assert admision.stats()["queued"] == 0
+
+
+def test_espera_vencida_no_deja_el_pedido_en_cola():
+    async def escenario():
+        admision = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=5)
+        async with admision.slot("web"):
+            with pytest.raises(LLMSaturated) as error:
+                async with admision.slot("web", timeout=0.01):
+                    pass
+        return admision, error.value
+
+    admision, error = asyncio.run(escenario())
+    assert error.reason == "queue_timeout"
+    assert admision.timed_out == 1
+    assert admision.stats()["queued"] == 0
+    assert admision.running == 0
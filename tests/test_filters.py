@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Forma canónica de los filtros y FiltroInvalido -> 422."""
+import pytest
+from fastapi.testclient import TestClient
+
+from logic.filters import FiltroInvalido, canonicalize_filters, es_refinamiento, filtrar_en_memoria
+
+
+def test_filtros_equivalentes_tienen_la_misma_forma_canonica():
+    a = canonicalize_filters({"neighborhood": "  PALERMO ", "max_price": "100000,0", "tipo": "Departamento"})
+    b = canonicalize_filters({"barrio": "palermo", "max_price": 100000.0, "tipo": "departamento", "limit": 5})
+    assert a == b == {"barrio": "Palermo", "max_price": 100000, "tipo": "departamento"}
+
+
+def test_barrio_conocido_conserva_como_esta_escrito():
+    assert canonicalize_filters({"barrio": "vicente LOPEZ"})["barrio"] == "Vicente Lopez"
+    # Uno desconocido queda tal cual, sin espacios de más
+    assert canonicalize_filters({"barrio": "Zona   Nueva"})["barrio"] == "Zona Nueva"
+
+
+def test_moneda_solo_con_precio_y_usd_por_default():
+    assert canonicalize_filters({"moneda": "pesos"}) == {}
+    assert canonicalize_filters({"moneda": "dolares", "max_price": 10}) == {"max_price": 10}
+    assert canonicalize_filters({"moneda": "ARS", "max_price": 10}) == {"moneda": "ARS", "max_price": 10}
+
+
+@pytest.mark.parametrize("filtros", [
+    {"max_price": "barato"},
+    {"radio_km": float("nan")},
+    {"min_rooms": True},
+    {"moneda": "EUR", "max_price": 1000},
+])
+def test_filtro_invalido(filtros):
+    with pytest.raises(FiltroInvalido):
+        canonicalize_filters(filtros)
+
+
+def test_refinamiento_en_memoria():
+    anteriores = canonicalize_filters({"barrio": "Palermo"})
+    nuevos = canonicalize_filters({"barrio": "Palermo", "min_rooms": 3})
+    assert es_refinamiento(anteriores, nuevos)
+    assert not es_refinamiento(nuevos, anteriores)
+    props = [{"barrio": "Palermo", "ambientes": 2}, {"barrio": "Palermo Soho", "ambientes": 3}]
+    assert filtrar_en_memoria(props, nuevos) == [props[1]]
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.mark.parametrize("params", [{"max_price": "barato"}, {"max_price": 1000, "moneda": "EUR"}])
+def test_properties_responde_422(client, params):
+    r = client.get("/properties", params=params)
+    assert r.status_code == 422
+
+
+def test_chat_responde_422(client):
+    r = client.post("/chat", json={"message": "departamento", "filters": {"max_price": 100000, "moneda": "EUR"}})
+    assert r.status_code == 422
+    assert "moneda" in r.json()["detail"]
+
+
+def test_properties_con_moneda_conocida(client):
+    assert client.get("/properties", params={"max_price": 100000000, "moneda": "pesos"}).status_code == 200
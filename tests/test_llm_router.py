@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Router de LLM: cobertura de llamadas lentas con tope de carreras cubiertas y deadline."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from logic import gemini_client, llm
+from logic.deadline import Deadline, DeadlineExceeded
+from logic.llm import GeminiBackend, LLMRouter, LLMUnavailable, OllamaBackend
+
+
+class Falso(GeminiBackend):
+    def __init__(self, index, demora, texto=None):
+        super().__init__(f"clave-{index}", index, endpoint="http://127.0.0.1:9")
+        self.demora = demora
+        self.texto = texto or f"respuesta {index}"
+        self.timeouts = []
+
+    def generate(self, prompt, generation, timeout=llm.LLM_TIMEOUT):
+        self.timeouts.append(timeout)
+        time.sleep(self.demora)
+        return self.texto
+
+
+@pytest.fixture(autouse=True)
+def umbral_corto(monkeypatch):
+    # Sin muestras suficientes se cubre a los LLM_HEDGE_DELAY segundos
+    monkeypatch.setattr(llm, "LLM_HEDGE_DELAY", 0.05)
+
+
+def test_llamada_lenta_se_cubre_y_gana_la_cobertura():
+    router = LLMRouter([Falso(1, 0.5), Falso(2, 0.0)])
+    assert router.generate("hola", {}) == "respuesta 2"
+    assert (router.hedges, router.hedge_wins, router.abandoned) == (1, 1, 1)
+
+
+def test_sin_cobertura_se_espera_al_primero():
+    router = LLMRouter([Falso(1, 0.1), Falso(2, 0.0)], hedge=False)
+    assert router.generate("hola", {}) == "respuesta 1"
+    assert router.hedges == 0
+
+
+def test_solo_se_cubre_con_otra_clave_de_gemini():
+    local = OllamaBackend(model="local", host="http://127.0.0.1:9")
+    local.generate = lambda prompt, generation, timeout=None: "local"
+    router = LLMRouter([Falso(1, 0.15), local])
+    assert router.generate("hola", {}) == "respuesta 1"
+    assert router.hedges == 0
+
+
+def test_tope_de_carreras_cubiertas(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_HEDGE_MAX_INFLIGHT", 1)
+    router = LLMRouter([Falso(1, 0.3), Falso(2, 0.3)])
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(router.generate("hola", {}))) for _ in range(2)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(5)
+
+    assert len(resultados) == 2
+    assert router.hedges == 1
+    assert router.hedges_skipped == 1
+    # El cupo vuelve cuando terminan todos los hilos de la carrera cubierta, también el abandonado
+    time.sleep(0.4)
+    assert router._cupo_coberturas.acquire(blocking=False)
+
+
+def test_deadline_vencido_corta_la_espera():
+    lento = Falso(1, 1.0)
+    router = LLMRouter([lento], hedge=False)
+    inicio = time.monotonic()
+    with pytest.raises(DeadlineExceeded) as error:
+        router.generate("hola", {}, Deadline(0.1))
+    assert time.monotonic() - inicio < 0.5
+    assert error.value.reason == "deadline_llm"
+    assert router.deadline_exceeded == 1
+    # La llamada HTTP recibe como timeout lo que quedaba del deadline
+    assert lento.timeouts[0] <= 0.1
+
+
+def test_sin_backends():
+    with pytest.raises(LLMUnavailable):
+        LLMRouter([]).generate("hola", {})
+
+
+def test_stream_acota_cada_fragmento_al_deadline(monkeypatch):
+    cerrado = threading.Event()
+
+    def fragmentos(prompt, generation, deadline):
+        try:
+            yield "hola "
+            while True:
+                time.sleep(0.05)
+                yield "."
+        finally:
+            cerrado.set()
+
+    monkeypatch.setattr(gemini_client, "_stream_llm", fragmentos)
+
+    async def consumir():
+        recibidos = []
+        with pytest.raises(DeadlineExceeded):
+            async for chunk in gemini_client._stream_sin_cache("clave", "hola", {}, Deadline(0.2)):
+                recibidos.append(chunk)
+        return recibidos
+
+    recibidos = asyncio.run(consumir())
+    assert recibidos[0] == "hola "
+    # El hilo productor deja de leer y cierra el stream
+    assert cerrado.wait(1)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Retención de logs: archivar, agregar y borrar un día es atómico y pasa una sola vez."""
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from logic import log_retention
+
+AHORA = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def logs(tmp_path, monkeypatch):
+    path = str(tmp_path / "logs.db")
+    archivo_dir = str(tmp_path / "archive")
+    monkeypatch.setattr(log_retention, "LOG_PATH", path)
+    monkeypatch.setattr(log_retention, "LOG_ARCHIVE_DIR", archivo_dir)
+    log_retention._conectar().close()
+
+    def insertar(dia, cantidad, channel="web"):
+        with sqlite3.connect(path) as conn:
+            conn.executemany(
+                "INSERT INTO logs (timestamp, channel, user_message, bot_response, response_time, search_performed, results_count)"
+                " VALUES (?, ?, 'hola', 'chau', 0.5, 1, 2)",
+                [(f"{dia}T10:00:{i % 60:02d}", channel) for i in range(cantidad)],
+            )
+
+    def consultar(sql, *params):
+        with sqlite3.connect(path) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    return insertar, consultar, archivo_dir
+
+
+def archivados(archivo_dir):
+    ids = []
+    for nombre in sorted(os.listdir(archivo_dir)):
+        assert nombre.endswith(".ndjson.gz"), nombre
+        with gzip.open(os.path.join(archivo_dir, nombre), "rt", encoding="utf-8") as f:
+            ids.extend(json.loads(linea)["id"] for linea in f)
+    return ids
+
+
+def test_compacta_los_dias_viejos_y_deja_la_ventana(logs):
+    insertar, consultar, archivo_dir = logs
+    insertar("2026-01-10", 3)
+    insertar("2026-01-11", 2, channel="whatsapp")
+    insertar("2026-02-25", 4)
+
+    assert log_retention.compactar_logs(AHORA, retention_days=30) == {"rows": 5, "files": 2}
+
+    assert consultar("SELECT COUNT(*) FROM logs") == [(4,)]
+    assert sorted(archivados(archivo_dir)) == [1, 2, 3, 4, 5]
+    assert consultar("SELECT dia, channel, mensajes, busquedas, resultados_total FROM logs_diarios ORDER BY dia") == [
+        ("2026-01-10", "web", 3, 3, 6), ("2026-01-11", "whatsapp", 2, 2, 4),
+    ]
+    assert consultar("SELECT COUNT(*) FROM logs_compactando") == [(0,)]
+    # Una segunda pasada no tiene nada que hacer
+    assert log_retention.compactar_logs(AHORA, retention_days=30) == {"rows": 0, "files": 0}
+
+
+def test_falla_en_la_transaccion_no_borra_ni_agrega(logs, monkeypatch):
+    insertar, consultar, archivo_dir = logs
+    insertar("2026-01-10", 3)
+    rollup = log_retention._rollup
+
+    def rollup_roto(filas):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(log_retention, "_rollup", rollup_roto)
+    assert log_retention.compactar_logs(AHORA, retention_days=30) == {"rows": 0, "files": 0}
+    assert consultar("SELECT COUNT(*) FROM logs") == [(3,)]
+    assert consultar("SELECT COUNT(*) FROM logs_diarios") == [(0,)]
+    assert consultar("SELECT COUNT(*) FROM logs_archivos") == [(0,)]
+    assert consultar("SELECT COUNT(*) FROM logs_compactando") == [(0,)]
+
+    # El reintento reescribe el mismo archivo y las filas quedan archivadas una sola vez
+    monkeypatch.setattr(log_retention, "_rollup", rollup)
+    assert log_retention.compactar_logs(AHORA, retention_days=30) == {"rows": 3, "files": 1}
+    assert archivados(archivo_dir) == [1, 2, 3]
+    assert not [n for n in os.listdir(archivo_dir) if n.endswith(".tmp")]
+    assert consultar("SELECT mensajes FROM logs_diarios") == [(3,)]
+
+
+def test_dia_reclamado_por_otro_worker_se_saltea(logs, monkeypatch):
+    insertar, consultar, archivo_dir = logs
+    insertar("2026-01-10", 3)
+    with sqlite3.connect(log_retention.LOG_PATH) as conn:
+        conn.execute("INSERT INTO logs_compactando (dia, token, desde) VALUES ('2026-01-10', 'otro', ?)", (time.time(),))
+
+    assert log_retention.compactar_logs(AHORA, retention_days=30) == {"rows": 0, "files": 0}
+    assert consultar("SELECT COUNT(*) FROM logs") == [(3,)]
+
+    # Un reclamo más viejo que LOG_CLAIM_TTL es de un worker que murió: se toma
+    monkeypatch.setattr(log_retention, "LOG_CLAIM_TTL", 0)
+    assert log_retention.compactar_logs(AHORA, retention_days=30) == {"rows": 3, "files": 1}
+
+
+def test_workers_en_paralelo_archivan_cada_fila_una_vez(logs):
+    insertar, consultar, archivo_dir = logs
+    for dia in range(1, 21):
+        insertar(f"2026-01-{dia:02d}", 50)
+
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(log_retention.compactar_logs(AHORA, retention_days=30)))
+             for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(60)
+
+    assert sum(r["rows"] for r in resultados) == 1000
+    assert sorted(archivados(archivo_dir)) == list(range(1, 1001))
+    assert consultar("SELECT COUNT(*) FROM logs") == [(0,)]
+    assert consultar("SELECT SUM(mensajes) FROM logs_diarios") == [(1000,)]
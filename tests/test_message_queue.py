@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Cola de WhatsApp: lease vencido y reentrega, orden por conversación y fallos del worker."""
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from logic.message_queue import (
+    ENVIADO, FALLIDO, PENDIENTE, PROCESANDO, MessageQueue, PermanentError, RetryLater, WorkerPool,
+)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return MessageQueue(str(tmp_path / "queue.db"), max_attempts=3, lease_seconds=0.05)
+
+
+def estado(queue, id_):
+    return queue._connect().execute("SELECT estado, intentos FROM mensajes WHERE id = ?", (id_,)).fetchone()
+
+
+class Sender:
+    def __init__(self, error=None):
+        self.error = error
+        self.enviados = []
+
+    async def send(self, conversation, texto, idempotency_key=None):
+        if self.error is not None:
+            raise self.error
+        self.enviados.append((conversation, texto, idempotency_key))
+
+
+def test_enqueue_ignora_reintentos_del_proveedor(queue):
+    assert queue.enqueue("wamid.1", "549111", "hola")
+    assert not queue.enqueue("wamid.1", "549111", "hola")
+    assert queue.stats() == {PENDIENTE: 1}
+
+
+def test_un_mensaje_por_conversacion_y_en_orden(queue):
+    queue.enqueue("a1", "A", "uno")
+    queue.enqueue("a2", "A", "dos")
+    queue.enqueue("b1", "B", "uno")
+
+    tomados = queue.claim(10)
+    assert [m["message_id"] for m in tomados] == ["a1", "b1"]
+    # a2 espera a que a1 termine
+    assert queue.claim(10) == []
+    queue.complete(tomados[0]["id"])
+    assert [m["message_id"] for m in queue.claim(10)] == ["a2"]
+
+
+def test_lease_vencido_vuelve_a_entregar(queue):
+    queue.enqueue("m1", "A", "hola")
+    primero = queue.claim(1)[0]
+    assert primero["intentos"] == 1
+    assert queue.claim(1) == []
+    assert estado(queue, primero["id"]) == (PROCESANDO, 1)
+
+    time.sleep(0.1)
+    segundo = queue.claim(1)[0]
+    assert segundo["id"] == primero["id"]
+    assert segundo["intentos"] == 2
+
+
+def test_fail_reprograma_con_backoff_y_despues_descarta(queue):
+    queue.enqueue("m1", "A", "hola")
+    mensaje = queue.claim(1)[0]
+    assert queue.fail(mensaje["id"], 1, "timeout", retry_after=0) == PENDIENTE
+    mensaje = queue.claim(1)[0]
+    assert queue.fail(mensaje["id"], 2, "timeout") == PENDIENTE
+    # Con backoff de 4 s todavía no está disponible
+    assert queue.claim(1) == []
+    assert queue.fail(mensaje["id"], 3, "timeout") == FALLIDO
+
+
+def test_respuesta_guardada_no_se_vuelve_a_generar(queue):
+    queue.enqueue("m1", "A", "hola")
+    llamadas = []
+
+    async def handler(conversation, texto):
+        llamadas.append(texto)
+        return "respuesta"
+
+    async def escenario():
+        pool = WorkerPool(queue, handler, Sender(error=RetryLater("caído", retry_after=0)))
+        await pool._process(queue.claim(1)[0])
+        pool.sender = Sender()
+        await pool._process(queue.claim(1)[0])
+        return pool
+
+    pool = asyncio.run(escenario())
+    assert llamadas == ["hola"]
+    assert pool.sender.enviados == [("A", "respuesta", "m1")]
+    assert (pool.retried, pool.processed) == (1, 1)
+    assert queue.stats() == {ENVIADO: 1}
+
+
+def test_error_permanente_queda_fallido_al_primer_intento(queue):
+    queue.enqueue("m1", "A", "hola")
+
+    async def handler(conversation, texto):
+        return "respuesta"
+
+    pool = WorkerPool(queue, handler, Sender(error=PermanentError("400")))
+    mensaje = queue.claim(1)[0]
+    asyncio.run(pool._process(mensaje))
+    assert estado(queue, mensaje["id"]) == (FALLIDO, 1)
+    assert pool.failed == 1
+
+
+def test_error_de_sqlite_al_registrar_no_mata_al_worker(queue, monkeypatch):
+    queue.enqueue("m1", "A", "hola")
+
+    async def handler(conversation, texto):
+        raise RuntimeError("gemini")
+
+    def fail_roto(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(queue, "fail", fail_roto)
+    pool = WorkerPool(queue, handler, Sender())
+    mensaje = queue.claim(1)[0]
+    asyncio.run(pool._process(mensaje))
+    # Sigue tomado: al vencer el lease se vuelve a entregar
+    assert estado(queue, mensaje["id"]) == (PROCESANDO, 1)
+    time.sleep(0.1)
+    assert queue.claim(1)[0]["id"] == mensaje["id"]
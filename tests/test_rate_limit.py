@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Rate limiting: recarga de los token buckets y qué salto de X-Forwarded-For elige el bucket."""
+import pytest
+
+from logic import rate_limit
+from logic.rate_limit import RateLimiter, RateRule, client_ip, parse_rules
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(rate_limit.time, "monotonic", reloj)
+    return reloj
+
+
+def scope(client="10.0.0.1", xff=None):
+    headers = [(b"x-forwarded-for", xff.encode())] if xff is not None else []
+    return {"type": "http", "client": (client, 50000), "headers": headers}
+
+
+def test_parse_rules():
+    reglas = parse_rules("/chat=20/60, /properties=120/60,")
+    assert set(reglas) == {"/chat", "/properties"}
+    assert reglas["/chat"].capacity == 20
+    assert reglas["/chat"].refill_per_second == pytest.approx(20 / 60)
+
+
+def test_bucket_se_agota_y_se_recarga(reloj):
+    limiter = RateLimiter({})
+    regla = RateRule(2, 10)  # 2 fichas, una cada 5 segundos
+
+    assert limiter.hit(("k",), regla)[0]
+    assert limiter.hit(("k",), regla)[0]
+    permitido, restantes, reset = limiter.hit(("k",), regla)
+    assert (permitido, restantes, reset) == (False, 0, 5)
+    assert limiter.limited == 1
+
+    reloj.ahora += 5
+    assert limiter.hit(("k",), regla)[0]
+    assert not limiter.hit(("k",), regla)[0]
+
+    # La recarga no pasa de la capacidad
+    reloj.ahora += 1000
+    assert limiter.hit(("k",), regla)[1] == 1
+
+
+def test_costo_de_un_lote(reloj):
+    limiter = RateLimiter({"/chat/batch": RateRule(10, 60)})
+    assert limiter.charge("/chat/batch", scope(), cost=8)[0]
+    assert not limiter.charge("/chat/batch", scope(), cost=3)[0]
+    assert limiter.charge("/chat", scope()) is None
+
+
+def test_sin_saltos_de_confianza_se_usa_el_par_tcp():
+    assert client_ip(scope("10.0.0.1", "1.2.3.4"), trusted_hops=0) == "10.0.0.1"
+
+
+def test_xff_usa_el_salto_que_agrego_el_proxy_de_confianza():
+    # El cliente inventa el primer salto; el proxy agrega al final la IP que le habló
+    assert client_ip(scope("10.0.0.1", "6.6.6.6, 203.0.113.7"), trusted_hops=1) == "203.0.113.7"
+    assert client_ip(scope("10.0.0.1", "6.6.6.6, 203.0.113.7, 10.1.1.1"), trusted_hops=2) == "203.0.113.7"
+
+
+def test_xff_mas_corto_que_los_saltos_vuelve_al_par_tcp():
+    assert client_ip(scope("10.0.0.1", "203.0.113.7"), trusted_hops=2) == "10.0.0.1"
+    assert client_ip(scope("10.0.0.1"), trusted_hops=1) == "10.0.0.1"
+
+
+def test_cambiar_el_primer_salto_no_cambia_la_ip():
+    ips = {client_ip(scope(xff=f"{falsa}, 203.0.113.7"), trusted_hops=1) for falsa in ("1.1.1.1", "2.2.2.2")}
+    assert ips == {"203.0.113.7"}
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Sesiones de chat: sólo se retoman ids emitidos por el servidor."""
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from logic.sessions import SessionStore, id_emitido
+
+
+def test_id_emitido():
+    assert id_emitido(uuid.uuid4().hex)
+    assert not id_emitido(None)
+    assert not id_emitido("admin")
+    assert not id_emitido(uuid.uuid1().hex)
+    assert not id_emitido(str(uuid.uuid4()))
+
+
+def test_retoma_una_sesion_emitida():
+    store = SessionStore()
+    session = store.get_or_create(None, "web")
+    assert store.get_or_create(session.session_id, "web") is session
+    assert store.stats()["resumed"] == 1
+
+
+@pytest.mark.parametrize("inventado", ["mi-sesion", "0" * 32, uuid.uuid4().hex])
+def test_no_adopta_ids_inventados(inventado):
+    store = SessionStore()
+    session = store.get_or_create(inventado, "web")
+    assert session.session_id != inventado
+    assert id_emitido(session.session_id)
+    assert store.stats()["created"] == 1
+
+
+def test_sesion_interna_no_se_retoma_por_su_clave():
+    store = SessionStore()
+    interna = store.get_or_create_interna("5491100000000", "whatsapp")
+    assert store.get_or_create_interna("5491100000000", "whatsapp") is interna
+    assert store.get_or_create("5491100000000", "web") is not interna
+
+
+def test_ttl_y_lru():
+    store = SessionStore(max_sessions=2, ttl=60)
+    a, b, c = (store.get_or_create(None) for _ in range(3))
+    assert store.get_or_create(a.session_id) is not a
+    assert store.stats()["evicted"] >= 1
+
+    store = SessionStore(ttl=0)
+    vieja = store.get_or_create(None)
+    vieja.ultimo_uso -= 1
+    assert store.get_or_create(vieja.session_id) is not vieja
+    assert store.stats()["expired"] == 1
+
+
+def test_recordar_busqueda_guarda_ids():
+    store = SessionStore()
+    session = store.get_or_create(None)
+    session.recordar_busqueda({"barrio": "Palermo"}, [{"id_temporal": "UF1", "distancia_km": 1.5}], "v1")
+    assert session.busqueda_coincidencias == [("UF1", 1.5)]
+    assert session.busqueda_version == "v1"
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+    with TestClient(main.app) as c:
+        yield c
+
+
+def test_chat_sin_session_id_no_crea_sesion(client):
+    from logic.sessions import chat_sessions
+    creadas = chat_sessions.created
+    r = client.post("/chat", json={"message": "hola"})
+    assert r.status_code == 200
+    assert r.json()["session_id"] is None
+    assert chat_sessions.created == creadas
+
+
+def test_chat_con_id_inventado_recibe_uno_emitido(client):
+    r = client.post("/chat", json={"message": "hola", "session_id": "sesion-ajena"})
+    assert r.status_code == 200
+    session_id = r.json()["session_id"]
+    assert session_id != "sesion-ajena" and id_emitido(session_id)
+    r = client.post("/chat", json={"message": "hola", "session_id": session_id})
+    assert r.json()["session_id"] == session_id
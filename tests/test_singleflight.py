@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Single-flight: los que se unen comparten la ejecución del líder, su resultado y su error."""
+import time
+import asyncio
+import threading
+
+import pytest
+
+from logic.singleflight import SingleFlight, normalize_key
+
+
+def test_normalize_key_ignora_mayusculas_y_espacios():
+    assert normalize_key("  Hola   Mundo ") == normalize_key("hola mundo")
+    assert normalize_key("hola") != normalize_key("chau")
+
+
+def test_do_comparte_una_ejecucion_entre_hilos():
+    sf = SingleFlight()
+    arranco = threading.Event()
+    seguir = threading.Event()
+    llamadas = []
+
+    def lento():
+        llamadas.append(1)
+        arranco.set()
+        seguir.wait(5)
+        return "ok"
+
+    resultados = []
+    lider = threading.Thread(target=lambda: resultados.append(sf.do("k", lento)))
+    lider.start()
+    arranco.wait(5)
+    seguidores = [threading.Thread(target=lambda: resultados.append(sf.do("k", lento))) for _ in range(3)]
+    for hilo in seguidores:
+        hilo.start()
+    while sf.stats()["coalesced"] < 3:
+        time.sleep(0.001)
+    seguir.set()
+    for hilo in [lider, *seguidores]:
+        hilo.join(5)
+
+    assert resultados == ["ok"] * 4
+    assert len(llamadas) == 1
+    assert sf.stats() == {"calls": 1, "coalesced": 3, "inflight": 0, "abandoned": 0}
+
+
+def test_do_async_propaga_el_error_a_todos():
+    sf = SingleFlight()
+    llamadas = []
+
+    async def falla():
+        llamadas.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("sin respuesta")
+
+    async def escenario():
+        return await asyncio.gather(*(sf.do_async("k", falla) for _ in range(3)), return_exceptions=True)
+
+    resultados = asyncio.run(escenario())
+    assert [type(r) for r in resultados] == [ValueError] * 3
+    assert len(llamadas) == 1
+    # Terminada la llamada, la clave queda libre para una nueva
+    assert sf.stats()["inflight"] == 0
+
+
+def test_cancelar_al_lider_no_cancela_a_los_seguidores():
+    sf = SingleFlight()
+
+    async def lento():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def escenario():
+        lider = asyncio.ensure_future(sf.do_async("k", lento))
+        await asyncio.sleep(0)
+        seguidor = asyncio.ensure_future(sf.do_async("k", lento))
+        await asyncio.sleep(0)
+        lider.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await lider
+        return await seguidor
+
+    assert asyncio.run(escenario()) == "ok"
+    assert sf.stats()["calls"] == 1
+
+
+def test_sin_nadie_esperando_se_cancela_la_ejecucion():
+    sf = SingleFlight()
+    cancelada = []
+
+    async def eterna():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelada.append(1)
+            raise
+
+    async def escenario():
+        lider = asyncio.ensure_future(sf.do_async("k", eterna))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await sf.do_async("k", eterna, timeout=0.01)
+        lider.cancel()
+        await asyncio.gather(lider, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(escenario())
+    assert cancelada == [1]
+    assert sf.stats()["abandoned"] == 1
+    assert sf.stats()["inflight"] == 0